@@ -0,0 +1,736 @@
+#!/usr/bin/env python3
+# A local stand-in for the parts of the GitHub REST and GraphQL APIs that
+# discovery, the exporters and the appliers use, serving a synthetic fleet.
+import argparse
+import base64
+import copy
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote, quote
+
+DEFAULT_PROTECTION = {
+    "required_status_checks": {"strict": True, "contexts": ["ci/build", "ci/test"]},
+    "required_pull_request_reviews": {
+        "dismiss_stale_reviews": True,
+        "require_code_owner_reviews": False,
+        "required_approving_review_count": 1
+    },
+    "enforce_admins": False
+}
+
+DRIFTED_PROTECTION = {
+    "required_status_checks": {"strict": False, "contexts": ["ci/build"]},
+    "required_pull_request_reviews": {
+        "dismiss_stale_reviews": True,
+        "require_code_owner_reviews": False,
+        "required_approving_review_count": 1
+    },
+    "enforce_admins": False
+}
+
+class Fleet:
+    # Branches are generated from their index ("main", "develop",
+    # "feature-0002", ...) so large fleets only store their protections
+    def __init__(self, repos=100, branches=10, protected=2, drift=0.2, tagged=1.0, topic="sync-from-master",
+                 owner="bench", seed=0):
+        rng = random.Random(seed)
+        self.owner = owner
+        self.topic = topic
+        self.branches = branches
+        self.repos = {}
+        for i in range(repos):
+            name = f"repo-{i:05d}"
+            protections = {}
+            for index in range(min(protected, branches)):
+                source = DRIFTED_PROTECTION if rng.random() < drift else DEFAULT_PROTECTION
+                protections[self.branch_name(index)] = copy.deepcopy(source)
+            self.repos[name] = {"id": i + 1, "tagged": rng.random() < tagged, "protections": protections,
+                                "rulesets": {}}
+        self.names = list(self.repos)
+        self.next_ruleset_id = 1
+        self.lock = threading.Lock()
+
+    def branch_name(self, index):
+        if index == 0:
+            return "main"
+        if index == 1:
+            return "develop"
+        return f"feature-{index:04d}"
+
+    def has_branch(self, name):
+        if name in ("main", "develop"):
+            return self.branches > ("main", "develop").index(name)
+        match = re.fullmatch(r"feature-(\d{4,})", name)
+        return bool(match) and 2 <= int(match.group(1)) < self.branches
+
+    def master_settings(self):
+        return [
+            {"name": self.branch_name(index), "protection": copy.deepcopy(DEFAULT_PROTECTION)}
+            for index in range(min(2, self.branches))
+        ]
+
+def rule_id(name, branch):
+    return "BPR_" + base64.urlsafe_b64encode(json.dumps([name, branch]).encode()).decode()
+
+def parse_rule_id(value):
+    try:
+        return json.loads(base64.urlsafe_b64decode(value[4:].encode()))
+    except (ValueError, TypeError):
+        return None, None
+
+class RateLimits:
+    RESOURCES = {"core": 1.0, "graphql": 1.0, "search": 0.006}
+
+    def __init__(self, limit=1000000, window=3600, enforce=False):
+        self.limit = limit
+        self.window = window
+        self.enforce = enforce
+        self.lock = threading.Lock()
+        self.used = Counter()
+        self.reset = {}
+
+    def take(self, resource):
+        limit = max(1, int(self.limit * self.RESOURCES[resource]))
+        with self.lock:
+            now = time.time()
+            if self.reset.get(resource, 0) <= now:
+                self.reset[resource] = int(now + self.window)
+                self.used[resource] = 0
+            allowed = not self.enforce or self.used[resource] < limit
+            if allowed:
+                self.used[resource] += 1
+            headers = {
+                "X-RateLimit-Limit": str(limit),
+                "X-RateLimit-Remaining": str(max(limit - self.used[resource], 0)),
+                "X-RateLimit-Reset": str(self.reset[resource]),
+                "X-RateLimit-Used": str(self.used[resource]),
+                "X-RateLimit-Resource": resource
+            }
+        return allowed, headers
+
+class FakeGitHub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, fleet, latency=0.0, jitter=0.0, rate_limits=None, write_failures=0.0):
+        super().__init__(address, Handler)
+        self.fleet = fleet
+        self.latency = latency
+        self.jitter = jitter
+        # Share of REST writes answered with a 502 before touching the fleet
+        self.write_failures = write_failures
+        self.rate_limits = rate_limits or RateLimits()
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = Counter()
+
+    def count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+def start_server(fleet, host="127.0.0.1", port=0, **options):
+    server = FakeGitHub((host, port), fleet, **options)
+    thread = threading.Thread(target=server.serve_forever, name="fake-github", daemon=True)
+    thread.start()
+    return server
+
+class NotFound(Exception):
+    pass
+
+class Unprocessable(Exception):
+    pass
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one segment; split writes hit delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    ROUTES = [
+        ("GET", r"/user", "get_user"),
+        ("GET", r"/user/repos", "list_repos"),
+        ("GET", r"/user/orgs", "list_orgs"),
+        ("GET", r"/search/repositories", "search_repos"),
+        ("GET", r"/repos/(?P<owner>[^/]+)/(?P<name>[^/]+)", "get_repo"),
+        ("GET", r"/repos/(?P<owner>[^/]+)/(?P<name>[^/]+)/topics", "get_topics"),
+        ("GET", r"/repos/(?P<owner>[^/]+)/(?P<name>[^/]+)/branches", "list_branches"),
+        ("GET", r"/repos/(?P<owner>[^/]+)/(?P<name>[^/]+)/branches/(?P<branch>[^/]+)", "get_branch"),
+        ("GET", r"/repos/(?P<owner>[^/]+)/(?P<name>[^/]+)/branches/(?P<branch>[^/]+)/protection", "get_protection"),
+        ("PUT", r"/repos/(?P<owner>[^/]+)/(?P<name>[^/]+)/branches/(?P<branch>[^/]+)/protection", "put_protection"),
+        ("DELETE", r"/repos/(?P<owner>[^/]+)/(?P<name>[^/]+)/branches/(?P<branch>[^/]+)/protection",
+         "delete_protection"),
+        (None, r"/repos/(?P<owner>[^/]+)/(?P<name>[^/]+)/branches/(?P<branch>[^/]+)/protection/(?P<section>.+)",
+         "protection_section"),
+        ("GET", r"/repos/(?P<owner>[^/]+)/(?P<name>[^/]+)/rulesets", "list_rulesets"),
+        ("POST", r"/repos/(?P<owner>[^/]+)/(?P<name>[^/]+)/rulesets", "create_ruleset"),
+        (None, r"/repos/(?P<owner>[^/]+)/(?P<name>[^/]+)/rulesets/(?P<ruleset_id>\d+)", "ruleset"),
+        ("POST", r"/graphql", "graphql"),
+        ("GET", r"/_bench/stats", "get_stats")
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_PATCH(self):
+        self.dispatch("PATCH")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def dispatch(self, verb):
+        parsed = urlparse(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        self.body = json.loads(raw) if raw else None
+
+        for route_verb, pattern, handler in self.ROUTES:
+            match = re.fullmatch(pattern, parsed.path)
+            if match and route_verb in (verb, None):
+                break
+        else:
+            return self.reply(404, {"message": "Not Found"}, route=f"{verb} unknown")
+
+        route = f"{verb} {handler}"
+        if handler != "get_stats" and not self.headers.get("Authorization"):
+            return self.reply(401, {"message": "Requires authentication"}, route=route)
+
+        resource = "graphql" if handler == "graphql" else "search" if handler == "search_repos" else "core"
+        allowed, headers = self.server.rate_limits.take(resource)
+        if self.server.latency or self.server.jitter:
+            time.sleep(self.server.latency + random.uniform(0, self.server.jitter))
+        if not allowed:
+            return self.reply(403, {"message": "API rate limit exceeded"}, headers, route)
+        if verb != "GET" and handler != "graphql" and random.random() < self.server.write_failures:
+            return self.reply(502, {"message": "Server Error"}, headers, route)
+
+        params = {key: unquote(value) for key, value in match.groupdict().items()}
+        try:
+            status, payload, extra = getattr(self, handler)(verb, **params)
+        except NotFound as e:
+            status, payload, extra = 404, {"message": str(e) or "Not Found"}, {}
+        except Unprocessable as e:
+            status, payload, extra = 422, {"message": str(e)}, {}
+        headers.update(extra)
+        self.reply(status, payload, headers, route)
+
+    def reply(self, status, payload, headers=None, route=None):
+        self.server.count(f"{route or 'unrouted'} {status}")
+        body = b"" if payload is None else json.dumps(payload).encode()
+        headers = dict(headers or {})
+        if self.command == "GET" and status == 200:
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            headers["ETag"] = etag
+            if self.headers.get("If-None-Match") == etag:
+                status, body = 304, b""
+        self.send_response(status)
+        headers.setdefault("Content-Type", "application/json; charset=utf-8")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Helpers
+
+    @property
+    def fleet(self):
+        return self.server.fleet
+
+    def repo_state(self, owner, name):
+        if owner.lower() != self.fleet.owner.lower() or name not in self.fleet.repos:
+            raise NotFound()
+        return self.fleet.repos[name]
+
+    def repo_json(self, name):
+        state = self.fleet.repos[name]
+        full_name = f"{self.fleet.owner}/{name}"
+        return {
+            "id": state["id"],
+            "node_id": f"R_{name}",
+            "name": name,
+            "full_name": full_name,
+            "owner": {"login": self.fleet.owner, "id": 1, "type": "User"},
+            "private": False,
+            "url": f"{self.server.url}/repos/{full_name}",
+            "default_branch": "main",
+            "topics": [self.fleet.topic] if state["tagged"] else [],
+            "permissions": {"admin": True, "push": True, "pull": True}
+        }
+
+    def branch_json(self, name, branch, state):
+        protection = state["protections"].get(branch)
+        url = f"{self.server.url}/repos/{self.fleet.owner}/{name}/branches/{quote(branch, safe='')}"
+        rsc = (protection or {}).get("required_status_checks")
+        return {
+            "name": branch,
+            "commit": {"sha": hashlib.sha1(f"{name}/{branch}".encode()).hexdigest(), "url": f"{url}/commit"},
+            "protected": protection is not None,
+            "protection": {
+                "enabled": protection is not None,
+                "required_status_checks": {
+                    "enforcement_level": ("everyone" if protection.get("enforce_admins") else "non_admins")
+                    if rsc else "off",
+                    "contexts": rsc["contexts"] if rsc else [],
+                    "checks": [{"context": c, "app_id": None} for c in rsc["contexts"]] if rsc else []
+                }
+            },
+            "protection_url": f"{url}/protection"
+        }
+
+    def protection_json(self, name, branch, protection):
+        url = f"{self.server.url}/repos/{self.fleet.owner}/{name}/branches/{quote(branch, safe='')}/protection"
+        data = {
+            "url": url,
+            "enforce_admins": {"url": f"{url}/enforce_admins", "enabled": protection.get("enforce_admins", False)}
+        }
+        rsc = protection.get("required_status_checks")
+        if rsc:
+            data["required_status_checks"] = {
+                "url": f"{url}/required_status_checks",
+                "strict": rsc.get("strict", False),
+                "contexts": rsc.get("contexts", []),
+                "checks": [{"context": c, "app_id": None} for c in rsc.get("contexts", [])]
+            }
+        rpr = protection.get("required_pull_request_reviews")
+        if rpr:
+            data["required_pull_request_reviews"] = {
+                "url": f"{url}/required_pull_request_reviews",
+                "dismiss_stale_reviews": rpr.get("dismiss_stale_reviews", False),
+                "require_code_owner_reviews": rpr.get("require_code_owner_reviews", False),
+                "required_approving_review_count": rpr.get("required_approving_review_count", 1)
+            }
+            if rpr.get("dismissal_users") or rpr.get("dismissal_teams"):
+                data["required_pull_request_reviews"]["dismissal_restrictions"] = {
+                    "users": [{"login": u} for u in rpr.get("dismissal_users", [])],
+                    "teams": [{"slug": t} for t in rpr.get("dismissal_teams", [])]
+                }
+        restrictions = protection.get("restrictions")
+        if restrictions:
+            data["restrictions"] = {
+                "url": f"{url}/restrictions",
+                "users": [{"login": u} for u in restrictions.get("users", [])],
+                "teams": [{"slug": t} for t in restrictions.get("teams", [])],
+                "apps": []
+            }
+        return data
+
+    def page(self, items, total=None):
+        # One page of items plus the Link header PyGithub and httpx follow
+        per_page = min(int(self.query.get("per_page", 30)), 100)
+        number = max(int(self.query.get("page", 1)), 1)
+        start = (number - 1) * per_page
+        selected = items[start:start + per_page]
+        headers = {}
+        if start + per_page < (len(items) if total is None else total):
+            query = dict(self.query, page=str(number + 1), per_page=str(per_page))
+            path = urlparse(self.path).path
+            next_url = f"{self.server.url}{path}?" + "&".join(f"{k}={quote(v)}" for k, v in query.items())
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        return selected, headers
+
+    # REST
+
+    def get_stats(self, verb):
+        return 200, dict(self.server.stats), {}
+
+    def get_user(self, verb):
+        return 200, {"login": self.fleet.owner, "id": 1, "type": "User", "url": f"{self.server.url}/user"}, {}
+
+    def list_repos(self, verb):
+        names, headers = self.page(self.fleet.names)
+        return 200, [self.repo_json(name) for name in names], headers
+
+    def search_repos(self, verb):
+        terms = dict(term.split(":", 1) for term in self.query.get("q", "").split() if ":" in term)
+        if terms.get("user", self.fleet.owner).lower() != self.fleet.owner.lower():
+            return 200, {"total_count": 0, "incomplete_results": False, "items": []}, {}
+        names = [
+            name for name in self.fleet.names
+            if "topic" not in terms or (terms["topic"] == self.fleet.topic and self.fleet.repos[name]["tagged"])
+        ]
+        # Like GitHub: the full count, but only the first 1000 results
+        total = len(names)
+        selected, headers = self.page(names[:1000])
+        payload = {
+            "total_count": total,
+            "incomplete_results": False,
+            "items": [self.repo_json(name) for name in selected]
+        }
+        return 200, payload, headers
+
+    def list_orgs(self, verb):
+        return 200, [], {}
+
+    def get_repo(self, verb, owner, name):
+        self.repo_state(owner, name)
+        return 200, self.repo_json(name), {}
+
+    def get_topics(self, verb, owner, name):
+        state = self.repo_state(owner, name)
+        return 200, {"names": [self.fleet.topic] if state["tagged"] else []}, {}
+
+    def list_branches(self, verb, owner, name):
+        state = self.repo_state(owner, name)
+        if self.query.get("protected") == "true":
+            with self.fleet.lock:
+                branches = sorted(state["protections"])
+            selected, headers = self.page(branches)
+        else:
+            indexes, headers = self.page(range(self.fleet.branches))
+            selected = [self.fleet.branch_name(index) for index in indexes]
+        with self.fleet.lock:
+            return 200, [self.branch_json(name, branch, state) for branch in selected], headers
+
+    def get_branch(self, verb, owner, name, branch):
+        state = self.repo_state(owner, name)
+        if not self.fleet.has_branch(branch):
+            raise NotFound("Branch not found")
+        with self.fleet.lock:
+            return 200, self.branch_json(name, branch, state), {}
+
+    def get_protection(self, verb, owner, name, branch):
+        state = self.repo_state(owner, name)
+        with self.fleet.lock:
+            protection = copy.deepcopy(state["protections"].get(branch))
+        if protection is None:
+            raise NotFound("Branch not protected")
+        return 200, self.protection_json(name, branch, protection), {}
+
+    def put_protection(self, verb, owner, name, branch):
+        state = self.repo_state(owner, name)
+        if not self.fleet.has_branch(branch):
+            raise NotFound("Branch not found")
+        body = self.body or {}
+        for key in ("required_status_checks", "enforce_admins", "required_pull_request_reviews", "restrictions"):
+            if key not in body:
+                raise Unprocessable(f"{key} is required")
+        protection = {"enforce_admins": bool(body["enforce_admins"])}
+        if body["required_status_checks"]:
+            rsc = body["required_status_checks"]
+            protection["required_status_checks"] = {"strict": rsc.get("strict", False),
+                                                    "contexts": rsc.get("contexts", [])}
+        if body["required_pull_request_reviews"]:
+            protection["required_pull_request_reviews"] = self.reviews_from(body["required_pull_request_reviews"])
+        if body["restrictions"]:
+            protection["restrictions"] = {"users": body["restrictions"].get("users", []),
+                                          "teams": body["restrictions"].get("teams", [])}
+        with self.fleet.lock:
+            state["protections"][branch] = protection
+        return 200, self.protection_json(name, branch, protection), {}
+
+    def reviews_from(self, body, current=None):
+        reviews = dict(current or {})
+        for key in ("dismiss_stale_reviews", "require_code_owner_reviews", "required_approving_review_count"):
+            if key in body:
+                reviews[key] = body[key]
+        reviews.setdefault("required_approving_review_count", 1)
+        dismissal = body.get("dismissal_restrictions")
+        if dismissal is not None:
+            reviews.pop("dismissal_users", None)
+            reviews.pop("dismissal_teams", None)
+            if dismissal.get("users"):
+                reviews["dismissal_users"] = dismissal["users"]
+            if dismissal.get("teams"):
+                reviews["dismissal_teams"] = dismissal["teams"]
+        return reviews
+
+    def delete_protection(self, verb, owner, name, branch):
+        state = self.repo_state(owner, name)
+        with self.fleet.lock:
+            if state["protections"].pop(branch, None) is None:
+                raise NotFound("Branch not protected")
+        return 204, None, {}
+
+    def protection_section(self, verb, owner, name, branch, section):
+        state = self.repo_state(owner, name)
+        with self.fleet.lock:
+            protection = state["protections"].get(branch)
+            if protection is None:
+                raise NotFound("Branch not protected")
+            body = self.body or {}
+            if verb == "GET":
+                # PyGithub fetches a section to complete attributes the
+                # protection response left out, e.g. dismissal restrictions
+                data = self.protection_json(name, branch, protection).get(section)
+                if data is None:
+                    raise NotFound()
+                return 200, data, {}
+            if section == "enforce_admins" and verb in ("POST", "DELETE"):
+                protection["enforce_admins"] = verb == "POST"
+            elif section == "required_status_checks" and verb == "PATCH":
+                rsc = protection.setdefault("required_status_checks", {"strict": False, "contexts": []})
+                rsc.update({key: body[key] for key in ("strict", "contexts") if key in body})
+            elif section == "required_pull_request_reviews" and verb == "PATCH":
+                protection["required_pull_request_reviews"] = self.reviews_from(
+                    body, protection.get("required_pull_request_reviews")
+                )
+            elif section in ("restrictions/users", "restrictions/teams") and verb == "PUT":
+                if "restrictions" not in protection:
+                    raise Unprocessable("Push restrictions are not enabled")
+                field = section.split("/")[1]
+                protection["restrictions"][field] = body.get(field, [])
+            elif section in ("required_status_checks", "required_pull_request_reviews", "restrictions") \
+                    and verb == "DELETE":
+                protection.pop(section, None)
+                return 204, None, {}
+            else:
+                raise NotFound()
+            return 200, self.protection_json(name, branch, protection), {}
+
+    # Rulesets
+
+    def ruleset_json(self, name, ruleset_id, ruleset):
+        data = dict(copy.deepcopy(ruleset), id=ruleset_id, source_type="Repository",
+                    source=f"{self.fleet.owner}/{name}", created_at="2026-01-01T00:00:00Z")
+        for rule in data.get("rules", []):
+            if rule["type"] == "pull_request":
+                # GitHub fills in parameters the request left out
+                rule["parameters"].setdefault("allowed_merge_methods", ["merge", "squash", "rebase"])
+        return data
+
+    def list_rulesets(self, verb, owner, name):
+        state = self.repo_state(owner, name)
+        with self.fleet.lock:
+            items = [
+                {"id": ruleset_id, "name": ruleset["name"], "target": ruleset.get("target", "branch"),
+                 "source_type": "Repository", "source": f"{self.fleet.owner}/{name}",
+                 "enforcement": ruleset.get("enforcement", "active")}
+                for ruleset_id, ruleset in sorted(state["rulesets"].items())
+            ]
+        selected, headers = self.page(items)
+        return 200, selected, headers
+
+    def create_ruleset(self, verb, owner, name):
+        state = self.repo_state(owner, name)
+        body = self.body or {}
+        if not body.get("name") or "rules" not in body:
+            raise Unprocessable("name and rules are required")
+        with self.fleet.lock:
+            if any(ruleset["name"] == body["name"] for ruleset in state["rulesets"].values()):
+                raise Unprocessable("Name must be unique")
+            ruleset_id = self.fleet.next_ruleset_id
+            self.fleet.next_ruleset_id += 1
+            state["rulesets"][ruleset_id] = copy.deepcopy(body)
+            return 201, self.ruleset_json(name, ruleset_id, body), {}
+
+    def ruleset(self, verb, owner, name, ruleset_id):
+        state = self.repo_state(owner, name)
+        ruleset_id = int(ruleset_id)
+        with self.fleet.lock:
+            if ruleset_id not in state["rulesets"]:
+                raise NotFound()
+            if verb == "GET":
+                return 200, self.ruleset_json(name, ruleset_id, state["rulesets"][ruleset_id]), {}
+            if verb == "PUT":
+                state["rulesets"][ruleset_id].update(copy.deepcopy(self.body or {}))
+                return 200, self.ruleset_json(name, ruleset_id, state["rulesets"][ruleset_id]), {}
+            if verb == "DELETE":
+                del state["rulesets"][ruleset_id]
+                return 204, None, {}
+            raise NotFound()
+
+    # GraphQL
+
+    def graphql(self, verb):
+        query = (self.body or {}).get("query", "")
+        variables = (self.body or {}).get("variables") or {}
+        if "repositoryOwner(" in query:
+            return 200, {"data": self.gql_owner_repos(variables)}, {}
+        if re.search(r"\br\d+: repository\(", query):
+            return 200, {"data": self.gql_rules(query, variables)}, {}
+        if "node(id:" in query:
+            empty = {"pageInfo": {"hasNextPage": False, "endCursor": None}, "nodes": []}
+            return 200, {"data": {"node": {"matchingRefs": empty}}}, {}
+        if query.lstrip().startswith("mutation"):
+            data, errors = self.gql_mutations(query, variables)
+            payload = {"data": data}
+            if errors:
+                payload["errors"] = errors
+            return 200, payload, {}
+        return 200, {"data": None, "errors": [{"message": "Query not supported by the fake server"}]}, {}
+
+    def gql_owner_repos(self, variables):
+        if variables.get("login", "").lower() != self.fleet.owner.lower():
+            return {"repositoryOwner": None}
+        start = int(variables.get("cursor") or 0)
+        names = self.fleet.names[start:start + 100]
+        nodes = []
+        for name in names:
+            state = self.fleet.repos[name]
+            nodes.append({
+                "id": f"R_{name}",
+                "name": name,
+                "nameWithOwner": f"{self.fleet.owner}/{name}",
+                "viewerPermission": "ADMIN",
+                "defaultBranchRef": {"name": "main"},
+                "repositoryTopics": {"nodes": [{"topic": {"name": self.fleet.topic}}] if state["tagged"] else []}
+            })
+        more = start + 100 < len(self.fleet.names)
+        return {"repositoryOwner": {"repositories": {
+            "pageInfo": {"hasNextPage": more, "endCursor": str(start + 100) if more else None},
+            "nodes": nodes
+        }}}
+
+    def gql_rules(self, query, variables):
+        data = {}
+        for alias in re.findall(r"\b(r\d+): repository\(", query):
+            index = alias[1:]
+            owner, name = variables.get(f"o{index}", ""), variables.get(f"n{index}", "")
+            if owner.lower() != self.fleet.owner.lower() or name not in self.fleet.repos:
+                data[alias] = None
+                continue
+            state = self.fleet.repos[name]
+            data[alias] = {"id": f"R_{name}"}
+            if f"after: $c{index})" in query:
+                with self.fleet.lock:
+                    branches = sorted(state["protections"])
+                    start = int(variables.get(f"c{index}") or 0)
+                    nodes = [self.rule_node(name, b, state["protections"][b]) for b in branches[start:start + 100]]
+                more = start + 100 < len(branches)
+                data[alias]["branchProtectionRules"] = {
+                    "pageInfo": {"hasNextPage": more, "endCursor": str(start + 100) if more else None},
+                    "nodes": nodes
+                }
+            if f"after: $b{index})" in query:
+                start = int(variables.get(f"b{index}") or 0)
+                end = min(start + 100, self.fleet.branches)
+                more = end < self.fleet.branches
+                data[alias]["refs"] = {
+                    "pageInfo": {"hasNextPage": more, "endCursor": str(end) if more else None},
+                    "nodes": [{"name": self.fleet.branch_name(index)} for index in range(start, end)]
+                }
+        return data
+
+    def rule_node(self, name, branch, protection):
+        rsc = protection.get("required_status_checks")
+        rpr = protection.get("required_pull_request_reviews")
+        restrictions = protection.get("restrictions")
+        dismissal = [{"actor": {"login": u}} for u in (rpr or {}).get("dismissal_users", [])] + \
+            [{"actor": {"slug": t}} for t in (rpr or {}).get("dismissal_teams", [])]
+        pushers = [{"actor": {"login": u}} for u in (restrictions or {}).get("users", [])] + \
+            [{"actor": {"slug": t}} for t in (restrictions or {}).get("teams", [])]
+        return {
+            "id": rule_id(name, branch),
+            "pattern": branch,
+            "requiresStatusChecks": bool(rsc),
+            "requiresStrictStatusChecks": bool(rsc and rsc.get("strict")),
+            "requiredStatusCheckContexts": (rsc or {}).get("contexts", []),
+            "requiresApprovingReviews": bool(rpr),
+            "requiredApprovingReviewCount": (rpr or {}).get("required_approving_review_count"),
+            "dismissesStaleReviews": bool(rpr and rpr.get("dismiss_stale_reviews")),
+            "requiresCodeOwnerReviews": bool(rpr and rpr.get("require_code_owner_reviews")),
+            "restrictsReviewDismissals": bool(dismissal),
+            "reviewDismissalAllowances": {"nodes": dismissal},
+            "isAdminEnforced": protection.get("enforce_admins", False),
+            "restrictsPushes": restrictions is not None,
+            "pushAllowances": {"nodes": pushers},
+            "matchingRefs": {
+                "pageInfo": {"hasNextPage": False, "endCursor": None},
+                "nodes": [{"name": branch}] if self.fleet.has_branch(branch) else []
+            }
+        }
+
+    def gql_mutations(self, query, variables):
+        data = {}
+        errors = []
+        for alias, kind, variable in re.findall(
+            r"\b(m\d+): (create|update|delete)BranchProtectionRule\(input: \$(\w+)\)", query
+        ):
+            try:
+                self.apply_mutation(kind, variables.get(variable) or {})
+                data[alias] = {"clientMutationId": None}
+            except (NotFound, Unprocessable) as e:
+                data[alias] = None
+                errors.append({"path": [alias], "message": str(e) or "Not Found"})
+        return data, errors
+
+    def apply_mutation(self, kind, input):
+        if kind == "create":
+            name = input.get("repositoryId", "")[2:]
+            branch = input.get("pattern")
+            if name not in self.fleet.repos:
+                raise NotFound(f"Could not resolve to a node with the global id of '{input.get('repositoryId')}'")
+        else:
+            name, branch = parse_rule_id(input.get("branchProtectionRuleId", ""))
+            if name not in self.fleet.repos:
+                raise NotFound(f"Could not resolve to a node with the global id of "
+                               f"'{input.get('branchProtectionRuleId')}'")
+        state = self.fleet.repos[name]
+        with self.fleet.lock:
+            current = state["protections"].get(branch)
+            if kind == "create" and current is not None:
+                raise Unprocessable(f"Name already protected: {branch}")
+            if kind != "create" and current is None:
+                raise NotFound("Branch protection rule not found")
+            if kind == "delete":
+                del state["protections"][branch]
+                return
+            protection = dict(current or {})
+            protection["enforce_admins"] = input.get("isAdminEnforced", protection.get("enforce_admins", False))
+            if input.get("requiresStatusChecks") is False:
+                protection.pop("required_status_checks", None)
+            elif input.get("requiresStatusChecks"):
+                protection["required_status_checks"] = {
+                    "strict": input.get("requiresStrictStatusChecks", False),
+                    "contexts": input.get("requiredStatusCheckContexts", [])
+                }
+            if input.get("requiresApprovingReviews") is False:
+                protection.pop("required_pull_request_reviews", None)
+            elif input.get("requiresApprovingReviews"):
+                protection["required_pull_request_reviews"] = {
+                    "dismiss_stale_reviews": input.get("dismissesStaleReviews", False),
+                    "require_code_owner_reviews": input.get("requiresCodeOwnerReviews", False),
+                    "required_approving_review_count": input.get("requiredApprovingReviewCount", 1)
+                }
+            if input.get("restrictsPushes") is False:
+                protection.pop("restrictions", None)
+            state["protections"][branch] = protection
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic GitHub fleet for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--repos", type=int, default=100, help="Repositories in the fleet")
+    parser.add_argument("--branches", type=int, default=10, help="Branches per repository")
+    parser.add_argument("--protected", type=int, default=2, help="Protected branches per repository")
+    parser.add_argument("--drift", type=float, default=0.2, help="Share of protected branches that differ from master")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random extra latency per request")
+    parser.add_argument("--rate-limit", type=int, help="Enforce this many core requests per window")
+    parser.add_argument("--rate-window", type=int, default=3600, help="Rate limit window in seconds")
+    args = parser.parse_args()
+
+    fleet = Fleet(args.repos, args.branches, args.protected, args.drift)
+    rate_limits = RateLimits(args.rate_limit or 1000000, args.rate_window, enforce=args.rate_limit is not None)
+    server = FakeGitHub((args.host, args.port), fleet, args.latency_ms / 1000, args.jitter_ms / 1000, rate_limits)
+    print(f"Serving {args.repos} repositories on {server.url} (set GITHUB_API_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
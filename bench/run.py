@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# Runs discover.py, export.py and sync.py against the fake GitHub server and
+# reports requests, wall time and peak memory per scenario.
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from fake_github import Fleet, RateLimits, start_server
+
+ROOT = Path(__file__).parent.parent
+BASELINES_DIR = Path(__file__).parent / "baselines"
+
+SCENARIOS = {
+    # Cold start: no token check or API calls, so mostly interpreter and import time
+    "startup": ["sync.py", "--help"],
+    "validate": ["validate.py"],
+    "discover": ["discover.py"],
+    "export": ["export.py", "--repo", "{owner}/repo-00000"],
+    "dry-run": ["sync.py", "--dry-run"],
+    "apply": ["sync.py"]
+}
+
+def parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+def make_home(fleet, overrides):
+    # A scratch GITHUB_SYNC_HOME with the repository's config.json, the
+    # fleet's master settings and empty logs and cache
+    home = Path(tempfile.mkdtemp(prefix="github-sync-bench-"))
+    with open(ROOT / "config.json") as f:
+        config = json.load(f)
+    config.update({
+        "target_topic": fleet.topic,
+        "discovery_owners": None,
+        "discovery_cache_ttl": 0,
+        "incremental": False,
+        "credentials": []
+    })
+    for key, value in overrides.items():
+        target = config
+        *parents, leaf = key.split(".")
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = value
+    with open(home / "config.json", "w") as f:
+        json.dump(config, f, indent=2)
+    (home / "settings").mkdir()
+    with open(home / "settings" / "branch-protection.json", "w") as f:
+        json.dump(fleet.master_settings(), f, indent=2)
+    return home
+
+def run_scenario(name, server, home, args):
+    command = [sys.executable, str(ROOT / SCENARIOS[name][0])] + [
+        part.format(owner=server.fleet.owner) for part in SCENARIOS[name][1:]
+    ]
+    env = dict(os.environ, GITHUB_SYNC_HOME=str(home), GITHUB_API_URL=server.url, GITHUB_TOKEN="bench-token",
+               PYTHONUNBUFFERED="1")
+    output_file = home / f"{name}.out"
+    server.reset_stats()
+    started = time.perf_counter()
+    with open(output_file, "w") as output:
+        process = subprocess.Popen(command, cwd=home, env=env, stdout=output, stderr=subprocess.STDOUT)
+        # wait4 reports the peak memory of this child alone
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - started
+
+    by_endpoint = Counter()
+    for key, count in server.stats.items():
+        by_endpoint[key] += count
+    result = {
+        "requests": sum(by_endpoint.values()),
+        "wall_seconds": round(wall, 3),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "exit_code": process.returncode,
+        "by_endpoint": dict(sorted(by_endpoint.items()))
+    }
+    if process.returncode != 0:
+        tail = output_file.read_text().strip().splitlines()[-5:]
+        result["error"] = "\n".join(tail)
+    return result
+
+def compare(results, baseline, tolerance, time_tolerance):
+    regressions = []
+    print(f"\nCompared with baseline '{baseline['name']}':")
+    if baseline["parameters"] != results["parameters"]:
+        print("  ! Parameters differ from the baseline; numbers are not directly comparable")
+    for scenario, current in results["scenarios"].items():
+        before = baseline["scenarios"].get(scenario)
+        if before is None:
+            continue
+        for metric, allowed in (("requests", tolerance), ("wall_seconds", time_tolerance), ("peak_rss_mb", tolerance)):
+            old, new = before[metric], current[metric]
+            change = (new - old) / old if old else 0.0
+            flag = ""
+            if change > allowed:
+                flag = "  REGRESSION"
+                regressions.append(f"{scenario} {metric}")
+            print(f"  {scenario:<10} {metric:<13} {old:>10} -> {new:<10} {change:+.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sync tool against a fake GitHub server")
+    parser.add_argument("--repos", type=int, default=100, help="Repositories in the fleet (10 to 10,000)")
+    parser.add_argument("--branches", type=int, default=10, help="Branches per repository (1 to 5,000)")
+    parser.add_argument("--protected", type=int, default=2, help="Protected branches per repository")
+    parser.add_argument("--drift", type=float, default=0.2, help="Share of protected branches that differ from master")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random extra latency per request")
+    parser.add_argument("--write-failures", type=float, default=0, help="Share of writes answered with a 502")
+    parser.add_argument("--rate-limit", type=int, help="Enforce this many core requests per window")
+    parser.add_argument("--rate-window", type=int, default=3600, help="Rate limit window in seconds")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="Scenario to run (repeatable; default: all, in order)")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="Override a config.json key for the run, e.g. workers=8 or rate_limit.enabled=false")
+    parser.add_argument("--save", metavar="NAME", help="Save the results as baseline NAME")
+    parser.add_argument("--compare", metavar="NAME", help="Compare with baseline NAME and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="Allowed growth in requests and memory")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="Allowed growth in wall time")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory with logs and output")
+    args = parser.parse_args()
+
+    overrides = {}
+    for item in args.set:
+        key, _, value = item.partition("=")
+        overrides[key] = parse_value(value)
+    parameters = {
+        "repos": args.repos,
+        "branches": args.branches,
+        "protected": args.protected,
+        "drift": args.drift,
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "rate_limit": args.rate_limit,
+        "write_failures": args.write_failures,
+        "config": overrides
+    }
+
+    results = {"parameters": parameters, "scenarios": {}}
+    for name in args.scenario or list(SCENARIOS):
+        # Every scenario starts from the same fleet, so apply always has work
+        fleet = Fleet(args.repos, args.branches, args.protected, args.drift)
+        rate_limits = RateLimits(args.rate_limit or 1000000, args.rate_window, enforce=args.rate_limit is not None)
+        server = start_server(fleet, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                              rate_limits=rate_limits, write_failures=args.write_failures)
+        home = make_home(fleet, overrides)
+        try:
+            result = run_scenario(name, server, home, args)
+        finally:
+            server.shutdown()
+            server.server_close()
+            if args.keep:
+                print(f"  scratch directory: {home}")
+            else:
+                shutil.rmtree(home, ignore_errors=True)
+        results["scenarios"][name] = result
+        status = "ok" if result["exit_code"] == 0 else f"exit {result['exit_code']}"
+        print(f"{name:<10} {result['requests']:>8} requests {result['wall_seconds']:>9.2f} s "
+              f"{result['peak_rss_mb']:>8.1f} MB  {status}")
+        if "error" in result:
+            print("  " + result["error"].replace("\n", "\n  "))
+
+    regressions = []
+    if args.compare:
+        with open(BASELINES_DIR / f"{args.compare}.json") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.time_tolerance)
+
+    if args.save:
+        BASELINES_DIR.mkdir(exist_ok=True)
+        path = BASELINES_DIR / f"{args.save}.json"
+        with open(path, "w") as f:
+            json.dump(dict(results, name=args.save), f, indent=2)
+        print(f"\nSaved baseline to {path}")
+
+    failed = [name for name, result in results["scenarios"].items() if result["exit_code"] != 0]
+    if failed or regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,26 @@
 #!/usr/bin/env python3
 import sys
+import argparse
+from datetime import datetime
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
-from github_client import GitHubClient
-from discovery import find_repos_by_topic
-from config import load_config
+from discovery import discover_repos, write_repo_list
+from config import load_config, get_cache_dir, get_logs_dir
+from metrics import phase, report, profiled
 
 def main():
+    parser = argparse.ArgumentParser(description="Discover target repositories")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the cached repository list")
+    parser.add_argument("--output", metavar="FILE", help="Also write the repository names to FILE, for sync.py --repos")
+    parser.add_argument("--profile", action="store_true", help="Profile CPU and memory and print the hot spots")
+    args = parser.parse_args()
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    with profiled(get_logs_dir() / f"profile_discover_{timestamp}.prof", args.profile):
+        run(args)
+
+def run(args):
     print("Discovering target repositories...")
     
     try:
@@ -15,8 +28,10 @@ def main():
         topic = config["target_topic"]
         print(f"Looking for repositories with topic: {topic}")
         
+        from github_client import GitHubClient
         client = GitHubClient()
-        repos = find_repos_by_topic(client, topic)
+        with phase("discover"):
+            repos = discover_repos(client, config, get_cache_dir() / "discovery.json", args.refresh)
         
         if not repos:
             print(f"✗ No repositories found with topic '{topic}' where you have admin access")
@@ -26,6 +41,13 @@ def main():
         for repo in repos:
             print(f"  - {repo.full_name}")
         
+        if args.output:
+            write_repo_list(args.output, [repo.full_name for repo in repos])
+            print(f"\n✓ Repository list written to {args.output}")
+        
+        for path in report("discover", config, client):
+            print(f"\n✓ Metrics: {path}")
+        
     except Exception as e:
         print(f"✗ Error: {e}")
         sys.exit(1)
@@ -1,27 +1,36 @@
 #!/usr/bin/env python3
 import sys
 import argparse
+from datetime import datetime
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
-from github_client import GitHubClient
-from exporter import export_branch_protection, save_branch_protection
-from config import get_settings_dir
+from config import load_config, get_settings_dir, get_logs_dir
+from metrics import phase, report, profiled
 
 def main():
     parser = argparse.ArgumentParser(description="Export GitHub repository settings")
     parser.add_argument("--repo", required=True, help="Repository in format owner/name")
+    parser.add_argument("--profile", action="store_true", help="Profile CPU and memory and print the hot spots")
     args = parser.parse_args()
     
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    with profiled(get_logs_dir() / f"profile_export_{timestamp}.prof", args.profile):
+        run(args)
+
+def run(args):
     print(f"Exporting settings from {args.repo}...")
     
     try:
+        from github_client import GitHubClient
+        from exporter import export_branch_protection, save_branch_protection
         client = GitHubClient()
         repo = client.get_repo(args.repo)
         
         print(f"✓ Repository found: {repo.full_name}")
         
-        branches_data = export_branch_protection(repo)
+        with phase("export"):
+            branches_data = export_branch_protection(repo)
         print(f"✓ Exported {len(branches_data)} branches")
         
         settings_dir = get_settings_dir()
@@ -31,6 +40,9 @@ def main():
         print(f"✓ Saved to: {output_file}")
         print("\n✓ Export complete!")
         
+        for path in report("export", load_config(), client):
+            print(f"✓ Metrics: {path}")
+        
     except Exception as e:
         print(f"✗ Error: {e}")
         sys.exit(1)
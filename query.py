@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import sys
+import json
+import argparse
+from datetime import datetime
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from snapshot_store import SnapshotStore
+from config import get_cache_dir
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Query the fleet snapshot written by snapshot.py, without calling the API",
+        epilog="Example: query.py --branch main --missing-check ci/test"
+    )
+    parser.add_argument("--store", help="SQLite file to read (default: .cache/snapshot.sqlite)")
+    parser.add_argument("--branch", help="Only this branch")
+    parser.add_argument("--unprotected", action="store_true", help="Only branches without protection")
+    parser.add_argument("--missing-check", metavar="CONTEXT", help="Only branches that do not require this status check")
+    parser.add_argument("--field", action="append", default=[], metavar="PATH=VALUE",
+                        help="Only protections where a field matches, e.g. enforce_admins=false or "
+                             "required_pull_request_reviews.required_approving_review_count<2 (repeatable)")
+    parser.add_argument("--errors", action="store_true", help="List repositories the snapshot could not export")
+    parser.add_argument("--sql", help="Run a read-only SQL query against the snapshot tables")
+    parser.add_argument("--json", action="store_true", help="Print matches as JSON lines with their protection")
+    args = parser.parse_args()
+    
+    path = Path(args.store) if args.store else get_cache_dir() / "snapshot.sqlite"
+    if not path.exists():
+        print(f"✗ No snapshot at {path}; run snapshot.py first")
+        sys.exit(1)
+    
+    store = SnapshotStore(path)
+    try:
+        info = store.info()
+        if "taken_at" not in info:
+            print(f"✗ {path} holds no completed snapshot; run snapshot.py first")
+            sys.exit(1)
+        taken_at = datetime.fromtimestamp(info["taken_at"]).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"Snapshot of {info['repositories']} repositories taken {taken_at}\n", file=sys.stderr)
+        
+        if args.errors:
+            for name, error in store.repositories(errors=True):
+                print(f"{name}\t{error}")
+            return
+        
+        if args.sql:
+            columns, rows = store.execute(args.sql)
+            print("\t".join(columns))
+            for row in rows:
+                print("\t".join("" if value is None else str(value) for value in row))
+            return
+        
+        matches = store.query(args.branch, args.unprotected, args.missing_check, args.field)
+        for name, branch, protection in matches:
+            if args.json:
+                print(json.dumps({"repository": name, "branch": branch, "protection": protection}))
+            else:
+                print(f"{name}\t{branch}")
+        repositories = len({name for name, _, _ in matches})
+        print(f"\n{len(matches)} branches in {repositories} repositories", file=sys.stderr)
+        
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        sys.exit(1)
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+import sys
+import signal
+import argparse
+from datetime import datetime
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from config import load_config, get_logs_dir
+from metrics import phase, report, profiled
+from sync import create_logger, open_outbox, print_outbox
+
+def main():
+    parser = argparse.ArgumentParser(description="Undo the changes recorded in a sync change log")
+    parser.add_argument("log", metavar="LOG", help="Change log of the run to undo (logs/sync_TIMESTAMP.jsonl)")
+    parser.add_argument("--dry-run", action="store_true", help="Preview the rollback without applying it")
+    parser.add_argument("--workers", type=int, help="Number of repositories rolled back concurrently")
+    parser.add_argument("--profile", action="store_true", help="Profile CPU and memory and print the hot spots")
+    args = parser.parse_args()
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    with profiled(get_logs_dir() / f"profile_rollback_{timestamp}.prof", args.profile):
+        run(args)
+
+def run(args):
+    mode = "DRY-RUN" if args.dry_run else "APPLY"
+    print(f"=== ROLLBACK {mode} MODE ===\n")
+
+    try:
+        config = load_config()
+        workers = args.workers or config.get("workers", 1)
+        log = Path(args.log)
+        if not log.exists() and not any(log.parent.glob(f"{log.stem}.*.jsonl*")):
+            raise FileNotFoundError(f"Log file not found: {log}")
+
+        # Imported here: the rollback pulls in PyGithub through the applier
+        from rollback_engine import plan_rollback, format_steps, run_rollback
+        plan, skipped = plan_rollback(args.log)
+        steps = sum(len(repo_steps) for repo_steps in plan.values())
+        print(f"✓ {steps} changes to undo across {len(plan)} repositories")
+        if skipped:
+            print(f"✗ {skipped} changes were logged without their previous state and are left as they are")
+        if not plan:
+            return
+        print()
+
+        if args.dry_run:
+            for label, repo_steps in plan.items():
+                print("\n".join([f"Repository: {label}"] + format_steps(repo_steps)))
+                print()
+            print("✓ Dry-run complete (no changes applied)")
+            return
+
+        from github_client import GitHubClient
+        client = GitHubClient(workers=workers)
+        logger = create_logger(config)
+        outbox = open_outbox(config)
+        # SIGTERM skips atexit unless it is turned into a normal exit
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+        def print_result(result):
+            print("\n".join(result["lines"]))
+            print()
+
+        with phase("apply"):
+            totals = run_rollback(client, plan, logger, workers, print_result, outbox)
+
+        print(f"Summary: {totals['changes']} changes undone across {totals['repositories']} repositories")
+        print(f"✓ Rolled back: {totals['success']} successful, {totals['errors']} errors")
+        if outbox is not None:
+            print_outbox(outbox)
+        logger.close()
+        print(f"✓ Log file: {logger.get_log_file()}")
+
+        for path in report("rollback", config, client):
+            print(f"✓ Metrics: {path}")
+        if totals["errors"]:
+            sys.exit(1)
+
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
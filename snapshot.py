@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+from datetime import datetime
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from discovery import discover_repos, read_repo_list, repos_from_names
+from snapshot_store import SnapshotStore, take_snapshot
+from config import load_config, get_cache_dir, get_logs_dir
+from metrics import phase, report, profiled
+
+def main():
+    parser = argparse.ArgumentParser(description="Store the branch protection of every target repository locally")
+    parser.add_argument("--store", help="SQLite file to write (default: .cache/snapshot.sqlite)")
+    parser.add_argument("--workers", type=int, help="Number of repositories exported concurrently")
+    parser.add_argument("--exporter", choices=["rest", "graphql"], help="How target branch protection is read")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the cached repository list")
+    parser.add_argument("--repos", metavar="FILE", help="Export the repositories listed in FILE instead of discovering them")
+    parser.add_argument("--profile", action="store_true", help="Profile CPU and memory and print the hot spots")
+    args = parser.parse_args()
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    with profiled(get_logs_dir() / f"profile_snapshot_{timestamp}.prof", args.profile):
+        run(args)
+
+def run(args):
+    print("=== SNAPSHOT ===\n")
+
+    try:
+        config = load_config()
+        workers = args.workers or config.get("workers", 1)
+        exporter = args.exporter or config.get("exporter", "rest")
+        batch_size = config.get("graphql_batch_size", 10) if exporter == "graphql" else 1
+        path = Path(args.store) if args.store else get_cache_dir() / "snapshot.sqlite"
+
+        from github_client import GitHubClient
+        from sync_engine import make_exporter
+        client = GitHubClient(workers=workers)
+        if args.repos:
+            repos = repos_from_names(client, read_repo_list(args.repos))
+        else:
+            with phase("discover"):
+                repos = discover_repos(client, config, get_cache_dir() / "discovery.json", args.refresh)
+        if not repos:
+            print(f"✗ No repositories found with topic '{config['target_topic']}'")
+            sys.exit(1)
+        print(f"✓ Found {len(repos)} target repositories")
+
+        done = [0]
+
+        def print_progress(batch, exported):
+            done[0] += len(batch)
+            if exported is None:
+                for repo in batch:
+                    print(f"  ✗ {repo.full_name}: export failed")
+            if done[0] % 100 < len(batch) or done[0] == len(repos):
+                print(f"  {done[0]}/{len(repos)} exported")
+
+        store = SnapshotStore(path)
+        try:
+            take_snapshot(
+                store, repos, make_exporter(client, exporter),
+                {"topic": config["target_topic"], "exporter": exporter, "base_url": client.base_url},
+                workers, batch_size, client.bind, print_progress
+            )
+            info = store.info()
+        finally:
+            store.close()
+
+        print(f"\n✓ Stored {info['repositories']} repositories, {info['branches']} branches "
+              f"({info['protected_branches']} protected) in {path}")
+        if info["errors"]:
+            print(f"✗ {info['errors']} repositories could not be exported (see query.py --errors)")
+
+        for metrics_path in report("snapshot", config, client):
+            print(f"✓ Metrics: {metrics_path}")
+
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,72 +1,333 @@
-from github import GithubException
+from functools import partial
+from urllib.parse import quote
 
-def apply_branch_protection(repo, branch_name, protection_config, logger):
+# outbox (and through it PyGithub) is imported by the functions that write,
+# so planning from a snapshot stays offline and fast
+
+def build_protection_payload(protection_config):
+    # Request body for PUT /repos/{owner}/{repo}/branches/{branch}/protection
+    payload = {
+        "required_status_checks": None,
+        "enforce_admins": protection_config.get("enforce_admins", False),
+        "required_pull_request_reviews": None,
+        "restrictions": None
+    }
+    
+    if "required_status_checks" in protection_config:
+        rsc = protection_config["required_status_checks"]
+        payload["required_status_checks"] = {
+            "strict": rsc.get("strict", False),
+            "contexts": rsc.get("contexts", [])
+        }
+    
+    if "required_pull_request_reviews" in protection_config:
+        rpr = protection_config["required_pull_request_reviews"]
+        payload["required_pull_request_reviews"] = {
+            "require_code_owner_reviews": rpr.get("require_code_owner_reviews", False),
+            "dismiss_stale_reviews": rpr.get("dismiss_stale_reviews", False),
+            "required_approving_review_count": rpr.get("required_approving_review_count", 1)
+        }
+        if "dismissal_users" in rpr or "dismissal_teams" in rpr:
+            payload["required_pull_request_reviews"]["dismissal_restrictions"] = {
+                "users": rpr.get("dismissal_users", []),
+                "teams": rpr.get("dismissal_teams", [])
+            }
+    
+    if "restrictions" in protection_config:
+        rest = protection_config["restrictions"]
+        payload["restrictions"] = {
+            "users": rest.get("users", []),
+            "teams": rest.get("teams", [])
+        }
+    
+    return payload
+
+def _protection_url(repo, branch_name, section=""):
+    # Writes go straight to the protection endpoint; no Branch object is fetched first
+    url = f"{repo.url}/branches/{quote(branch_name, safe='')}/protection"
+    return f"{url}/{section}" if section else url
+
+def _write(repo, verb, url, body, action, details, logger, outbox=None):
+    # Transient failures are queued in the outbox to be replayed later
+    from outbox import WRITE_ERRORS, is_transient
+    branch_name = details["branch"]
     try:
-        branch = repo.get_branch(branch_name)
-        
-        kwargs = {}
-        
-        if "required_status_checks" in protection_config:
-            rsc = protection_config["required_status_checks"]
-            kwargs["strict"] = rsc.get("strict", False)
-            kwargs["contexts"] = rsc.get("contexts", [])
-        
-        if "required_pull_request_reviews" in protection_config:
-            rpr = protection_config["required_pull_request_reviews"]
-            kwargs["require_code_owner_reviews"] = rpr.get("require_code_owner_reviews", False)
-            kwargs["dismiss_stale_reviews"] = rpr.get("dismiss_stale_reviews", False)
-            kwargs["required_approving_review_count"] = rpr.get("required_approving_review_count", 1)
-        
-        kwargs["enforce_admins"] = protection_config.get("enforce_admins", False)
-        
-        if "restrictions" in protection_config:
-            rest = protection_config["restrictions"]
-            kwargs["user_push_restrictions"] = rest.get("users", [])
-            kwargs["team_push_restrictions"] = rest.get("teams", [])
-        
-        branch.edit_protection(**kwargs)
-        
-        logger.log(
-            repo.full_name,
-            "branch_protection",
-            "apply",
-            {"branch": branch_name, "protection": protection_config},
-            "success"
-        )
-        return True
-        
-    except GithubException as e:
+        repo.requester.requestJsonAndCheck(verb, url, input=body)
+    except WRITE_ERRORS as e:
+        if outbox is not None and is_transient(e):
+            outbox.add(repo.full_name, branch_name, action, verb, url, body, details, str(e))
         logger.log(
             repo.full_name,
             "branch_protection",
-            "apply",
+            action,
             {"branch": branch_name},
             "error",
             str(e)
         )
         return False
+    
+    if outbox is not None:
+        outbox.discard(repo.full_name, branch_name)
+    logger.log(
+        repo.full_name,
+        "branch_protection",
+        action,
+        details,
+        "success"
+    )
+    return True
+
+def apply_branch_protection(repo, branch_name, protection_config, logger, payload=None, outbox=None, old=None):
+    # payload: the request body when prepare_writes already built it. old:
+    # the protection being replaced (None if the branch was unprotected),
+    # logged so the change can be rolled back
+    return _write(
+        repo, "PUT", _protection_url(repo, branch_name), payload or build_protection_payload(protection_config),
+        "apply", {"branch": branch_name, "protection": protection_config, "old": old}, logger, outbox
+    )
+
+def remove_branch_protection(repo, branch_name, logger, outbox=None, old=None):
+    return _write(repo, "DELETE", _protection_url(repo, branch_name), None, "remove",
+                  {"branch": branch_name, "old": old}, logger, outbox)
+
+def _targeted_update(diff, new):
+    # The single sub-resource request (verb, section, body) that covers the
+    # whole diff, or None when only a full update will do
+    sections = {item["field"].split(".")[0] for item in diff}
+    if len(sections) != 1:
+        return None
+    section = sections.pop()
+    fields = {item["field"].split(".", 1)[-1] for item in diff}
+    
+    if section == "enforce_admins":
+        return ("POST" if new.get("enforce_admins", False) else "DELETE"), "enforce_admins", None
+    
+    if section in fields:
+        # The whole section is added or removed
+        if new.get(section) is not None:
+            return None
+        return "DELETE", section, None
+    
+    config = new[section]
+    if section == "required_status_checks":
+        body = {field: config.get(field, [] if field == "contexts" else False) for field in fields}
+        return "PATCH", section, body
+    
+    if section == "required_pull_request_reviews":
+        defaults = {
+            "dismiss_stale_reviews": False,
+            "require_code_owner_reviews": False,
+            "required_approving_review_count": 1
+        }
+        body = {field: config.get(field, defaults[field]) for field in fields if field in defaults}
+        if fields & {"dismissal_users", "dismissal_teams"}:
+            body["dismissal_restrictions"] = {
+                "users": config.get("dismissal_users", []),
+                "teams": config.get("dismissal_teams", [])
+            }
+        return "PATCH", section, body
+    
+    if section == "restrictions" and len(fields) == 1:
+        field = fields.pop()
+        return "PUT", f"restrictions/{field}", {field: config.get(field, [])}
+    
+    return None
+
+def apply_protection_diff(repo, branch_name, modification, logger, outbox=None):
+    new = modification["new"]
+    old = modification["old"]
+    if new is None:
+        return remove_branch_protection(repo, branch_name, logger, outbox, old)
+    
+    diff = modification.get("diff")
+    if "update" in modification:
+        update = modification["update"]
+    else:
+        update = _targeted_update(diff, new) if old is not None and diff else None
+    if update is None:
+        return apply_branch_protection(repo, branch_name, new, logger, modification.get("payload"), outbox, old)
+    
+    verb, section, body = update
+    return _write(
+        repo, verb, _protection_url(repo, branch_name, section), body, "apply",
+        {"branch": branch_name, "protection": new, "old": old, "fields": [item["field"] for item in diff]}, logger,
+        outbox
+    )
+
+def prepare_writes(changes):
+    # Builds each change's request body up front, so repos sharing a plan
+    # share the payloads too
+    for item in changes["additions"]:
+        item["payload"] = build_protection_payload(item["protection"])
+    for item in changes["modifications"]:
+        if item["new"] is None:
+            continue
+        diff = item.get("diff")
+        item["update"] = _targeted_update(diff, item["new"]) if item["old"] is not None and diff else None
+        if item["update"] is None:
+            item["payload"] = build_protection_payload(item["new"])
+    return changes
+
+RULE_MUTATIONS = {
+    "create": ("createBranchProtectionRule", "CreateBranchProtectionRuleInput"),
+    "update": ("updateBranchProtectionRule", "UpdateBranchProtectionRuleInput"),
+    "delete": ("deleteBranchProtectionRule", "DeleteBranchProtectionRuleInput")
+}
+
+def rule_input(protection_config):
+    # BranchProtectionRule fields for a protection in settings format
+    data = {
+        "isAdminEnforced": protection_config.get("enforce_admins", False),
+        "requiresStatusChecks": False,
+        "requiresApprovingReviews": False,
+        "restrictsPushes": False
+    }
+    
+    if "required_status_checks" in protection_config:
+        rsc = protection_config["required_status_checks"]
+        data["requiresStatusChecks"] = True
+        data["requiresStrictStatusChecks"] = rsc.get("strict", False)
+        data["requiredStatusCheckContexts"] = rsc.get("contexts", [])
+    
+    if "required_pull_request_reviews" in protection_config:
+        rpr = protection_config["required_pull_request_reviews"]
+        data["requiresApprovingReviews"] = True
+        data["requiredApprovingReviewCount"] = rpr.get("required_approving_review_count", 1)
+        data["dismissesStaleReviews"] = rpr.get("dismiss_stale_reviews", False)
+        data["requiresCodeOwnerReviews"] = rpr.get("require_code_owner_reviews", False)
+    
+    return data
+
+def _needs_actors(protection_config):
+    # Mutations take user and team node ids; the REST endpoints take logins
+    # and slugs, so protections naming actors stay on REST
+    rpr = protection_config.get("required_pull_request_reviews") or {}
+    return "restrictions" in protection_config or bool(rpr.get("dismissal_users") or rpr.get("dismissal_teams"))
+
+def plan_rule_mutations(repo, changes, target_settings):
+    # One operation per changed branch. Branches protected by a rule of their
+    # own are updated or deleted in place; the rest get an exact-name rule,
+    # which takes precedence over any wildcard rule that also matches.
+    rules = {b["name"]: b["rule"] for b in target_settings or [] if b.get("rule")}
+    operations = []
+    
+    def add(branch, protection, old, fallback):
+        # Every operation keeps its REST equivalent (call) in case the
+        # mutation cannot be sent
+        rule = rules.get(branch)
+        own_rule = rule is not None and rule["pattern"] == branch
+        operation = {"repo": repo, "branch": branch, "protection": protection, "old": old, "call": fallback}
+        if protection is None:
+            if own_rule:
+                operation.update(kind="delete", input={"branchProtectionRuleId": rule["id"]})
+            else:
+                operation["kind"] = "rest"
+        elif _needs_actors(protection) or (old is not None and rule is None):
+            # Protected, but read without rule ids (REST exporter)
+            operation["kind"] = "rest"
+        elif own_rule:
+            operation.update(kind="update", input={"branchProtectionRuleId": rule["id"], **rule_input(protection)})
+        else:
+            # repositoryId is filled in when the mutation is sent; see resolve_node_ids
+            operation.update(kind="create", input={"pattern": branch, **rule_input(protection)})
+        operations.append(operation)
+    
+    for item in changes["additions"]:
+        add(item["branch"], item["protection"], None, (apply_branch_protection, (item["branch"], item["protection"])))
+    for item in changes["modifications"]:
+        add(item["branch"], item["new"], item["old"], (apply_protection_diff, (item["branch"], item)))
+    for item in changes["deletions"]:
+        add(item["branch"], None, item["protection"],
+            (partial(remove_branch_protection, old=item["protection"]), (item["branch"],)))
+    
+    return operations
 
-def remove_branch_protection(repo, branch_name, logger):
+def resolve_node_ids(client, repos):
+    # Handles built from names only (--repos, webhooks) carry no node id;
+    # looks them up in one aliased query. Repos it cannot resolve keep None.
+    missing = [repo for repo in repos if repo.node_id is None]
+    if not missing:
+        return
+    declarations = []
+    selections = []
+    variables = {}
+    for i, repo in enumerate(missing):
+        declarations.append(f"$o{i}: String!, $n{i}: String!")
+        selections.append(f"r{i}: repository(owner: $o{i}, name: $n{i}) {{ id }}")
+        variables[f"o{i}"], variables[f"n{i}"] = repo.full_name.split("/", 1)
+    query = f"query({', '.join(declarations)}) {{ {' '.join(selections)} }}"
+    from outbox import WRITE_ERRORS
     try:
-        branch = repo.get_branch(branch_name)
-        branch.remove_protection()
-        
-        logger.log(
-            repo.full_name,
-            "branch_protection",
-            "remove",
-            {"branch": branch_name},
-            "success"
-        )
-        return True
-        
-    except GithubException as e:
-        logger.log(
-            repo.full_name,
-            "branch_protection",
-            "remove",
-            {"branch": branch_name},
-            "error",
-            str(e)
-        )
-        return False
+        data, _ = client.graphql(query, variables, owner=missing[0].owner)
+    except WRITE_ERRORS:
+        return
+    for i, repo in enumerate(missing):
+        repo.node_id = (data.get(f"r{i}") or {}).get("id")
+
+def _log_operation(operation, logger, error=None):
+    action = "remove" if operation["kind"] == "delete" else "apply"
+    details = {"branch": operation["branch"]}
+    if error is None:
+        if action == "apply":
+            details["protection"] = operation["protection"]
+        details["old"] = operation["old"]
+    logger.log(
+        operation["repo"].full_name,
+        "branch_protection",
+        action,
+        details,
+        "error" if error else "success",
+        error
+    )
+
+def apply_rule_mutations(client, operations, logger, outbox=None):
+    # Sends the operations as aliased mutations in one GraphQL request and
+    # returns one success flag per operation. When the whole request fails
+    # transiently, each operation is queued as its REST equivalent; when it
+    # is rejected outright (one bad input fails the whole document), the
+    # flags are None and the caller sends each operation through REST.
+    declarations = []
+    selections = []
+    variables = {}
+    for i, operation in enumerate(operations):
+        mutation, input_type = RULE_MUTATIONS[operation["kind"]]
+        declarations.append(f"$i{i}: {input_type}!")
+        selections.append(f"m{i}: {mutation}(input: $i{i}) {{ clientMutationId }}")
+        variables[f"i{i}"] = operation["input"]
+    query = f"mutation({', '.join(declarations)}) {{ {' '.join(selections)} }}"
+    
+    owner = operations[0]["repo"].full_name.split("/", 1)[0]
+    from outbox import WRITE_ERRORS, is_transient
+    try:
+        data, errors = client.graphql(query, variables, owner=owner)
+    except WRITE_ERRORS as e:
+        if not is_transient(e):
+            return [None] * len(operations)
+        data, errors = {}, [{"message": str(e)}]
+        if outbox is not None:
+            for operation in operations:
+                repo, branch = operation["repo"], operation["branch"]
+                if operation["kind"] == "delete":
+                    outbox.add(repo.full_name, branch, "remove", "DELETE", _protection_url(repo, branch), None,
+                               {"branch": branch, "old": operation["old"]}, str(e))
+                else:
+                    outbox.add(repo.full_name, branch, "apply", "PUT", _protection_url(repo, branch),
+                               build_protection_payload(operation["protection"]),
+                               {"branch": branch, "protection": operation["protection"], "old": operation["old"]},
+                               str(e))
+    
+    if client.cache is not None:
+        for full_name in {operation["repo"].full_name for operation in operations}:
+            client.cache.invalidate(f"/repos/{full_name}")
+    
+    outcomes = []
+    for i, operation in enumerate(operations):
+        failures = [e.get("message", "") for e in errors if (e.get("path") or [None])[0] == f"m{i}"]
+        if data.get(f"m{i}") is None and not failures:
+            # Errors without a path sink the whole request
+            failures = [e.get("message", "") for e in errors if not e.get("path")] or ["No result"]
+        _log_operation(operation, logger, "; ".join(failures) if failures else None)
+        if outbox is not None and not failures:
+            outbox.discard(operation["repo"].full_name, operation["branch"])
+        outcomes.append(not failures)
+    return outcomes
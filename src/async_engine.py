@@ -0,0 +1,354 @@
+import asyncio
+import os
+import random
+import time
+from urllib.parse import quote
+from dotenv import load_dotenv
+
+from functools import partial
+from applier import build_protection_payload
+from exporter import serialize_protection_json
+from discovery import OWNER_REPOS_QUERY, SEARCH_CAP
+from config import get_base_url
+from metrics import phase, record_request
+from transport import TransportError, transport_options
+from outbox import is_transient_status
+from sync_engine import PlanCache, discard_settled
+
+class AsyncGitHub:
+    def __init__(self, token, base_url="https://api.github.com", concurrency=100, max_concurrent_writes=2,
+                 max_retries=5, transport=None):
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("The async engine needs httpx: run 'uv sync --extra async'")
+        self._transport_errors = (httpx.TransportError,)
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.requests = 0
+        self._reads = asyncio.Semaphore(concurrency)
+        self._writes = asyncio.Semaphore(max_concurrent_writes)
+        self._paused_until = 0
+        transport = transport or transport_options({})
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Accept": "application/vnd.github+json",
+            "User-Agent": "github-settings-sync",
+            "Accept-Encoding": "gzip" if transport["gzip"] else "identity"
+        }
+        if not transport["keep_alive"]:
+            headers["Connection"] = "close"
+        try:
+            self._http = httpx.AsyncClient(
+                headers=headers,
+                http2=transport["http2"],
+                timeout=httpx.Timeout(transport["read_timeout"], connect=transport["connect_timeout"]),
+                limits=httpx.Limits(
+                    max_connections=concurrency,
+                    max_keepalive_connections=concurrency if transport["keep_alive"] else 0
+                )
+            )
+        except ImportError:
+            raise ImportError("HTTP/2 needs httpx with h2: run 'uv sync --extra http2'")
+
+    async def close(self):
+        await self._http.aclose()
+
+    async def request(self, method, url, json=None):
+        if not url.startswith("http"):
+            url = self.base_url + url
+        write = method != "GET" and not url.endswith("/graphql")
+        semaphore = self._writes if write else self._reads
+        for attempt in range(self.max_retries + 1):
+            loop = asyncio.get_running_loop()
+            if self._paused_until > loop.time():
+                await asyncio.sleep(self._paused_until - loop.time())
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await self._http.request(method, url, json=json)
+                except self._transport_errors as e:
+                    raise TransportError(f"{method} {url}: {e}") from e
+                record_request(method, url, response.status_code, time.perf_counter() - started)
+                self.requests += 1
+            delay = self._retry_delay(response)
+            if delay is None or attempt == self.max_retries:
+                return response
+            self._paused_until = max(self._paused_until, loop.time() + delay)
+            await asyncio.sleep(delay + random.uniform(0, 2) + 2 ** attempt)
+        return response
+
+    def _retry_delay(self, response):
+        if response.status_code not in (403, 429, 502, 503, 504):
+            return None
+        if "retry-after" in response.headers:
+            return float(response.headers["retry-after"])
+        if response.headers.get("x-ratelimit-remaining") == "0":
+            reset = int(response.headers.get("x-ratelimit-reset", 0))
+            return max(reset - time.time(), 0)
+        if response.status_code == 403 and "rate limit" not in response.text.lower():
+            return None
+        return 1.0
+
+    async def get_json(self, url):
+        response = await self.request("GET", url)
+        response.raise_for_status()
+        return response.json()
+
+    async def paginate(self, url):
+        while url:
+            response = await self.request("GET", url)
+            response.raise_for_status()
+            data = response.json()
+            for item in data["items"] if isinstance(data, dict) else data:
+                yield item
+            url = response.links.get("next", {}).get("url")
+
+    async def graphql(self, query, variables):
+        response = await self.request("POST", "/graphql", json={"query": query, "variables": variables})
+        response.raise_for_status()
+        payload = response.json()
+        if payload.get("data") is None:
+            raise RuntimeError(f"GraphQL query failed: {payload.get('errors')}")
+        return payload["data"]
+
+async def default_owners(api):
+    # discovery.default_owners: the authenticated user and their organizations
+    owners = [(await api.get_json("/user"))["login"]]
+    async for org in api.paginate("/user/orgs?per_page=100"):
+        owners.append(org["login"])
+    return owners
+
+async def _graphql_repos(api, topic, owner):
+    repos = []
+    cursor = None
+    while True:
+        data = await api.graphql(OWNER_REPOS_QUERY, {"login": owner, "cursor": cursor})
+        if data.get("repositoryOwner") is None:
+            raise ValueError(f"Repository owner not found: {owner}")
+        connection = data["repositoryOwner"]["repositories"]
+        for node in connection["nodes"]:
+            topics = [t["topic"]["name"] for t in node["repositoryTopics"]["nodes"]]
+            if topic in topics and node["viewerPermission"] == "ADMIN":
+                repos.append(node["nameWithOwner"])
+        if not connection["pageInfo"]["hasNextPage"]:
+            return repos
+        cursor = connection["pageInfo"]["endCursor"]
+
+async def _search_owner(api, topic, owner):
+    # Same cap check as discovery._search_owner: owners with more matches
+    # than a search returns are listed in full instead
+    repos = []
+    query = quote(f"topic:{topic} user:{owner}")
+    page = 1
+    while True:
+        data = await api.get_json(f"/search/repositories?q={query}&per_page=100&page={page}")
+        if data["total_count"] > SEARCH_CAP:
+            print(f"! Search found {data['total_count']} repositories of {owner} with topic '{topic}', over the "
+                  f"{SEARCH_CAP} GitHub returns; listing all of {owner}'s repositories instead")
+            return await _graphql_repos(api, topic, owner)
+        for item in data["items"]:
+            if (item.get("permissions") or {}).get("admin"):
+                repos.append(item["full_name"])
+        if len(data["items"]) < 100 or page * 100 >= data["total_count"]:
+            return repos
+        page += 1
+
+async def discover(api, topic, backend="user", owners=None):
+    if backend == "user":
+        # Repository listings include topics, so no per-repo topics call
+        return [
+            repo["full_name"] async for repo in api.paginate("/user/repos?per_page=100")
+            if topic in repo.get("topics", []) and repo.get("permissions", {}).get("admin")
+        ]
+    if backend not in ("search", "graphql"):
+        raise ValueError(f"Unknown discovery backend: {backend}")
+
+    # Ordered and without the repositories two owners' results share
+    repos = {}
+    for owner in owners or await default_owners(api):
+        found = await (_search_owner if backend == "search" else _graphql_repos)(api, topic, owner)
+        repos.update(dict.fromkeys(found))
+    return list(repos)
+
+async def export_branch_protection(api, full_name):
+    # Every branch is listed, as in exporter.export_branch_protection: an
+    # unprotected branch that the master settings protect is a modification,
+    # not an addition. Protection is read for protected branches only
+    branches = [branch async for branch in api.paginate(f"/repos/{full_name}/branches?per_page=100")]
+
+    async def fetch(branch):
+        name = branch["name"]
+        if not branch.get("protected"):
+            return {"name": name}
+        response = await api.request("GET", f"/repos/{full_name}/branches/{quote(name, safe='')}/protection")
+        if response.status_code == 404:
+            return {"name": name}
+        response.raise_for_status()
+        return {"name": name, "protection": serialize_protection_json(response.json())}
+
+    return list(await asyncio.gather(*(fetch(branch) for branch in branches)))
+
+async def _write(api, full_name, verb, url, body, action, details, logger, outbox=None):
+    # Transient failures are queued in the outbox to be replayed later
+    try:
+        response = await api.request(verb, url, json=body)
+    except TransportError as e:
+        if outbox is not None:
+            outbox.add(full_name, details["branch"], action, verb, url, body, details, str(e))
+        logger.log(full_name, "branch_protection", action, {"branch": details["branch"]}, "error", e)
+        return False
+    if response.is_success:
+        if outbox is not None:
+            outbox.discard(full_name, details["branch"])
+        logger.log(full_name, "branch_protection", action, details, "success")
+        return True
+    error = f"{response.status_code} {response.text}"
+    if outbox is not None and is_transient_status(response.status_code, response.text):
+        outbox.add(full_name, details["branch"], action, verb, url, body, details, error)
+    logger.log(full_name, "branch_protection", action, {"branch": details["branch"]}, "error", error)
+    return False
+
+async def apply_branch_protection(api, full_name, branch_name, protection_config, logger, payload=None, outbox=None,
+                                  old=None):
+    url = f"/repos/{full_name}/branches/{quote(branch_name, safe='')}/protection"
+    return await _write(
+        api, full_name, "PUT", url, payload or build_protection_payload(protection_config), "apply",
+        {"branch": branch_name, "protection": protection_config, "old": old}, logger, outbox
+    )
+
+async def remove_branch_protection(api, full_name, branch_name, logger, outbox=None, old=None):
+    url = f"/repos/{full_name}/branches/{quote(branch_name, safe='')}/protection"
+    return await _write(api, full_name, "DELETE", url, None, "remove", {"branch": branch_name, "old": old}, logger,
+                        outbox)
+
+async def apply_protection_diff(api, full_name, branch_name, modification, logger, outbox=None):
+    # applier.apply_protection_diff for the event loop: the sub-resource
+    # request prepare_writes picked, or a full PUT when there is none
+    new = modification["new"]
+    old = modification["old"]
+    if new is None:
+        return await remove_branch_protection(api, full_name, branch_name, logger, outbox, old)
+    update = modification.get("update")
+    if update is None:
+        return await apply_branch_protection(
+            api, full_name, branch_name, new, logger, modification.get("payload"), outbox, old
+        )
+    verb, section, body = update
+    url = f"/repos/{full_name}/branches/{quote(branch_name, safe='')}/protection/{section}"
+    fields = [item["field"] for item in modification["diff"]]
+    return await _write(
+        api, full_name, verb, url, body, "apply",
+        {"branch": branch_name, "protection": new, "old": old, "fields": fields}, logger, outbox
+    )
+
+async def apply_changes(api, full_name, changes, logger, stop_on_error, stop_event, outbox=None):
+    success_count = 0
+    error_count = 0
+
+    operations = [
+        partial(apply_branch_protection, api, full_name, item["branch"], item["protection"],
+                payload=item.get("payload"), outbox=outbox)
+        for item in changes["additions"]
+    ] + [
+        partial(apply_protection_diff, api, full_name, item["branch"], item, outbox=outbox)
+        for item in changes["modifications"]
+    ] + [
+        partial(remove_branch_protection, api, full_name, item["branch"], outbox=outbox, old=item["protection"])
+        for item in changes["deletions"]
+    ]
+
+    for operation in operations:
+        if stop_event.is_set():
+            break
+
+        if await operation(logger):
+            success_count += 1
+        else:
+            error_count += 1
+            if stop_on_error:
+                stop_event.set()
+                break
+
+    return success_count, error_count
+
+async def sync_repo(api, full_name, logger, dry_run, stop_on_error, stop_event, planner, outbox=None):
+    with phase("export"):
+        target_settings = await export_branch_protection(api, full_name)
+    changes, plan_lines, count = planner.plan(target_settings)
+    discard_settled(outbox, full_name, changes, target_settings)
+    lines = [f"Repository: {full_name}"] + plan_lines
+    result = {"repository": full_name, "lines": lines, "changes": count, "success": 0, "errors": 0, "skipped": 0}
+
+    if changes["has_changes"] and not dry_run:
+        with phase("apply"):
+            success, errors = await apply_changes(api, full_name, changes, logger, stop_on_error, stop_event, outbox)
+        result["success"] = success
+        result["errors"] = errors
+        result["skipped"] = result["changes"] - success - errors
+        summary = f"  Applied: {success} successful, {errors} errors"
+        if result["skipped"]:
+            summary += f", {result['skipped']} skipped"
+        lines.append(summary)
+
+    return result
+
+async def _run(config, master_settings, logger, dry_run, stop_on_error, on_discovered, on_result, repos=None,
+               outbox=None):
+    load_dotenv()
+    token = os.getenv("GITHUB_TOKEN")
+    if not token:
+        raise ValueError("GITHUB_TOKEN not found in environment variables")
+    options = config.get("async", {})
+    rate_limit = config.get("rate_limit", {})
+    api = AsyncGitHub(
+        token,
+        base_url=get_base_url(config),
+        concurrency=options.get("concurrency", 100),
+        max_concurrent_writes=rate_limit.get("max_concurrent_writes", 2),
+        max_retries=rate_limit.get("max_retries", 5),
+        transport=transport_options(config)
+    )
+    totals = {"repositories": 0, "changes": 0, "success": 0, "errors": 0, "skipped": 0, "stopped": False}
+    stop_event = asyncio.Event()
+
+    try:
+        if repos is None:
+            with phase("discover"):
+                repos = await discover(
+                    api, config["target_topic"], config.get("discovery_backend", "user"),
+                    config.get("discovery_owners")
+                )
+        # The callback may narrow the list, e.g. when resuming a run
+        repos = on_discovered(repos)
+
+        # Bounds how many repositories are in flight; requests within them are
+        # bounded separately by the client
+        repo_slots = asyncio.Semaphore(options.get("repositories_in_flight", 50))
+        planner = PlanCache(master_settings, config.get("ignore_fields", []))
+
+        async def run_one(full_name):
+            async with repo_slots:
+                if stop_event.is_set():
+                    return
+                result = await sync_repo(api, full_name, logger, dry_run, stop_on_error, stop_event, planner, outbox)
+            for key in ("changes", "success", "errors", "skipped"):
+                totals[key] += result[key]
+            totals["repositories"] += 1
+            on_result(result)
+
+        await asyncio.gather(*(run_one(full_name) for full_name in repos))
+        totals["stopped"] = stop_event.is_set()
+        totals["requests"] = api.requests
+        if len(planner):
+            totals["plans"] = len(planner)
+        return totals
+    finally:
+        await api.close()
+
+def run_async_sync(config, master_settings, logger, dry_run, stop_on_error, on_discovered, on_result, repos=None,
+                   outbox=None):
+    # repos: full names to sync instead of discovering them
+    return asyncio.run(_run(
+        config, master_settings, logger, dry_run, stop_on_error, on_discovered, on_result, repos, outbox
+    ))
@@ -0,0 +1,45 @@
+from logger import read_log_entries
+from state_store import fingerprint
+
+# Checkpoints live in the change log itself: a "start" entry with the hash
+# of the master settings, then one "complete" entry per finished repository.
+
+def record_start(logger, master_settings, shard=None):
+    details = {"master_hash": fingerprint(master_settings)}
+    if shard:
+        details["shard"] = shard
+    logger.log(None, "sync", "start", details)
+
+def record_result(logger, result):
+    finished = not result["errors"] and not result["skipped"]
+    logger.log(
+        result["repository"],
+        "sync",
+        "complete",
+        {"changes": result["changes"], "success": result["success"], "errors": result["errors"],
+         "skipped": result["skipped"]},
+        "success" if finished else "error"
+    )
+
+def load_checkpoint(log_file, master_settings):
+    # Repositories the logged run finished without errors. Repositories with
+    # failed or skipped branch operations are synced again; their branches
+    # that were applied now match master, so only the failed ones change.
+    master_hash = fingerprint(master_settings)
+    started = False
+    completed = set()
+    for entry in read_log_entries(log_file):
+        if entry.get("setting_type") != "sync":
+            continue
+        if entry["action"] == "start":
+            if entry["details"]["master_hash"] != master_hash:
+                raise ValueError(f"Master settings changed since {log_file} was written; run a full sync instead")
+            started = True
+        elif entry["action"] == "complete":
+            if entry["status"] == "success":
+                completed.add(entry["repository"])
+            else:
+                completed.discard(entry["repository"])
+    if not started:
+        raise ValueError(f"{log_file} has no checkpoint to resume from")
+    return completed
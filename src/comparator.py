@@ -1,4 +1,78 @@
-def compare_branch_protection(master_branches, target_branches):
+import copy
+
+# Defaults the applier sends when the master settings leave a field out
+DEFAULTS = {
+    "required_status_checks": {"strict": False, "contexts": []},
+    "required_pull_request_reviews": {
+        "dismiss_stale_reviews": False,
+        "require_code_owner_reviews": False,
+        "required_approving_review_count": 1,
+        "dismissal_users": [],
+        "dismissal_teams": []
+    },
+    "restrictions": {"users": [], "teams": []}
+}
+
+def normalize_protection(protection, ignore_fields=()):
+    if protection is None:
+        return None
+    
+    data = {"enforce_admins": bool(protection.get("enforce_admins", False))}
+    for section, defaults in DEFAULTS.items():
+        if protection.get(section) is None:
+            continue
+        data[section] = {}
+        for field, default in defaults.items():
+            value = protection[section].get(field, default)
+            # Order of contexts, users and teams carries no meaning
+            data[section][field] = sorted(set(value or [])) if isinstance(default, list) else value
+    
+    for path in ignore_fields:
+        section, _, field = path.partition(".")
+        if field:
+            data.get(section, {}).pop(field, None)
+        else:
+            data.pop(section, None)
+    
+    return data
+
+def keep_ignored(master_protection, target_protection, ignore_fields=()):
+    # What actually gets written: the master protection with every ignored
+    # field left as the target has it, so writes don't touch what the
+    # comparison skipped
+    if master_protection is None or not ignore_fields:
+        return master_protection
+    
+    merged = copy.deepcopy(master_protection)
+    target = target_protection or {}
+    for path in ignore_fields:
+        section, _, field = path.partition(".")
+        if not field:
+            if target.get(section) is None:
+                merged.pop(section, None)
+            else:
+                merged[section] = copy.deepcopy(target[section])
+        elif merged.get(section) is not None and target.get(section) is not None:
+            if field in target[section]:
+                merged[section][field] = copy.deepcopy(target[section][field])
+            else:
+                merged[section].pop(field, None)
+    return merged
+
+def diff_protection(old, new):
+    diff = []
+    for section in sorted(set(old or {}) | set(new or {})):
+        old_value = (old or {}).get(section)
+        new_value = (new or {}).get(section)
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            for field in sorted(set(old_value) | set(new_value)):
+                if old_value.get(field) != new_value.get(field):
+                    diff.append({"field": f"{section}.{field}", "old": old_value.get(field), "new": new_value.get(field)})
+        elif old_value != new_value:
+            diff.append({"field": section, "old": old_value, "new": new_value})
+    return diff
+
+def compare_branch_protection(master_branches, target_branches, ignore_fields=()):
     master_dict = {b["name"]: b for b in master_branches}
     target_dict = {b["name"]: b for b in target_branches}
     
@@ -13,18 +87,23 @@ def compare_branch_protection(master_branches, target_branches):
             if "protection" in master_branch:
                 changes["additions"].append({
                     "branch": branch_name,
-                    "protection": master_branch["protection"]
+                    "protection": keep_ignored(master_branch["protection"], None, ignore_fields)
                 })
         else:
             target_branch = target_dict[branch_name]
             master_protection = master_branch.get("protection")
             target_protection = target_branch.get("protection")
+            diff = diff_protection(
+                normalize_protection(target_protection, ignore_fields),
+                normalize_protection(master_protection, ignore_fields)
+            )
             
-            if master_protection != target_protection:
+            if diff:
                 changes["modifications"].append({
                     "branch": branch_name,
                     "old": target_protection,
-                    "new": master_protection
+                    "new": keep_ignored(master_protection, target_protection, ignore_fields),
+                    "diff": diff
                 })
     
     for branch_name, target_branch in target_dict.items():
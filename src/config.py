@@ -2,13 +2,26 @@ import json
 import os
 from pathlib import Path
 
+DEFAULT_BASE_URL = "https://api.github.com"
+
+def get_root_dir():
+    # GITHUB_SYNC_HOME points the tool at another config.json, settings/,
+    # logs/ and .cache/, e.g. a benchmark's scratch directory
+    return Path(os.getenv("GITHUB_SYNC_HOME") or Path(__file__).parent.parent)
+
 def load_config():
-    config_path = Path(__file__).parent.parent / "config.json"
+    config_path = get_root_dir() / "config.json"
     with open(config_path) as f:
         return json.load(f)
 
+def get_base_url(config):
+    return os.getenv("GITHUB_API_URL") or config.get("base_url") or DEFAULT_BASE_URL
+
 def get_settings_dir():
-    return Path(__file__).parent.parent / "settings"
+    return get_root_dir() / "settings"
 
 def get_logs_dir():
-    return Path(__file__).parent.parent / "logs"
+    return get_root_dir() / "logs"
+
+def get_cache_dir():
+    return get_root_dir() / ".cache"
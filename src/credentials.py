@@ -0,0 +1,58 @@
+import os
+from pathlib import Path
+from github import Auth, GithubException, GithubIntegration
+
+class Credential:
+    def __init__(self, name, owner, github, scheduler=None, scoped=False):
+        self.name = name
+        self.owner = owner
+        self.github = github
+        self.scheduler = scheduler
+        # Installation tokens only reach their own account's repositories
+        self.scoped = scoped or owner is not None
+
+    def remaining(self):
+        if self.scheduler is None:
+            return None
+        return self.scheduler.budgets().get("core", {}).get("remaining")
+
+class CredentialPool:
+    def __init__(self, default, credentials=None):
+        self.default = default
+        self.credentials = list(credentials or [])
+        self._by_owner = {c.owner.lower(): c for c in self.credentials if c.owner}
+
+    def for_owner(self, owner):
+        credential = self._by_owner.get((owner or "").lower())
+        if credential is not None:
+            return credential
+        # Credentials pinned to an owner only serve that owner
+        candidates = [self.default] + [c for c in self.credentials if not c.scoped]
+        # Unknown budgets have not been touched yet, so they are the best bet
+        return max(candidates, key=lambda c: float("inf") if c.remaining() is None else c.remaining())
+
+def load_auth(entry, root, base_url):
+    name = entry.get("name") or entry.get("owner") or entry.get("token_env")
+    if "token_env" in entry:
+        token = os.getenv(entry["token_env"])
+        if not token:
+            raise ValueError(f"{entry['token_env']} not found in environment variables (credential '{name}')")
+        return name, Auth.Token(token), False
+
+    if "app_id" in entry:
+        key_path = Path(entry["private_key_path"])
+        if not key_path.is_absolute():
+            key_path = root / key_path
+        app_auth = Auth.AppAuth(entry["app_id"], key_path.read_text())
+        installation_id = entry.get("installation_id")
+        if installation_id is None:
+            integration = GithubIntegration(auth=app_auth, base_url=base_url)
+            try:
+                installation_id = integration.get_org_installation(entry["owner"]).id
+            except GithubException:
+                installation_id = integration.get_user_installation(entry["owner"]).id
+        # AppInstallationAuth mints a new installation token before the
+        # current one expires
+        return name, app_auth.get_installation_auth(int(installation_id)), True
+
+    raise ValueError(f"Credential '{name}' needs either token_env or app_id/private_key_path")
@@ -1,9 +1,184 @@
-def find_repos_by_topic(client, topic):
-    user = client.user
-    repos = []
-    
-    for repo in user.get_repos():
+import json
+import time
+
+# GitHub returns at most this many results for one search
+SEARCH_CAP = 1000
+
+def find_repos_by_topic(client, topic, backend="user", owners=None):
+    return list(iter_repos_by_topic(client, topic, backend, owners))
+
+def iter_repos_by_topic(client, topic, backend="user", owners=None):
+    # Yields each repository as soon as its page has been read
+    if backend == "search":
+        return _search_repos(client, topic, owners)
+    if backend == "graphql":
+        return _graphql_repos(client, topic, owners)
+    if backend != "user":
+        raise ValueError(f"Unknown discovery backend: {backend}")
+    return _user_repos(client, topic)
+
+def _user_repos(client, topic):
+    for repo in client.user.get_repos():
         if topic in repo.get_topics() and repo.permissions.admin:
-            repos.append(repo)
+            yield _handle(client, repo)
+
+def default_owners(client):
+    # The authenticated user and the organizations they belong to, the
+    # owners whose repositories the user backend also lists
+    return [client.get_authenticated_user()] + [org.login for org in client.user.get_orgs()]
+
+def _search_repos(client, topic, owners):
+    # Search results carry topics and permissions, so no per-repo calls are
+    # needed. GitHub caps a single search at 1,000 results; owners with more
+    # matches are listed in full instead.
+    seen = set()
+    
+    for owner in owners or default_owners(client):
+        for repo in _search_owner(client, topic, owner):
+            if repo.full_name not in seen:
+                seen.add(repo.full_name)
+                yield repo
+
+def _search_owner(client, topic, owner):
+    # Raw pages, as PyGithub's totalCount is itself capped for searches
+    requester = client.for_owner(owner).requester
+    query = f"topic:{topic} user:{owner}"
+    page = 1
+    while True:
+        _, data = requester.requestJsonAndCheck(
+            "GET", "/search/repositories", parameters={"q": query, "per_page": 100, "page": page}
+        )
+        if data["total_count"] > SEARCH_CAP:
+            print(f"! Search found {data['total_count']} repositories of {owner} with topic '{topic}', over the "
+                  f"{SEARCH_CAP} GitHub returns; listing all of {owner}'s repositories instead")
+            yield from _graphql_repos(client, topic, [owner])
+            return
+        for item in data["items"]:
+            if (item.get("permissions") or {}).get("admin"):
+                yield _repo_from_record(client, item)
+        if len(data["items"]) < 100 or page * 100 >= data["total_count"]:
+            return
+        page += 1
+
+OWNER_REPOS_QUERY = """
+query($login: String!, $cursor: String) {
+  repositoryOwner(login: $login) {
+    repositories(first: 100, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        id
+        name
+        nameWithOwner
+        viewerPermission
+        defaultBranchRef { name }
+        repositoryTopics(first: 100) { nodes { topic { name } } }
+      }
+    }
+  }
+}
+"""
+
+def _graphql_repos(client, topic, owners):
+    for owner in owners or default_owners(client):
+        cursor = None
+        while True:
+            data, _ = client.graphql(OWNER_REPOS_QUERY, {"login": owner, "cursor": cursor}, owner=owner)
+            if data.get("repositoryOwner") is None:
+                raise ValueError(f"Repository owner not found: {owner}")
+            connection = data["repositoryOwner"]["repositories"]
+            
+            for node in connection["nodes"]:
+                topics = [t["topic"]["name"] for t in node["repositoryTopics"]["nodes"]]
+                if topic in topics and node["viewerPermission"] == "ADMIN":
+                    yield _repo_from_record(client, {
+                        "full_name": node["nameWithOwner"],
+                        "node_id": node["id"],
+                        "default_branch": (node["defaultBranchRef"] or {}).get("name")
+                    })
+            
+            if not connection["pageInfo"]["hasNextPage"]:
+                break
+            cursor = connection["pageInfo"]["endCursor"]
+
+def _handle(client, repo):
+    # Keeps only what the sync reads, so the listing's Repository can be freed
+    return _repo_from_record(
+        client, {"full_name": repo.full_name, "node_id": repo.node_id, "default_branch": repo.default_branch}
+    )
+
+def _repo_from_record(client, record):
+    # RepoHandle carrying only what discovery already knows, bound to the
+    # credential serving its owner
+    owner = record["full_name"].split("/", 1)[0]
+    return client.lazy_repo(
+        client.for_owner(owner), record["full_name"], record.get("node_id"), record.get("default_branch")
+    )
+
+def discover_repos(client, config, cache_file=None, refresh=False):
+    return list(stream_repos(client, config, cache_file, refresh))
+
+def stream_repos(client, config, cache_file=None, refresh=False):
+    # discover_repos as a generator, so syncing can start with the first
+    # page. The cache is only written once discovery has run to the end.
+    topic = config["target_topic"]
+    backend = config.get("discovery_backend", "user")
+    owners = config.get("discovery_owners")
+    ttl = config.get("discovery_cache_ttl", 0)
+    # The key needs the login, so only look it up when the cache is in use
+    key = json.dumps([client.get_authenticated_user(), topic, backend, owners]) if cache_file and ttl > 0 else None
+    
+    if cache_file and ttl > 0 and not refresh:
+        records = _load_cached(cache_file, key, ttl)
+        if records is not None:
+            for record in records:
+                yield _repo_from_record(client, record)
+            return
+    
+    records = []
+    for repo in iter_repos_by_topic(client, topic, backend, owners):
+        if key is not None:
+            records.append({
+                "full_name": repo.full_name, "node_id": repo.node_id, "default_branch": repo.default_branch
+            })
+        yield repo
     
-    return repos
+    if key is not None:
+        _save_cached(cache_file, key, records)
+
+def read_repo_list(path):
+    # One owner/name per line, as written by discover.py --output
+    with open(path) as f:
+        names = [line.strip() for line in f]
+    return [name for name in names if name and not name.startswith("#")]
+
+def write_repo_list(path, names):
+    with open(path, "w") as f:
+        f.write("".join(f"{name}\n" for name in names))
+
+def repos_from_names(client, names):
+    return list(iter_repos_from_names(client, names))
+
+def iter_repos_from_names(client, names):
+    for name in names:
+        yield _repo_from_record(client, {"full_name": name})
+
+def _load_cached(cache_file, key, ttl):
+    try:
+        with open(cache_file) as f:
+            entry = json.load(f).get(key)
+    except (OSError, ValueError):
+        return None
+    if entry is None or time.time() - entry["timestamp"] > ttl:
+        return None
+    return entry["repos"]
+
+def _save_cached(cache_file, key, records):
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    cache[key] = {"timestamp": time.time(), "repos": records}
+    cache_file.parent.mkdir(exist_ok=True)
+    with open(cache_file, "w") as f:
+        json.dump(cache, f)
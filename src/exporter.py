@@ -1,49 +1,75 @@
 import json
-from github import GithubException
+from urllib.parse import quote
+
+# GithubException is imported where it is raised or caught, so planning
+# from a snapshot never loads PyGithub
 
 def export_branch_protection(repo):
+    # Reads the raw branch list and, for protected branches only, the raw
+    # protection; no Branch or BranchProtection objects are built
+    from github import GithubException
     branches_data = []
     
-    for branch in repo.get_branches():
-        branch_info = {"name": branch.name}
+    for branch in _paginate(repo, f"{repo.url}/branches"):
+        branch_info = {"name": branch["name"]}
         
-        try:
-            protection = branch.get_protection()
-            branch_info["protection"] = _serialize_protection(protection)
-        except GithubException:
-            pass
+        if branch.get("protected"):
+            try:
+                _, protection = repo.requester.requestJsonAndCheck(
+                    "GET", f"{repo.url}/branches/{quote(branch['name'], safe='')}/protection"
+                )
+                branch_info["protection"] = serialize_protection_json(protection)
+            except GithubException:
+                # Protected by a ruleset only, or not readable with this token
+                pass
         
         branches_data.append(branch_info)
     
     return branches_data
 
-def _serialize_protection(protection):
+def _paginate(repo, url, per_page=100, parameters=None):
+    page = 1
+    while True:
+        _, items = repo.requester.requestJsonAndCheck(
+            "GET", url, parameters=dict(parameters or {}, per_page=per_page, page=page)
+        )
+        yield from items
+        if len(items) < per_page:
+            return
+        page += 1
+
+def serialize_protection_json(protection):
+    # Settings-file shape of a raw REST protection response
     data = {}
     
-    if protection.required_status_checks:
+    rsc = protection.get("required_status_checks")
+    if rsc:
         data["required_status_checks"] = {
-            "strict": protection.required_status_checks.strict,
-            "contexts": protection.required_status_checks.contexts
+            "strict": rsc.get("strict", False),
+            "contexts": rsc.get("contexts", [])
         }
     
-    if protection.required_pull_request_reviews:
-        reviews = protection.required_pull_request_reviews
+    reviews = protection.get("required_pull_request_reviews")
+    if reviews:
         data["required_pull_request_reviews"] = {
-            "dismiss_stale_reviews": reviews.dismiss_stale_reviews,
-            "require_code_owner_reviews": reviews.require_code_owner_reviews,
-            "required_approving_review_count": reviews.required_approving_review_count
+            "dismiss_stale_reviews": reviews.get("dismiss_stale_reviews", False),
+            "require_code_owner_reviews": reviews.get("require_code_owner_reviews", False),
+            "required_approving_review_count": reviews.get("required_approving_review_count", 0)
         }
-        if reviews.dismissal_users:
-            data["required_pull_request_reviews"]["dismissal_users"] = [u.login for u in reviews.dismissal_users]
-        if reviews.dismissal_teams:
-            data["required_pull_request_reviews"]["dismissal_teams"] = [t.slug for t in reviews.dismissal_teams]
+        dismissal = reviews.get("dismissal_restrictions") or {}
+        if dismissal.get("users"):
+            data["required_pull_request_reviews"]["dismissal_users"] = [u["login"] for u in dismissal["users"]]
+        if dismissal.get("teams"):
+            data["required_pull_request_reviews"]["dismissal_teams"] = [t["slug"] for t in dismissal["teams"]]
     
-    data["enforce_admins"] = protection.enforce_admins.enabled if protection.enforce_admins else False
+    enforce_admins = protection.get("enforce_admins")
+    data["enforce_admins"] = enforce_admins.get("enabled", False) if enforce_admins else False
     
-    if protection.restrictions:
+    restrictions = protection.get("restrictions")
+    if restrictions:
         data["restrictions"] = {
-            "users": [u.login for u in protection.restrictions.users],
-            "teams": [t.slug for t in protection.restrictions.teams]
+            "users": [u["login"] for u in restrictions.get("users", [])],
+            "teams": [t["slug"] for t in restrictions.get("teams", [])]
         }
     
     return data
@@ -53,3 +79,184 @@ def save_branch_protection(branches_data, settings_dir):
     with open(output_file, "w") as f:
         json.dump(branches_data, f, indent=2)
     return output_file
+
+RULE_FIELDS = """
+fragment ruleFields on BranchProtectionRule {
+  id
+  pattern
+  requiresStatusChecks
+  requiresStrictStatusChecks
+  requiredStatusCheckContexts
+  requiresApprovingReviews
+  requiredApprovingReviewCount
+  dismissesStaleReviews
+  requiresCodeOwnerReviews
+  restrictsReviewDismissals
+  reviewDismissalAllowances(first: 100) {
+    nodes { actor { ... on User { login } ... on Team { slug } } }
+  }
+  isAdminEnforced
+  restrictsPushes
+  pushAllowances(first: 100) {
+    nodes { actor { ... on User { login } ... on Team { slug } } }
+  }
+  matchingRefs(first: 100) {
+    pageInfo { hasNextPage endCursor }
+    nodes { name }
+  }
+}
+"""
+
+MATCHING_REFS_QUERY = """
+query($id: ID!, $cursor: String) {
+  node(id: $id) {
+    ... on BranchProtectionRule {
+      matchingRefs(first: 100, after: $cursor) {
+        pageInfo { hasNextPage endCursor }
+        nodes { name }
+      }
+    }
+  }
+}
+"""
+
+def export_branch_protection_bulk(client, repos):
+    # Pages through every repository's protection rules and branch names
+    # together, so the result lists unprotected branches like the REST exporter
+    handles = {repo.full_name: repo for repo in repos}
+    rules = {repo.full_name: [] for repo in repos}
+    branch_names = {repo.full_name: [] for repo in repos}
+    cursors = {(repo.full_name, connection): None for repo in repos for connection in ("rules", "refs")}
+    
+    while cursors:
+        names = list(dict.fromkeys(full_name for full_name, _ in cursors))
+        declarations = []
+        selections = []
+        variables = {}
+        for i, full_name in enumerate(names):
+            owner, name = full_name.split("/", 1)
+            declarations.append(f"$o{i}: String!, $n{i}: String!")
+            variables.update({f"o{i}": owner, f"n{i}": name})
+            fields = ""
+            if (full_name, "rules") in cursors:
+                declarations.append(f"$c{i}: String")
+                variables[f"c{i}"] = cursors[(full_name, "rules")]
+                fields += (f"branchProtectionRules(first: 100, after: $c{i}) {{ "
+                           f"pageInfo {{ hasNextPage endCursor }} nodes {{ ...ruleFields }} }} ")
+            if (full_name, "refs") in cursors:
+                declarations.append(f"$b{i}: String")
+                variables[f"b{i}"] = cursors[(full_name, "refs")]
+                fields += (f"refs(refPrefix: \"refs/heads/\", first: 100, after: $b{i}) {{ "
+                           f"pageInfo {{ hasNextPage endCursor }} nodes {{ name }} }} ")
+            selections.append(f"r{i}: repository(owner: $o{i}, name: $n{i}) {{ id {fields}}}")
+        
+        query = f"query({', '.join(declarations)}) {{ {' '.join(selections)} }}"
+        if "...ruleFields" in query:
+            query += RULE_FIELDS
+        data, errors = client.graphql(query, variables, owner=names[0].split("/", 1)[0])
+        
+        for i, full_name in enumerate(names):
+            repository = data.get(f"r{i}")
+            if repository is None:
+                from github import GithubException
+                messages = "; ".join(e.get("message", "") for e in errors)
+                raise GithubException(404, {"message": f"Repository {full_name} not found: {messages}"}, {})
+            if handles[full_name].node_id is None:
+                # Handles built from names (--repos, webhooks) lack the id
+                # that createBranchProtectionRule needs
+                handles[full_name].node_id = repository.get("id")
+            for connection, key, collected in (("rules", "branchProtectionRules", rules[full_name]),
+                                               ("refs", "refs", branch_names[full_name])):
+                if (full_name, connection) not in cursors:
+                    continue
+                page = repository[key]
+                if page is None:
+                    # No branches at all
+                    del cursors[(full_name, connection)]
+                    continue
+                collected.extend(page["nodes"])
+                if page["pageInfo"]["hasNextPage"]:
+                    cursors[(full_name, connection)] = page["pageInfo"]["endCursor"]
+                else:
+                    del cursors[(full_name, connection)]
+    
+    return [
+        _branches_from_rules(
+            client, rules[repo.full_name], [ref["name"] for ref in branch_names[repo.full_name]],
+            repo.full_name.split("/", 1)[0]
+        )
+        for repo in repos
+    ]
+
+def _branches_from_rules(client, rules, branch_names, owner=None):
+    # The REST exporter's shape: every branch, with the protection of the
+    # rule that applies to it. "rule" is extra; the GraphQL writer updates
+    # the rule in place with it, and the comparator never reads it.
+    branches = {}
+    exact = set()
+    
+    for rule in rules:
+        refs = rule["matchingRefs"]
+        names = [ref["name"] for ref in refs["nodes"]]
+        cursor = refs["pageInfo"]["endCursor"] if refs["pageInfo"]["hasNextPage"] else None
+        while cursor:
+            data, _ = client.graphql(MATCHING_REFS_QUERY, {"id": rule["id"], "cursor": cursor}, owner=owner)
+            refs = data["node"]["matchingRefs"]
+            names.extend(ref["name"] for ref in refs["nodes"])
+            cursor = refs["pageInfo"]["endCursor"] if refs["pageInfo"]["hasNextPage"] else None
+        
+        # A rule naming the branch exactly takes precedence over wildcard rules
+        is_exact = not any(c in rule["pattern"] for c in "*?[")
+        for name in names:
+            if name in exact or (name in branches and not is_exact):
+                continue
+            branches[name] = rule
+            if is_exact:
+                exact.add(name)
+    
+    exported = []
+    for name in branch_names:
+        rule = branches.get(name)
+        if rule is None:
+            exported.append({"name": name})
+            continue
+        exported.append(
+            {"name": name, "protection": _serialize_rule(rule), "rule": {"id": rule["id"], "pattern": rule["pattern"]}}
+        )
+    return exported
+
+def _actors(allowances, key):
+    return [n["actor"][key] for n in allowances["nodes"] if n.get("actor") and key in n["actor"]]
+
+def _serialize_rule(rule):
+    data = {}
+    
+    if rule["requiresStatusChecks"]:
+        data["required_status_checks"] = {
+            "strict": rule["requiresStrictStatusChecks"],
+            "contexts": rule["requiredStatusCheckContexts"] or []
+        }
+    
+    if rule["requiresApprovingReviews"]:
+        data["required_pull_request_reviews"] = {
+            "dismiss_stale_reviews": rule["dismissesStaleReviews"],
+            "require_code_owner_reviews": rule["requiresCodeOwnerReviews"],
+            "required_approving_review_count": rule["requiredApprovingReviewCount"]
+        }
+        if rule["restrictsReviewDismissals"]:
+            users = _actors(rule["reviewDismissalAllowances"], "login")
+            teams = _actors(rule["reviewDismissalAllowances"], "slug")
+            if users:
+                data["required_pull_request_reviews"]["dismissal_users"] = users
+            if teams:
+                data["required_pull_request_reviews"]["dismissal_teams"] = teams
+    
+    data["enforce_admins"] = rule["isAdminEnforced"]
+    
+    if rule["restrictsPushes"]:
+        data["restrictions"] = {
+            "users": _actors(rule["pushAllowances"], "login"),
+            "teams": _actors(rule["pushAllowances"], "slug")
+        }
+    
+    return data
@@ -1,25 +1,211 @@
+import hashlib
+import json
 import os
-from github import Github, GithubException
+import threading
+import time
+from functools import partial
+from urllib.parse import urlparse
+from github import Auth, Github, GithubException
+from github.Requester import HTTPSRequestsConnectionClass, RequestsResponse
 from dotenv import load_dotenv
+from urllib3.util.retry import Retry
+from config import load_config, get_cache_dir, get_base_url, get_root_dir
+from http_cache import ResponseCache
+from rate_limit import RequestScheduler
+from transport import Transport, transport_options
+from credentials import Credential, CredentialPool, load_auth
+from metrics import record_request
+
+class ThreadSafeConnection(HTTPSRequestsConnectionClass):
+    # PyGithub shares one connection object per client and parks the pending
+    # request on it between request() and getresponse(). Concurrent workers
+    # would overwrite each other's request, so keep that state per thread.
+    def __init__(self, *args, transport=None, cache=None, scheduler=None, protocol="https", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.protocol = protocol
+        self.transport = transport
+        self.cache = cache
+        self.scheduler = scheduler
+        self._pending = threading.local()
+    
+    def request(self, verb, url, input, headers, stream=False):
+        self._pending.value = (verb, url, input, headers)
+    
+    def getresponse(self):
+        verb, url, input, headers = self._pending.value
+        if self.cache is None:
+            return self._schedule(verb, url, input, headers)
+        return self.cache.send(verb, url, headers, lambda h: self._schedule(verb, url, input, h))
+    
+    def _schedule(self, verb, url, input, headers):
+        if self.scheduler is None:
+            return self._send(verb, url, input, headers)
+        return self.scheduler.send(verb, url, input, lambda: self._send(verb, url, input, headers))
+    
+    def _send(self, verb, url, input, headers):
+        started = time.perf_counter()
+        url = f"{self.protocol}://{self.host}:{self.port}{url}"
+        response = self.transport.send(verb, url, headers, input, self.verify)
+        record_request(verb, url, response.status_code, time.perf_counter() - started)
+        return RequestsResponse(response)
+
+class RepoHandle:
+    # What the sync reads from a target repository, bound to the requester of
+    # the credential serving its owner. Stands in for PyGithub's Repository,
+    # which keeps the whole API payload of every repository in memory.
+    __slots__ = ("full_name", "node_id", "default_branch", "admin", "requester")
+    
+    def __init__(self, requester, full_name, node_id=None, default_branch=None, admin=True):
+        self.requester = requester
+        self.full_name = full_name
+        self.node_id = node_id
+        self.default_branch = default_branch
+        self.admin = admin
+    
+    @property
+    def owner(self):
+        return self.full_name.split("/", 1)[0]
+    
+    @property
+    def name(self):
+        return self.full_name.split("/", 1)[1]
+    
+    @property
+    def url(self):
+        return f"/repos/{self.full_name}"
+    
+    def __repr__(self):
+        return f"RepoHandle({self.full_name!r})"
 
 class GitHubClient:
-    def __init__(self):
+    def __init__(self, workers=1):
         load_dotenv()
         token = os.getenv("GITHUB_TOKEN")
         if not token:
             raise ValueError("GITHUB_TOKEN not found in environment variables")
-        self.client = Github(token)
-        self._validate_connection()
+        config = load_config()
+        self._token = token
+        self._login = None
+        self.auth_cache_hours = config.get("auth_cache_hours", 24)
+        self.workers = max(1, workers)
+        self.base_url = get_base_url(config)
+        self.rate_limit_config = dict(config.get("rate_limit", {}))
+        retry = None
+        if self.rate_limit_config.get("enabled", True):
+            retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504))
+        self.transport = Transport(transport_options(config, self.workers), retry)
+        self.cache = None
+        cache_config = config.get("http_cache", {})
+        if cache_config.get("enabled", False):
+            self.cache = ResponseCache(
+                get_cache_dir() / "http-cache.sqlite",
+                int(cache_config.get("max_mb", 200) * 1024 * 1024)
+            )
+        self.client, self.scheduler = self._build(Auth.Token(token))
+        
+        credentials = []
+        for entry in config.get("credentials", []):
+            name, auth, scoped = load_auth(entry, get_root_dir(), self.base_url)
+            github, scheduler = self._build(auth)
+            credentials.append(Credential(name, entry.get("owner"), github, scheduler, scoped))
+        self.pool = CredentialPool(Credential("GITHUB_TOKEN", None, self.client, self.scheduler), credentials)
     
-    def _validate_connection(self):
+    def _build(self, auth):
+        scheduler = None
+        options = {"seconds_between_requests": 0.25 / self.workers}
+        rate_limit_config = dict(self.rate_limit_config)
+        if rate_limit_config.pop("enabled", True):
+            # The scheduler paces requests and retries rate-limited ones itself,
+            # so PyGithub's fixed delays and 403 handling are turned off.
+            # Each credential has its own budget and so its own scheduler.
+            scheduler = RequestScheduler(**rate_limit_config)
+            # Server errors are retried by the transport.
+            options = {"seconds_between_requests": None, "seconds_between_writes": None}
+        github = Github(auth=auth, base_url=self.base_url, **options)
+        # Always installed so every request is counted and goes through the
+        # shared transport. Only affects this client: the connection is
+        # created lazily from the class stored on its requester.
+        github.requester._Requester__connectionClass = partial(
+            ThreadSafeConnection, transport=self.transport, cache=self.cache, scheduler=scheduler,
+            protocol=urlparse(self.base_url).scheme
+        )
+        return github, scheduler
+    
+    @property
+    def user(self):
+        # Lazy: nothing is requested until one of its attributes is read
+        return self.client.get_user()
+    
+    def get_authenticated_user(self, refresh=False):
+        # The token is checked on first use rather than at startup, and the
+        # login is remembered for auth_cache_hours so short runs skip /user
+        if refresh:
+            self._login = self._fetch_login()
+        elif self._login is None:
+            self._login = self._cached_login() or self._fetch_login()
+        return self._login
+    
+    def _auth_cache_key(self):
+        return hashlib.sha256(f"{self.base_url}\n{self._token}".encode()).hexdigest()
+    
+    def _cached_login(self):
+        if self.auth_cache_hours <= 0:
+            return None
+        try:
+            with open(get_cache_dir() / "auth.json") as f:
+                entry = json.load(f).get(self._auth_cache_key())
+        except (OSError, ValueError):
+            return None
+        if entry is None or time.time() - entry["checked_at"] > self.auth_cache_hours * 3600:
+            return None
+        return entry["login"]
+    
+    def _fetch_login(self):
         try:
-            self.user = self.client.get_user()
-            self.user.login
+            login = self.user.login
         except GithubException as e:
             raise ConnectionError(f"Failed to connect to GitHub: {e}")
-    
-    def get_authenticated_user(self):
-        return self.user.login
+        if self.auth_cache_hours > 0:
+            path = get_cache_dir() / "auth.json"
+            try:
+                with open(path) as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = {}
+            entries[self._auth_cache_key()] = {"login": login, "checked_at": time.time()}
+            path.parent.mkdir(exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(entries, f)
+        return login
     
     def get_repo(self, repo_name):
-        return self.client.get_repo(repo_name)
+        # One request to check the repository exists; only the handle is kept
+        github = self.for_owner(repo_name.split("/", 1)[0])
+        _, data = github.requester.requestJsonAndCheck("GET", f"/repos/{repo_name}")
+        return self.lazy_repo(
+            github, data["full_name"], data.get("node_id"), data.get("default_branch"),
+            (data.get("permissions") or {}).get("admin", False)
+        )
+    
+    def for_owner(self, owner):
+        return self.pool.for_owner(owner).github
+    
+    def bind(self, repo):
+        # Re-home a repository on the credential that should serve its owner
+        github = self.for_owner(repo.full_name.split("/", 1)[0])
+        if repo.requester is github.requester:
+            return repo
+        return self.lazy_repo(github, repo.full_name, repo.node_id, repo.default_branch, repo.admin)
+    
+    def lazy_repo(self, github, full_name, node_id=None, default_branch=None, admin=True):
+        return RepoHandle(github.requester, full_name, node_id, default_branch, admin)
+    
+    def graphql(self, query, variables=None, owner=None):
+        requester = self.for_owner(owner).requester if owner else self.client.requester
+        url = getattr(requester, "graphql_url", "/graphql")
+        headers, payload = requester.requestJsonAndCheck(
+            "POST", url, input={"query": query, "variables": variables or {}}
+        )
+        if payload.get("data") is None:
+            raise GithubException(400, payload, headers)
+        return payload["data"], payload.get("errors", [])
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+# Headers that describe the current request rather than the cached resource;
+# on a 304 they are taken from the fresh response.
+FRESH_HEADERS = ("x-ratelimit-", "date", "x-github-request-id")
+
+REPO_PATH = re.compile(r"^(/api/v3)?/repos/[^/?]+/[^/?]+", re.IGNORECASE)
+
+class CachedResponse:
+    # Mimics the response object PyGithub reads from its connection class
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def getheaders(self):
+        return self.headers.items()
+
+    def read(self):
+        return self.body
+
+class ResponseCache:
+    def __init__(self, path, max_bytes=200 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        path.parent.mkdir(exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, path TEXT, etag TEXT, last_modified TEXT, "
+            "headers TEXT, body TEXT, size INTEGER, accessed REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_path ON responses (path)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        with self._lock:
+            self._evict()
+            self._db.commit()
+
+    def send(self, verb, url, headers, send):
+        if verb != "GET":
+            response = send(headers)
+            if verb != "POST" or not url.endswith("/graphql"):
+                self.invalidate(url)
+            return response
+
+        key = self._key(url, headers)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, headers, body FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+        request_headers = dict(headers)
+        if row:
+            if row[0]:
+                request_headers["If-None-Match"] = row[0]
+            if row[1]:
+                request_headers["If-Modified-Since"] = row[1]
+
+        response = send(request_headers)
+
+        if response.status == 304 and row:
+            self.hits += 1
+            cached_headers = json.loads(row[2])
+            for name, value in response.getheaders():
+                if name.lower().startswith(FRESH_HEADERS):
+                    cached_headers[name.lower()] = value
+            with self._lock:
+                self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+            return CachedResponse(200, cached_headers, row[3])
+
+        self.misses += 1
+        body = response.read()
+        response_headers = {name.lower(): value for name, value in response.getheaders()}
+        etag = response_headers.get("etag")
+        last_modified = response_headers.get("last-modified")
+        if response.status == 200 and (etag or last_modified):
+            self._store(key, url, etag, last_modified, response_headers, body)
+        elif row:
+            self._delete("key = ?", (key,))
+        return CachedResponse(response.status, response_headers, body)
+
+    def invalidate(self, url):
+        match = REPO_PATH.match(url)
+        if not match:
+            return
+        prefix = match.group(0).lower()
+        self._delete("path = ? OR path LIKE ? OR path LIKE ?", (prefix, prefix + "/%", prefix + "?%"))
+
+    def _key(self, url, headers):
+        # Responses depend on who is asking, so the token is part of the key
+        identity = hashlib.sha256(headers.get("Authorization", "").encode()).hexdigest()
+        raw = "\n".join([identity, url, headers.get("Accept", "")])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _store(self, key, url, etag, last_modified, headers, body):
+        size = len(body.encode()) if isinstance(body, str) else len(body)
+        if size > self.max_bytes:
+            return
+        path = url.lower()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, path, etag, last_modified, json.dumps(headers), body, size, time.time())
+            )
+            self._size += size - (old[0] if old else 0)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        # Least recently used first; callers hold the lock and commit
+        while self._size > self.max_bytes:
+            victims = self._db.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT 100"
+            ).fetchall()
+            if not victims:
+                break
+            for victim_key, victim_size in victims:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (victim_key,))
+                self._size -= victim_size
+                if self._size <= self.max_bytes:
+                    break
+
+    def _delete(self, where, params):
+        with self._lock:
+            freed = self._db.execute(
+                f"SELECT COALESCE(SUM(size), 0) FROM responses WHERE {where}", params
+            ).fetchone()[0]
+            self._db.execute(f"DELETE FROM responses WHERE {where}", params)
+            self._db.commit()
+            self._size -= freed
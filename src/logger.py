@@ -1,13 +1,48 @@
+import atexit
+import gzip
 import json
+import os
+import shutil
+import threading
 from datetime import datetime
 from pathlib import Path
 
+# entry: write and flush every entry before log() returns
+# batch: buffer entries and write them from a background thread
+# fsync: like entry, and fsync the file before log() returns
+DURABILITY_MODES = ("entry", "batch", "fsync")
+
 class ChangeLogger:
-    def __init__(self, logs_dir):
+    def __init__(self, logs_dir, durability="batch", flush_interval=1.0, buffer_size=500,
+                 max_bytes=50 * 1024 * 1024, compress=True, log_file=None):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown log durability '{durability}', expected one of {', '.join(DURABILITY_MODES)}")
         self.logs_dir = Path(logs_dir)
         self.logs_dir.mkdir(exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.log_file = self.logs_dir / f"sync_{timestamp}.jsonl"
+        if log_file is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            log_file = self.logs_dir / f"sync_{timestamp}.jsonl"
+        # An existing log_file is appended to, after its rotated parts
+        self.log_file = Path(log_file)
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # Held while writing, so buffers reach the file in the order they filled
+        self._io_lock = threading.Lock()
+        self._file = None
+        self._parts = len(self.log_files()) - self.log_file.exists()
+        self._closed = False
+        self._writer = None
+        if durability == "batch":
+            self._writer = threading.Thread(target=self._run, name="change-logger", daemon=True)
+            self._writer.start()
+        # Buffered entries survive an exception or Ctrl-C on the way out
+        atexit.register(self.close)
     
     def log(self, repo_name, setting_type, action, details, status="success", error=None):
         entry = {
@@ -21,8 +56,91 @@ class ChangeLogger:
         if error:
             entry["error"] = str(error)
         
-        with open(self.log_file, "a") as f:
-            f.write(json.dumps(entry) + "\n")
+        line = json.dumps(entry) + "\n"
+        if self.durability == "batch":
+            with self._lock:
+                if not self._closed:
+                    self._buffer.append(line)
+                    if len(self._buffer) >= self.buffer_size:
+                        self._wakeup.notify()
+                    return
+        # Unbuffered, or logged after close()
+        with self._io_lock:
+            self._write([line])
+    
+    def flush(self):
+        with self._io_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+            if lines:
+                self._write(lines)
+    
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        if self._writer is not None:
+            self._writer.join()
+        self.flush()
+        with self._io_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        atexit.unregister(self.close)
     
     def get_log_file(self):
         return self.log_file
+    
+    def log_files(self):
+        # Rotated parts first, oldest to newest, then the active file
+        files = sorted(self.log_file.parent.glob(f"{self.log_file.stem}.*.jsonl*"), key=_part_number)
+        if self.log_file.exists():
+            files.append(self.log_file)
+        return files
+    
+    def _run(self):
+        while True:
+            with self._lock:
+                self._wakeup.wait_for(lambda: self._closed or len(self._buffer) >= self.buffer_size,
+                                      timeout=self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+    
+    def _write(self, lines):
+        if self._file is None:
+            self._file = open(self.log_file, "a")
+        self._file.write("".join(lines))
+        self._file.flush()
+        if self.durability == "fsync":
+            os.fsync(self._file.fileno())
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+    
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        self._parts += 1
+        rotated = self.log_file.with_name(f"{self.log_file.stem}.{self._parts}.jsonl")
+        self.log_file.replace(rotated)
+        if self.compress:
+            with open(rotated, "rb") as source, gzip.open(f"{rotated}.gz", "wb") as target:
+                shutil.copyfileobj(source, target)
+            rotated.unlink()
+
+def _part_number(path):
+    return int(path.name.split(".")[1])
+
+def read_log_entries(log_file):
+    # All entries of one run, across rotated and compressed parts
+    log_file = Path(log_file)
+    parts = sorted(log_file.parent.glob(f"{log_file.stem}.*.jsonl*"), key=_part_number)
+    for path in parts + ([log_file] if log_file.exists() else []):
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
@@ -0,0 +1,257 @@
+import cProfile
+import io
+import json
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from config import get_logs_dir
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Collapse concrete owners, repositories and branches so counts group by endpoint
+ENDPOINT_PATTERNS = [
+    (re.compile(r"^(/api/v3)?/repos/[^/]+/[^/]+/branches/[^/]+/protection"),
+     "/repos/{repo}/branches/{branch}/protection"),
+    (re.compile(r"^(/api/v3)?/repos/[^/]+/[^/]+/branches/[^/]+"), "/repos/{repo}/branches/{branch}"),
+    (re.compile(r"^(/api/v3)?/repos/[^/]+/[^/]+/rulesets/\d+"), "/repos/{repo}/rulesets/{id}"),
+    (re.compile(r"^(/api/v3)?/orgs/[^/]+/rulesets/\d+"), "/orgs/{owner}/rulesets/{id}"),
+    (re.compile(r"^(/api/v3)?/repos/[^/]+/[^/]+"), "/repos/{repo}"),
+    (re.compile(r"^(/api/v3)?/(users|orgs)/[^/]+"), r"/\2/{owner}")
+]
+
+def endpoint(url):
+    path = re.sub(r"^https?://[^/]+", "", url).split("?")[0]
+    for pattern, replacement in ENDPOINT_PATTERNS:
+        match = pattern.match(path)
+        if match:
+            return match.expand(replacement) + path[match.end():]
+    return path
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        index = next((i for i, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        seen = 0
+        for bound, count in zip(BUCKETS + (self.max,), self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return round(min(bound, self.max), 4)
+        return round(self.max, 4)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "mean": round(self.sum / self.count, 4) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": round(self.max, 4)
+        }
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = {}
+        self.requests = {}
+        self.request_latency = Histogram()
+        self.started = time.time()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.phases.setdefault(name, Histogram()).observe(seconds)
+
+    def record_request(self, verb, url, status, seconds):
+        key = (verb, endpoint(url), int(status))
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.request_latency.observe(seconds)
+
+    def summary(self, command, client=None):
+        with self._lock:
+            requests = [
+                {"method": verb, "endpoint": path, "status": status, "count": count}
+                for (verb, path, status), count in sorted(self.requests.items())
+            ]
+            data = {
+                "command": command,
+                "started": self.started,
+                "duration_seconds": round(time.time() - self.started, 3),
+                "phases": {name: histogram.summary() for name, histogram in sorted(self.phases.items())},
+                "requests": {
+                    "total": sum(item["count"] for item in requests),
+                    "not_modified": sum(item["count"] for item in requests if item["status"] == 304),
+                    "latency": self.request_latency.summary(),
+                    "by_endpoint": requests
+                }
+            }
+        if client is not None:
+            data.update(client_metrics(client))
+        return data
+
+    def write_json(self, path, summary):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+        return path
+
+    def write_prometheus(self, path, summary):
+        # Node exporter textfile format; written to a temporary file and
+        # renamed so the collector never reads a partial file
+        command = summary["command"]
+        lines = [
+            "# HELP github_sync_phase_seconds Time spent per phase",
+            "# TYPE github_sync_phase_seconds histogram"
+        ]
+        with self._lock:
+            for name, histogram in sorted(self.phases.items()):
+                labels = f'command="{command}",phase="{name}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'github_sync_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'github_sync_phase_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"github_sync_phase_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"github_sync_phase_seconds_count{{{labels}}} {histogram.count}")
+        lines += [
+            "# HELP github_sync_requests_total API requests by endpoint and status",
+            "# TYPE github_sync_requests_total counter"
+        ]
+        for item in summary["requests"]["by_endpoint"]:
+            lines.append(
+                f'github_sync_requests_total{{command="{command}",method="{item["method"]}",'
+                f'endpoint="{item["endpoint"]}",status="{item["status"]}"}} {item["count"]}'
+            )
+        cache = summary.get("http_cache")
+        if cache:
+            lines += [
+                "# TYPE github_sync_http_cache_hits_total counter",
+                f'github_sync_http_cache_hits_total{{command="{command}"}} {cache["hits"]}',
+                "# TYPE github_sync_http_cache_misses_total counter",
+                f'github_sync_http_cache_misses_total{{command="{command}"}} {cache["misses"]}'
+            ]
+        budgets = summary.get("rate_limit", {}).get("budgets", {})
+        if budgets:
+            lines.append("# TYPE github_sync_rate_limit_remaining gauge")
+            for credential, resources in sorted(budgets.items()):
+                for resource, budget in sorted(resources.items()):
+                    if budget["remaining"] is not None:
+                        lines.append(
+                            f'github_sync_rate_limit_remaining{{command="{command}",credential="{credential}",'
+                            f'resource="{resource}"}} {budget["remaining"]}'
+                        )
+        lines += [
+            "# TYPE github_sync_last_run_timestamp_seconds gauge",
+            f'github_sync_last_run_timestamp_seconds{{command="{command}"}} {time.time()}',
+            "# TYPE github_sync_last_run_duration_seconds gauge",
+            f'github_sync_last_run_duration_seconds{{command="{command}"}} {summary["duration_seconds"]}'
+        ]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(path.name + ".tmp")
+        temporary.write_text("\n".join(lines) + "\n")
+        temporary.replace(path)
+        return path
+
+def client_metrics(client):
+    data = {}
+    cache = getattr(client, "cache", None)
+    if cache is not None:
+        lookups = cache.hits + cache.misses
+        data["http_cache"] = {
+            "hits": cache.hits,
+            "misses": cache.misses,
+            "hit_ratio": round(cache.hits / lookups, 4) if lookups else 0.0
+        }
+    pool = getattr(client, "pool", None)
+    if pool is not None:
+        budgets = {}
+        retries = 0
+        throttled = 0.0
+        for credential in [pool.default] + pool.credentials:
+            if credential.scheduler is None:
+                continue
+            retries += credential.scheduler.retries
+            throttled += credential.scheduler.throttled_seconds
+            budgets[credential.name] = {
+                resource: dict(budget, headroom=round(budget["remaining"] / budget["limit"], 4)
+                               if budget["remaining"] is not None and budget["limit"] else None)
+                for resource, budget in credential.scheduler.budgets().items()
+            }
+        data["rate_limit"] = {"retries": retries, "throttled_seconds": round(throttled, 3), "budgets": budgets}
+    return data
+
+# One registry per process, shared by the client, the engines and the entry points
+registry = Metrics()
+
+def phase(name):
+    return registry.phase(name)
+
+def record_request(verb, url, status, seconds):
+    registry.record_request(verb, url, status, seconds)
+
+def report(command, config, client=None):
+    # Writes the run's JSON summary, and the Prometheus textfile when
+    # configured; returns the paths written
+    options = config.get("metrics", {})
+    summary = registry.summary(command, client)
+    paths = []
+    if options.get("json", True):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        paths.append(registry.write_json(get_logs_dir() / f"metrics_{command}_{timestamp}.json", summary))
+    if options.get("prometheus_textfile"):
+        paths.append(registry.write_prometheus(Path(options["prometheus_textfile"]), summary))
+    return paths
+
+@contextmanager
+def profiled(path, enabled=True, top=25):
+    # cProfile for CPU and tracemalloc for memory; the raw profile is saved
+    # for snakeviz/pstats and the top entries are printed
+    if not enabled:
+        yield
+        return
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(path))
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(top)
+        print("\n=== CPU profile (cumulative) ===")
+        print(output.getvalue().strip())
+        print(f"\n=== Memory (peak traced {peak / 1024 / 1024:.1f} MB) ===")
+        for stat in snapshot.statistics("lineno")[:10]:
+            print(f"  {stat}")
+        print(f"\n✓ Profile saved to {path} (open with python -m pstats or snakeviz)")
@@ -0,0 +1,144 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from github import GithubException
+from transport import TransportError
+
+# Failures a later attempt can fix: server errors, rate limits that outlasted
+# the scheduler's retries, and timeouts or dropped connections
+TRANSIENT_STATUSES = (500, 502, 503, 504)
+TRANSIENT_ERRORS = (TransportError,)
+WRITE_ERRORS = (GithubException,) + TRANSIENT_ERRORS
+
+def is_transient_status(status, message=""):
+    if status in TRANSIENT_STATUSES:
+        return True
+    return status in (403, 429) and "rate limit" in message.lower()
+
+def is_transient(error):
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    return isinstance(error, GithubException) and is_transient_status(error.status, str(error))
+
+COLUMNS = "repository, branch, action, verb, url, body, details, attempts, error"
+
+class Outbox:
+    # Writes that failed with a transient error, kept on disk until a replay
+    # succeeds. Entries are plain requests plus the details to log once they
+    # go through, one per repository branch: a newer failure replaces the
+    # older one, and a later successful write to the branch drops it.
+    def __init__(self, path, max_attempts=5):
+        self.path = path
+        self.max_attempts = max_attempts
+        # Branches queued by this process, so a run replays only its own
+        self.queued = set()
+        self._lock = threading.Lock()
+        path.parent.mkdir(exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        for table in ("outbox", "dead_letters"):
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "repository TEXT, branch TEXT, action TEXT, verb TEXT, url TEXT, body TEXT, details TEXT, "
+                "attempts INTEGER, error TEXT, updated_at REAL, PRIMARY KEY (repository, branch))"
+            )
+        self._db.commit()
+        self._keys = set(self._db.execute("SELECT repository, branch FROM outbox").fetchall())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys)
+
+    def add(self, repository, branch, action, verb, url, body, details, error):
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO outbox ({COLUMNS}, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?)",
+                (repository, branch, action, verb, url, json.dumps(body), json.dumps(details), error, time.time())
+            )
+            self._db.commit()
+            self._keys.add((repository, branch))
+            self.queued.add((repository, branch))
+
+    def discard(self, repository, branch):
+        with self._lock:
+            if (repository, branch) not in self._keys:
+                return
+            self._db.execute("DELETE FROM outbox WHERE repository = ? AND branch = ?", (repository, branch))
+            self._db.commit()
+            self._keys.discard((repository, branch))
+
+    def failed(self, entry, error, final=False):
+        # Counts a failed replay; returns True once the entry is dead-lettered
+        entry["attempts"] += 1
+        entry["error"] = error
+        key = (entry["repository"], entry["branch"])
+        dead = final or entry["attempts"] >= self.max_attempts
+        with self._lock:
+            if dead:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO dead_letters ({COLUMNS}, updated_at) "
+                    f"SELECT {COLUMNS}, ? FROM outbox WHERE repository = ? AND branch = ?",
+                    (time.time(),) + key
+                )
+                self._db.execute("DELETE FROM outbox WHERE repository = ? AND branch = ?", key)
+                self._keys.discard(key)
+            self._db.execute(
+                f"UPDATE {'dead_letters' if dead else 'outbox'} SET attempts = ?, error = ?, updated_at = ? "
+                "WHERE repository = ? AND branch = ?",
+                (entry["attempts"], error, time.time()) + key
+            )
+            self._db.commit()
+        return dead
+
+    def entries(self, table="outbox", keys=None):
+        with self._lock:
+            rows = self._db.execute(f"SELECT {COLUMNS} FROM {table} ORDER BY updated_at").fetchall()
+        entries = []
+        for row in rows:
+            entry = dict(zip(COLUMNS.split(", "), row))
+            if keys is not None and (entry["repository"], entry["branch"]) not in keys:
+                continue
+            entry["body"] = json.loads(entry["body"])
+            entry["details"] = json.loads(entry["details"])
+            entries.append(entry)
+        return entries
+
+    def dead_letters(self):
+        return self.entries("dead_letters")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def drain(client, outbox, logger, workers=1, backoff_base=2.0, keys=None):
+    # Replays the queued writes (only those in keys, when given) on up to
+    # workers threads, each retried with jittered exponential backoff until it
+    # succeeds or runs out of attempts. Requests still go through the
+    # client's rate-limit scheduler. Returns the (repository, branch) keys
+    # replayed and those dead-lettered.
+    def replay(entry):
+        requester = client.for_owner(entry["repository"].split("/", 1)[0]).requester
+        while True:
+            try:
+                requester.requestJsonAndCheck(entry["verb"], entry["url"], input=entry["body"])
+            except WRITE_ERRORS as e:
+                if outbox.failed(entry, str(e), final=not is_transient(e)):
+                    logger.log(
+                        entry["repository"], "branch_protection", entry["action"],
+                        {"branch": entry["branch"], "attempts": entry["attempts"], "dead_letter": True}, "error", e
+                    )
+                    return False, entry
+                time.sleep(backoff_base ** entry["attempts"] * random.uniform(0.5, 1.0))
+                continue
+            outbox.discard(entry["repository"], entry["branch"])
+            logger.log(entry["repository"], "branch_protection", entry["action"], entry["details"], "success")
+            return True, entry
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        outcomes = list(executor.map(replay, outbox.entries(keys=keys)))
+    replayed = [(entry["repository"], entry["branch"]) for ok, entry in outcomes if ok]
+    dead = [(entry["repository"], entry["branch"]) for ok, entry in outcomes if not ok]
+    return replayed, dead
@@ -0,0 +1,143 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+
+WRITE_VERBS = ("POST", "PUT", "PATCH", "DELETE")
+
+# GitHub's secondary limits, in points per minute. REST reads cost 1 point and
+# writes 5; GraphQL queries cost 1 point and mutations 5.
+SECONDARY_POINTS = {"rest": 900, "graphql": 2000}
+
+MUTATION = re.compile(r'"query":\s*"\s*mutation\b')
+
+class Bucket:
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset = 0
+        self.next_at = 0
+
+class RequestScheduler:
+    def __init__(self, max_concurrent_reads=20, max_concurrent_writes=2, min_write_interval=1.0,
+                 pace_below=0.2, max_retries=5, backoff_base=2.0):
+        self.min_write_interval = min_write_interval
+        self.pace_below = pace_below
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self._reads = threading.BoundedSemaphore(max_concurrent_reads)
+        self._writes = threading.BoundedSemaphore(max_concurrent_writes)
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._points = {family: deque() for family in SECONDARY_POINTS}
+        self._paused_until = {family: 0 for family in SECONDARY_POINTS}
+        self._last_write = 0
+
+    def send(self, verb, url, input, send):
+        for attempt in range(self.max_retries + 1):
+            semaphore = self._writes if self._is_write(verb, url, input) else self._reads
+            with semaphore:
+                self._wait_turn(verb, url, input)
+                response = send()
+            delay = self._update(url, response)
+            if delay is None or attempt == self.max_retries:
+                return response
+            with self._lock:
+                self.retries += 1
+            self._sleep(delay + random.uniform(0, self.backoff_base) + self.backoff_base * 2 ** attempt)
+        return response
+
+    def budgets(self):
+        with self._lock:
+            return {
+                resource: {"limit": b.limit, "remaining": b.remaining, "reset": b.reset}
+                for resource, b in self._buckets.items()
+            }
+
+    def _is_write(self, verb, url, input):
+        if url.split("?")[0].endswith("/graphql"):
+            body = input.decode() if isinstance(input, bytes) else str(input or "")
+            return bool(MUTATION.search(body))
+        return verb in WRITE_VERBS
+
+    def _family(self, url):
+        return "graphql" if url.split("?")[0].endswith("/graphql") else "rest"
+
+    def _resource(self, url):
+        path = url.split("?")[0]
+        if path.endswith("/graphql"):
+            return "graphql"
+        if "/search/" in path:
+            return "search"
+        return "core"
+
+    def _wait_turn(self, verb, url, input):
+        write = self._is_write(verb, url, input)
+        family = self._family(url)
+        cost = 5 if write else 1
+        while True:
+            with self._lock:
+                now = time.time()
+                delay = self._paused_until[family] - now
+                bucket = self._buckets.setdefault(self._resource(url), Bucket())
+                interval = 0
+                if bucket.remaining is not None and bucket.reset > now:
+                    if bucket.remaining <= 0:
+                        delay = max(delay, bucket.reset - now + 1)
+                    elif bucket.limit and bucket.remaining < bucket.limit * self.pace_below:
+                        # Spread what is left evenly until the window resets
+                        interval = (bucket.reset - now) / bucket.remaining
+                        delay = max(delay, bucket.next_at - now)
+                if write:
+                    delay = max(delay, self._last_write + self.min_write_interval - now)
+                points = self._points[family]
+                while points and points[0][0] <= now - 60:
+                    points.popleft()
+                if points and sum(p for _, p in points) + cost > SECONDARY_POINTS[family]:
+                    delay = max(delay, points[0][0] + 60 - now)
+                if delay <= 0:
+                    points.append((now, cost))
+                    bucket.next_at = now + interval
+                    if bucket.remaining is not None:
+                        bucket.remaining -= 1
+                    if write:
+                        self._last_write = now
+                    return
+            self._sleep(delay)
+
+    def _update(self, url, response):
+        headers = {name.lower(): value for name, value in response.getheaders()}
+        now = time.time()
+        with self._lock:
+            resource = headers.get("x-ratelimit-resource", self._resource(url))
+            bucket = self._buckets.setdefault(resource, Bucket())
+            if "x-ratelimit-remaining" in headers:
+                bucket.remaining = int(headers["x-ratelimit-remaining"])
+                bucket.limit = int(headers.get("x-ratelimit-limit", bucket.limit or 0)) or None
+                bucket.reset = int(headers.get("x-ratelimit-reset", 0))
+
+        if response.status not in (403, 429):
+            return None
+
+        family = self._family(url)
+        if "retry-after" in headers:
+            delay = float(headers["retry-after"])
+        elif headers.get("x-ratelimit-remaining") == "0":
+            delay = max(int(headers.get("x-ratelimit-reset", now)) - now, 0)
+        elif response.status == 429 or "secondary rate limit" in str(response.read()).lower():
+            delay = 60.0
+        else:
+            # A plain permission error, not a rate limit
+            return None
+
+        with self._lock:
+            self._paused_until[family] = max(self._paused_until[family], now + delay)
+        return delay
+
+    def _sleep(self, seconds):
+        with self._lock:
+            self.throttled_seconds += seconds
+        time.sleep(seconds)
@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+from logger import read_log_entries
+from applier import apply_branch_protection, remove_branch_protection
+from rulesets import apply_ruleset_changes
+
+def _step(entry_type, earliest, latest):
+    # The write that takes a branch or ruleset from its state after latest
+    # back to its state before earliest, or None if there is nothing to undo
+    before = earliest["details"]["old"]
+    details = latest["details"]
+    if entry_type == "branch_protection":
+        after = details.get("protection") if latest["action"] == "apply" else None
+        if before is not None:
+            return {"kind": "apply", "branch": details["branch"], "protection": before, "old": after}
+        if latest["action"] == "apply":
+            return {"kind": "remove", "branch": details["branch"], "old": after}
+        return None
+    after = details.get("ruleset") if latest["action"] != "delete" else None
+    if latest["action"] == "delete":
+        return {"kind": "create", "name": details["name"], "ruleset": before} if before is not None else None
+    if before is None:
+        return {"kind": "delete", "name": details["name"], "id": details["id"], "old": after}
+    return {"kind": "update", "name": details["name"], "id": details["id"], "ruleset": before, "old": after}
+
+def plan_rollback(log_file):
+    # Walks the log backwards, keeping for every branch and ruleset its state
+    # before the first logged change and the last change made to it, so a
+    # resumed or drained run is still undone with one write each. Returns
+    # {repository: [step, ...]} with the most recent changes first, and the
+    # number of changes logged without their previous state.
+    latest = {}
+    earliest = {}
+    skipped = 0
+    for entry in reversed(list(read_log_entries(log_file))):
+        entry_type = entry.get("setting_type")
+        if entry_type not in ("branch_protection", "ruleset") or entry["status"] != "success":
+            continue
+        details = entry["details"]
+        # Logs written before the previous state was recorded
+        if "old" not in details or (entry_type == "ruleset" and "id" not in details):
+            skipped += 1
+            continue
+        key = (entry_type, entry["repository"], details.get("branch", details.get("name")))
+        latest.setdefault(key, entry)
+        earliest[key] = entry
+
+    plan = {}
+    for key, entry in latest.items():
+        step = _step(key[0], earliest[key], entry)
+        if step is not None:
+            plan.setdefault(key[1], []).append(step)
+    return plan, skipped
+
+def format_steps(steps):
+    lines = []
+    for step in steps:
+        if step["kind"] == "apply":
+            lines.append(f"    ~ {step['branch']}: Restore previous protection")
+        elif step["kind"] == "remove":
+            lines.append(f"    - {step['branch']}: Remove protection")
+        elif step["kind"] == "create":
+            lines.append(f"    + {step['name']}: Recreate ruleset")
+        elif step["kind"] == "update":
+            lines.append(f"    ~ {step['name']}: Restore previous ruleset")
+        else:
+            lines.append(f"    - {step['name']}: Delete ruleset")
+    return lines
+
+def undo_repository(client, label, steps, logger, outbox=None):
+    # label is "owner/repo", or the organization for organization rulesets
+    github = client.for_owner(label.split("/", 1)[0])
+    repo = client.lazy_repo(github, label) if "/" in label else None
+    result = {"repository": label, "lines": [f"Repository: {label}"] + format_steps(steps), "changes": len(steps),
+              "success": 0, "errors": 0, "skipped": 0}
+    rulesets = {"create": [], "update": [], "delete": []}
+    for step in steps:
+        if step["kind"] in rulesets:
+            rulesets[step["kind"]].append(step)
+            continue
+        if step["kind"] == "apply":
+            ok = apply_branch_protection(repo, step["branch"], step["protection"], logger, outbox=outbox,
+                                         old=step["old"])
+        else:
+            ok = remove_branch_protection(repo, step["branch"], logger, outbox, step["old"])
+        result["success" if ok else "errors"] += 1
+    if any(rulesets.values()):
+        base = f"/repos/{label}" if "/" in label else f"/orgs/{label}"
+        success, errors = apply_ruleset_changes(github.requester, base, label, rulesets, logger, False)
+        result["success"] += success
+        result["errors"] += errors
+    result["lines"].append(f"  Rolled back: {result['success']} successful, {result['errors']} errors")
+    return result
+
+def run_rollback(client, plan, logger, workers=1, on_result=None, outbox=None):
+    # Repositories are rolled back concurrently, each one's steps in order;
+    # every write goes through the client's rate-limit scheduler
+    totals = {"repositories": 0, "changes": 0, "success": 0, "errors": 0}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [
+            executor.submit(undo_repository, client, label, steps, logger, outbox) for label, steps in plan.items()
+        ]
+        for future in futures:
+            result = future.result()
+            totals["repositories"] += 1
+            for key in ("changes", "success", "errors"):
+                totals[key] += result[key]
+            if on_result:
+                on_result(result)
+    return totals
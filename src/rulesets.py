@@ -0,0 +1,400 @@
+import json
+import re
+from fnmatch import fnmatchcase
+from urllib.parse import quote
+
+from github import GithubException
+from applier import remove_branch_protection
+from comparator import normalize_protection
+from exporter import _paginate, serialize_protection_json
+from metrics import phase
+from outbox import WRITE_ERRORS
+from sync_engine import run_sync
+
+DEFAULT_NAME = "github-sync"
+
+# Classic protection with enforce_admins off lets admins bypass it; rulesets
+# say so with bypass actors. RepositoryRole 5 is the admin role.
+ADMIN_BYPASS = {
+    "repository": [{"actor_id": 5, "actor_type": "RepositoryRole", "bypass_mode": "always"}],
+    "organization": [
+        {"actor_id": 1, "actor_type": "OrganizationAdmin", "bypass_mode": "always"},
+        {"actor_id": 5, "actor_type": "RepositoryRole", "bypass_mode": "always"}
+    ]
+}
+
+def _rules(protection):
+    # Classic protection always blocks force pushes and branch deletion
+    rules = [{"type": "deletion"}, {"type": "non_fast_forward"}]
+    checks = protection.get("required_status_checks")
+    if checks:
+        rules.append({"type": "required_status_checks", "parameters": {
+            "strict_required_status_checks_policy": checks["strict"],
+            "required_status_checks": [{"context": context} for context in checks["contexts"]]
+        }})
+    reviews = protection.get("required_pull_request_reviews")
+    if reviews:
+        rules.append({"type": "pull_request", "parameters": {
+            "dismiss_stale_reviews_on_push": reviews["dismiss_stale_reviews"],
+            "require_code_owner_review": reviews["require_code_owner_reviews"],
+            "required_approving_review_count": reviews["required_approving_review_count"],
+            "require_last_push_approval": False,
+            "required_review_thread_resolution": False
+        }})
+    return rules
+
+def build_rulesets(master_settings, name=DEFAULT_NAME, scope="repository", enforcement="active", ignore_fields=()):
+    # One ruleset per distinct protection in the master settings, with a
+    # ref_name condition covering every branch (or pattern) that uses it
+    groups = {}
+    unsupported = []
+    for branch in master_settings:
+        protection = normalize_protection(branch.get("protection"), ignore_fields)
+        if protection is None:
+            continue
+        reviews = protection.get("required_pull_request_reviews") or {}
+        if "restrictions" in protection:
+            unsupported.append(f"{branch['name']}: restrictions")
+        if reviews.get("dismissal_users") or reviews.get("dismissal_teams"):
+            unsupported.append(f"{branch['name']}: review dismissal restrictions")
+        key = json.dumps(protection, sort_keys=True)
+        groups.setdefault(key, (protection, []))[1].append(branch["name"])
+    if unsupported:
+        raise ValueError(
+            f"Not expressible as rulesets ({'; '.join(unsupported)}); "
+            "leave these out with ignore_fields or use the branch_protection backend"
+        )
+
+    rulesets = []
+    for index, (protection, branches) in enumerate(groups.values(), 1):
+        rulesets.append({
+            # The first keeps the plain name, so splitting a group updates it in place
+            "name": name if index == 1 else f"{name} {index}",
+            "target": "branch",
+            "enforcement": enforcement,
+            "bypass_actors": [] if protection["enforce_admins"] else ADMIN_BYPASS[scope],
+            "conditions": {"ref_name": {"include": [f"refs/heads/{b}" for b in branches], "exclude": []}},
+            "rules": _rules(protection)
+        })
+    return rulesets
+
+def for_repositories(rulesets, names, existing=()):
+    # Organization rulesets also say which repositories they cover. The
+    # repositories they already list are kept, so a run over part of the
+    # fleet (--repos, or a search cut off at 1000 results) drops none
+    for ruleset in existing:
+        names = set(names) | set(((ruleset.get("conditions") or {}).get("repository_name") or {}).get("include", []))
+    return [
+        dict(ruleset, conditions=dict(
+            ruleset["conditions"], repository_name={"include": sorted(names), "exclude": [], "protected": False}
+        ))
+        for ruleset in rulesets
+    ]
+
+def managed_pattern(name):
+    # Rulesets this tool owns; any others are left alone
+    return re.compile(rf"^{re.escape(name)}( \d+)?$")
+
+def fetch_rulesets(requester, base, name=DEFAULT_NAME):
+    # The list leaves out conditions and rules, so managed rulesets are read
+    # one by one; there are only as many as distinct master protections
+    managed = managed_pattern(name)
+    summaries = []
+    page = 1
+    while True:
+        _, items = requester.requestJsonAndCheck(
+            "GET", f"{base}/rulesets", parameters={"includes_parents": "false", "per_page": 100, "page": page}
+        )
+        summaries += items
+        if len(items) < 100:
+            break
+        page += 1
+    return [
+        requester.requestJsonAndCheck("GET", f"{base}/rulesets/{item['id']}")[1]
+        for item in summaries if managed.match(item["name"])
+    ]
+
+def _canonical(value):
+    if isinstance(value, dict):
+        return {key: _canonical(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return sorted((_canonical(item) for item in value), key=lambda item: json.dumps(item, sort_keys=True))
+    return value
+
+def _subset(actual, wanted):
+    # GitHub adds defaults for parameters we never set; only compare ours
+    if isinstance(wanted, dict) and isinstance(actual, dict):
+        return {key: _subset(actual.get(key), value) for key, value in wanted.items()}
+    if isinstance(wanted, list) and isinstance(actual, list) and wanted and isinstance(wanted[0], dict):
+        return [_subset(item, wanted[0]) for item in actual]
+    return actual
+
+def diff_ruleset(old, new):
+    diff = []
+    for field in ("enforcement", "bypass_actors", "conditions"):
+        old_value = _canonical(_subset(old.get(field), new[field]))
+        new_value = _canonical(new[field])
+        if old_value != new_value:
+            diff.append({"field": field, "old": old_value, "new": new_value})
+    old_rules = {rule["type"]: rule.get("parameters") for rule in old.get("rules", [])}
+    new_rules = {rule["type"]: rule.get("parameters") for rule in new["rules"]}
+    for rule_type in sorted(set(old_rules) | set(new_rules)):
+        if rule_type not in old_rules or rule_type not in new_rules:
+            diff.append({"field": f"rules.{rule_type}", "old": rule_type in old_rules, "new": rule_type in new_rules})
+            continue
+        old_value = _canonical(_subset(old_rules[rule_type], new_rules[rule_type]))
+        new_value = _canonical(new_rules[rule_type])
+        if old_value != new_value:
+            diff.append({"field": f"rules.{rule_type}", "old": old_value, "new": new_value})
+    return diff
+
+def _document(ruleset):
+    # The writable part of a ruleset as GitHub returns it
+    return {key: ruleset.get(key) for key in ("name", "target", "enforcement", "bypass_actors", "conditions", "rules")}
+
+def compare_rulesets(desired, existing):
+    current = {ruleset["name"]: ruleset for ruleset in existing}
+    changes = {"create": [], "update": [], "delete": []}
+    for ruleset in desired:
+        old = current.pop(ruleset["name"], None)
+        if old is None:
+            changes["create"].append({"name": ruleset["name"], "ruleset": ruleset})
+            continue
+        diff = diff_ruleset(old, ruleset)
+        if diff:
+            changes["update"].append(
+                {"name": ruleset["name"], "id": old["id"], "ruleset": ruleset, "old": _document(old), "diff": diff}
+            )
+    for old in current.values():
+        changes["delete"].append({"name": old["name"], "id": old["id"], "old": _document(old)})
+    changes["has_changes"] = bool(changes["create"] or changes["update"] or changes["delete"])
+    return changes
+
+def format_ruleset_changes(changes):
+    if not changes["has_changes"]:
+        return ["  No changes needed"]
+    lines = []
+    for item in changes["create"]:
+        branches = ", ".join(ref[len("refs/heads/"):] for ref in item["ruleset"]["conditions"]["ref_name"]["include"])
+        lines.append(f"    + {item['name']}: Create ruleset ({branches})")
+    for item in changes["update"]:
+        lines.append(f"    ~ {item['name']}: Update {', '.join(d['field'] for d in item['diff'])}")
+    for item in changes["delete"]:
+        lines.append(f"    - {item['name']}: Delete ruleset")
+    return [f"  Rulesets ({len(lines)} changes):"] + lines
+
+def apply_ruleset_changes(requester, base, label, changes, logger, stop_on_error, stop_event=None):
+    operations = [("POST", f"{base}/rulesets", "create", item) for item in changes["create"]] + [
+        ("PUT", f"{base}/rulesets/{item['id']}", "update", item) for item in changes["update"]
+    ] + [("DELETE", f"{base}/rulesets/{item['id']}", "delete", item) for item in changes["delete"]]
+
+    success_count = 0
+    error_count = 0
+    for verb, url, action, item in operations:
+        if stop_event is not None and stop_event.is_set():
+            break
+        details = {"name": item["name"], "id": item.get("id"), "ruleset": item.get("ruleset"), "old": item.get("old")}
+        try:
+            _, data = requester.requestJsonAndCheck(verb, url, input=item.get("ruleset"))
+            if action == "create":
+                # Logged so a rollback can find the new ruleset
+                details["id"] = (data or {}).get("id")
+            logger.log(label, "ruleset", action, details)
+            success_count += 1
+        except WRITE_ERRORS as e:
+            logger.log(label, "ruleset", action, details, status="error", error=e)
+            error_count += 1
+            if stop_on_error:
+                if stop_event is not None:
+                    stop_event.set()
+                break
+    return success_count, error_count
+
+def sync_target(requester, base, label, desired, logger, dry_run, stop_on_error, stop_event=None, name=DEFAULT_NAME,
+                repositories=None):
+    # label is "owner/repo", or the organization for organization rulesets,
+    # which cover the given repositories on top of those they already list
+    kind = "Repository" if "/" in label else "Organization"
+    result = {"repository": label, "lines": [f"{kind}: {label}"], "changes": 0, "success": 0, "errors": 0,
+              "skipped": 0}
+    with phase("export"):
+        existing = fetch_rulesets(requester, base, name)
+    if repositories is not None:
+        desired = for_repositories(desired, repositories, existing)
+    with phase("compare"):
+        changes = compare_rulesets(desired, existing)
+    result["lines"].extend(format_ruleset_changes(changes))
+    result["changes"] = len(changes["create"]) + len(changes["update"]) + len(changes["delete"])
+
+    if changes["has_changes"] and not dry_run:
+        with phase("apply"):
+            success, errors = apply_ruleset_changes(requester, base, label, changes, logger, stop_on_error, stop_event)
+        result["success"] = success
+        result["errors"] = errors
+        result["skipped"] = result["changes"] - success - errors
+        summary = f"  Applied: {success} successful, {errors} errors"
+        if result["skipped"]:
+            summary += f", {result['skipped']} skipped"
+        result["lines"].append(summary)
+    return result
+
+def classic_protections(repo, branches):
+    # Classic protection on branches the master settings name. It is enforced
+    # on top of the rulesets, so it either duplicates or conflicts with them.
+    # Branches protected by rulesets alone answer 404 and are skipped.
+    found = []
+    for branch in _paginate(repo, f"{repo.url}/branches", parameters={"protected": "true"}):
+        if not any(fnmatchcase(branch["name"], pattern) for pattern in branches):
+            continue
+        try:
+            _, protection = repo.requester.requestJsonAndCheck(
+                "GET", f"{repo.url}/branches/{quote(branch['name'], safe='')}/protection"
+            )
+        except GithubException as e:
+            if e.status == 404:
+                continue
+            raise
+        found.append({"branch": branch["name"], "old": serialize_protection_json(protection)})
+    return found
+
+def sync_classic(repo, branches, result, logger, dry_run, remove, stop_on_error, stop_event=None):
+    # Adds the repository's classic protections to its result. They are
+    # removed once the rulesets are written, or only reported when remove is
+    # off or the rulesets failed or are not enforced
+    with phase("export"):
+        found = classic_protections(repo, branches)
+    if not found:
+        return result
+    if result["lines"][1:] == ["  No changes needed"]:
+        del result["lines"][1:]
+    if not remove:
+        result["lines"].append(f"  Classic protection also enforced ({len(found)} branches):")
+        result["lines"].extend(f"    ! {item['branch']}: Keep classic protection" for item in found)
+        return result
+    result["lines"].append(f"  Classic protection ({len(found)} branches):")
+    result["lines"].extend(f"    - {item['branch']}: Remove classic protection" for item in found)
+    result["changes"] += len(found)
+    if dry_run:
+        return result
+    if result["errors"]:
+        result["skipped"] += len(found)
+        result["lines"].append("  Classic protection kept: the rulesets were not all written")
+        return result
+
+    success = errors = 0
+    with phase("apply"):
+        for item in found:
+            if stop_event is not None and stop_event.is_set():
+                break
+            if remove_branch_protection(repo, item["branch"], logger, old=item["old"]):
+                success += 1
+                continue
+            errors += 1
+            if stop_on_error:
+                if stop_event is not None:
+                    stop_event.set()
+                break
+    result["success"] += success
+    result["errors"] += errors
+    result["skipped"] += len(found) - success - errors
+    summary = f"  Removed classic protection: {success} successful, {errors} errors"
+    if len(found) - success - errors:
+        summary += f", {len(found) - success - errors} skipped"
+    result["lines"].append(summary)
+    return result
+
+def make_batch(name=DEFAULT_NAME, classic=None, remove_classic=True, rulesets=True):
+    # Same signature as sync_engine.sync_batch; master_settings holds the
+    # desired rulesets, and export, state, write, planner and outbox do not
+    # apply. classic: the master branch names checked for classic
+    # protection; rulesets=False checks only that (organization rulesets)
+    def sync_batch(repos, desired, logger, dry_run, stop_on_error, stop_event, export=None, bind=None, state=None,
+                   ignore_fields=(), write=None, planner=None, outbox=None):
+        results = []
+        for repo in repos:
+            if stop_event.is_set():
+                break
+            if bind is not None:
+                repo = bind(repo)
+            if rulesets:
+                result = sync_target(
+                    repo.requester, repo.url, repo.full_name, desired, logger, dry_run, stop_on_error, stop_event,
+                    name
+                )
+            else:
+                result = {"repository": repo.full_name, "lines": [f"Repository: {repo.full_name}",
+                          "  No changes needed"], "changes": 0, "success": 0, "errors": 0, "skipped": 0}
+            if classic:
+                sync_classic(repo, classic, result, logger, dry_run, remove_classic, stop_on_error, stop_event)
+            results.append(result)
+        return results
+    return sync_batch
+
+def is_organization(client, owner):
+    try:
+        client.for_owner(owner).requester.requestJsonAndCheck("GET", f"/orgs/{owner}")
+        return True
+    except GithubException as e:
+        if e.status == 404:
+            return False
+        raise
+
+def run_rulesets(client, repos, master_settings, options, logger, dry_run, stop_on_error, workers=1, on_result=None,
+                 ignore_fields=()):
+    # scope "organization" writes one ruleset per organization covering the
+    # given repositories by name; owners that are users get repository rulesets
+    name = options.get("name", DEFAULT_NAME)
+    scope = options.get("scope", "repository")
+    enforcement = options.get("enforcement", "active")
+    if scope not in ADMIN_BYPASS:
+        raise ValueError(f"Unknown rulesets scope: {scope}")
+    totals = {"repositories": 0, "changes": 0, "success": 0, "errors": 0, "skipped": 0, "stopped": False}
+    classic = [branch["name"] for branch in master_settings]
+    # Rulesets that only evaluate do not protect anything yet
+    remove_classic = options.get("remove_classic", True) and enforcement == "active"
+
+    remaining = repos
+    if scope == "organization":
+        desired = build_rulesets(master_settings, name, "organization", enforcement, ignore_fields)
+        by_owner = {}
+        for repo in repos:
+            by_owner.setdefault(repo.full_name.split("/", 1)[0], []).append(repo)
+        remaining = []
+        for owner, owned in by_owner.items():
+            if not is_organization(client, owner):
+                remaining += owned
+                continue
+            names = [repo.full_name.split("/", 1)[1] for repo in owned]
+            result = sync_target(
+                client.for_owner(owner).requester, f"/orgs/{owner}", owner, desired, logger, dry_run, stop_on_error,
+                name=name, repositories=names
+            )
+            for key in ("changes", "success", "errors", "skipped"):
+                totals[key] += result[key]
+            totals["repositories"] += len(owned)
+            if on_result:
+                on_result(result)
+            if stop_on_error and result["errors"]:
+                totals["stopped"] = True
+                return totals
+            # Then each repository's classic protection, kept if the ruleset failed
+            classic_totals = run_sync(
+                owned, [], logger, dry_run, stop_on_error, workers, on_result, bind=client.bind,
+                process=make_batch(name, classic, remove_classic and not result["errors"], rulesets=False)
+            )
+            for key in ("changes", "success", "errors", "skipped"):
+                totals[key] += classic_totals[key]
+            if classic_totals["stopped"]:
+                totals["stopped"] = True
+                return totals
+
+    if remaining:
+        desired = build_rulesets(master_settings, name, "repository", enforcement, ignore_fields)
+        repo_totals = run_sync(
+            remaining, desired, logger, dry_run, stop_on_error, workers, on_result, bind=client.bind,
+            process=make_batch(name, classic, remove_classic)
+        )
+        for key in ("repositories", "changes", "success", "errors", "skipped"):
+            totals[key] += repo_totals[key]
+        totals["stopped"] = repo_totals["stopped"]
+    return totals
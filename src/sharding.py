@@ -0,0 +1,41 @@
+import hashlib
+
+# Shards are numbered 1..N. A repository's shard depends only on its name and
+# N, so every process and host splits the same list the same way.
+
+def parse_shard(text):
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{text}', expected i/N such as 1/4")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard '{text}', i must be between 1 and N")
+    return index, count
+
+def shard_of(full_name, count):
+    # hash() is salted per process, so use a real digest
+    digest = hashlib.sha256(full_name.lower().encode()).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+def select_shard(repos, index, count):
+    return [r for r in repos if shard_of(getattr(r, "full_name", r), count) == index]
+
+def merge_summaries(shards):
+    # shards: {"shard", "exit_code", "summary"} per process, where summary is
+    # what sync.py --summary wrote, or None if the process died before that
+    merged = {"repositories": 0, "changes": 0, "success": 0, "errors": 0, "skipped": 0, "stopped": False,
+              "failed_repositories": [], "log_files": [], "failed_shards": []}
+    for shard in shards:
+        summary = shard["summary"]
+        if shard["exit_code"] != 0 or summary is None:
+            merged["failed_shards"].append({"shard": shard["shard"], "exit_code": shard["exit_code"]})
+        if summary is None:
+            continue
+        for key in ("repositories", "changes", "success", "errors", "skipped"):
+            merged[key] += summary["totals"][key]
+        merged["stopped"] = merged["stopped"] or summary["totals"]["stopped"]
+        merged["failed_repositories"] += summary["failed"]
+        if summary["log_file"]:
+            merged["log_files"].append(summary["log_file"])
+    merged["failed_repositories"].sort()
+    return merged
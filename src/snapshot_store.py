@@ -0,0 +1,178 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from metrics import phase
+
+# Stands in for a Repository when syncing from a snapshot; only the name is read
+SnapshotRepo = namedtuple("SnapshotRepo", "full_name")
+
+FIELD_FILTER = re.compile(r"^([\w.]+)\s*(!=|<=|>=|=|<|>)\s*(.*)$")
+
+class SnapshotStore:
+    # The exported branches of every target repository, one row per branch.
+    # A new snapshot replaces the old one in a single transaction, so readers
+    # never see a half-written fleet.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS repositories (full_name TEXT PRIMARY KEY, exported_at REAL, error TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS branches ("
+            "full_name TEXT, branch TEXT, protected INTEGER, data TEXT, "
+            "PRIMARY KEY (full_name, branch)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS branches_branch ON branches (branch, protected)")
+        self._db.commit()
+
+    def begin(self, meta):
+        with self._lock:
+            self._db.execute("DELETE FROM meta")
+            self._db.execute("DELETE FROM repositories")
+            self._db.execute("DELETE FROM branches")
+            self._db.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in dict(meta, taken_at=time.time()).items()]
+            )
+
+    def add(self, full_name, branches, error=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO repositories (full_name, exported_at, error) VALUES (?, ?, ?)",
+                (full_name, time.time(), str(error) if error else None)
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO branches (full_name, branch, protected, data) VALUES (?, ?, ?, ?)",
+                [(full_name, b["name"], "protection" in b, json.dumps(b, separators=(",", ":")))
+                 for b in branches or []]
+            )
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+    def rollback(self):
+        with self._lock:
+            self._db.rollback()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def info(self):
+        with self._lock:
+            meta = {key: json.loads(value) for key, value in self._db.execute("SELECT key, value FROM meta")}
+            meta["repositories"], meta["errors"] = self._db.execute(
+                "SELECT COUNT(*), COUNT(error) FROM repositories"
+            ).fetchone()
+            meta["branches"], meta["protected_branches"] = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(protected), 0) FROM branches"
+            ).fetchone()
+        return meta
+
+    def repositories(self, errors=False):
+        condition = "error IS NOT NULL" if errors else "error IS NULL"
+        with self._lock:
+            rows = self._db.execute(f"SELECT full_name, error FROM repositories WHERE {condition} ORDER BY full_name")
+            return [row if errors else row[0] for row in rows]
+
+    def load(self, full_name):
+        with self._lock:
+            rows = self._db.execute("SELECT data FROM branches WHERE full_name = ?", (full_name,)).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def query(self, branch=None, unprotected=False, missing_check=None, fields=()):
+        # Branches matching every filter, as (repository, branch, protection)
+        sql = "SELECT full_name, branch, json_extract(data, '$.protection') FROM branches WHERE 1"
+        parameters = []
+        if branch:
+            sql += " AND branch = ?"
+            parameters.append(branch)
+        if unprotected:
+            sql += " AND NOT protected"
+        if missing_check:
+            sql += (" AND NOT EXISTS (SELECT 1 FROM json_each(branches.data, "
+                    "'$.protection.required_status_checks.contexts') WHERE value = ?)")
+            parameters.append(missing_check)
+        for text in fields:
+            path, operator, value = parse_field_filter(text)
+            operator = {"=": "IS", "!=": "IS NOT"}.get(operator, operator)
+            sql += f" AND json_extract(data, ?) {operator} ?"
+            parameters += [f"$.protection.{path}", value]
+        sql += " ORDER BY full_name, branch"
+        with self._lock:
+            rows = self._db.execute(sql, parameters).fetchall()
+        return [(name, branch_name, json.loads(protection) if protection else None)
+                for name, branch_name, protection in rows]
+
+    def execute(self, sql):
+        # Ad-hoc queries may read but never change the snapshot
+        with self._lock:
+            self._db.execute("PRAGMA query_only = ON")
+            try:
+                cursor = self._db.execute(sql)
+                columns = [column[0] for column in cursor.description or []]
+                return columns, cursor.fetchall()
+            finally:
+                self._db.execute("PRAGMA query_only = OFF")
+
+def parse_field_filter(text):
+    # "section.field<op>value", value as JSON where it parses (true, 2, "x")
+    match = FIELD_FILTER.match(text)
+    if not match:
+        raise ValueError(f"Invalid field filter '{text}', expected e.g. enforce_admins=true")
+    path, operator, value = match.groups()
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    if isinstance(value, bool):
+        # json_extract returns booleans as 0/1
+        value = int(value)
+    return path, operator, value
+
+def take_snapshot(store, repos, export, meta, workers=1, batch_size=1, bind=None, on_batch=None):
+    # Exports repos with up to `workers` batches in flight. A batch that fails
+    # is recorded with its error; the rest of the fleet is still stored.
+    # Imported here: sync_engine pulls in PyGithub, which queries never need
+    from sync_engine import owner_batches
+    
+    def export_batch(batch):
+        if bind is not None:
+            batch = [bind(repo) for repo in batch]
+        with phase("export"):
+            return batch, export(batch)
+
+    store.begin(meta)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {executor.submit(export_batch, batch): batch for batch in owner_batches(repos, batch_size)}
+            for future in as_completed(futures):
+                try:
+                    batch, exported = future.result()
+                except Exception as e:
+                    batch, exported = futures[future], None
+                    for repo in batch:
+                        store.add(repo.full_name, None, e)
+                else:
+                    for repo, branches in zip(batch, exported):
+                        # The graphql exporter's rule ids only serve its writer
+                        store.add(repo.full_name, [
+                            {key: value for key, value in branch.items() if key != "rule"} for branch in branches
+                        ])
+                if on_batch:
+                    on_batch(batch, exported)
+    except BaseException:
+        store.rollback()
+        raise
+    store.commit()
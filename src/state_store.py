@@ -0,0 +1,91 @@
+import hashlib
+import json
+import threading
+import time
+try:
+    import fcntl
+except ImportError:
+    # Windows: saves still merge, just without the lock
+    fcntl = None
+
+def fingerprint(data):
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def fetch_indicators(repo):
+    # One request per 100 protected branches, with GitHub's protection
+    # summary. Answered with free 304s when the HTTP cache is enabled. The
+    # summary only covers status checks and enforcement, not reviews,
+    # restrictions or push settings; see incremental_max_age_hours.
+    branches = []
+    page = 1
+    while True:
+        _, items = repo.requester.requestJsonAndCheck(
+            "GET", f"{repo.url}/branches", parameters={"protected": "true", "per_page": 100, "page": page}
+        )
+        branches += items
+        if len(items) < 100:
+            break
+        page += 1
+    return {"protected_branches": fingerprint([[b["name"], b.get("protection")] for b in branches])}
+
+class SyncState:
+    def __init__(self, path, master_settings, max_age_hours=24):
+        self.path = path
+        self.master_hash = fingerprint(master_settings)
+        self.max_age = max_age_hours * 3600
+        self._lock = threading.Lock()
+        self._repos = self._load()
+        # Entries recorded by this process, the only ones save() writes
+        self._recorded = set()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def check(self, repo):
+        indicators = fetch_indicators(repo)
+        with self._lock:
+            entry = self._repos.get(repo.full_name)
+        unchanged = (
+            entry is not None
+            and entry["in_sync"]
+            and entry["master_hash"] == self.master_hash
+            and entry["indicators"] == indicators
+            and time.time() - entry["checked_at"] < self.max_age
+        )
+        return unchanged, indicators
+
+    def record(self, repo, target_settings, result, indicators):
+        in_sync = result["changes"] == result["success"] and not result["errors"]
+        if result["success"]:
+            # Our own writes changed what GitHub reports
+            indicators = fetch_indicators(repo)
+        with self._lock:
+            self._repos[repo.full_name] = {
+                "master_hash": self.master_hash,
+                "target_hash": fingerprint(target_settings),
+                "indicators": indicators,
+                "in_sync": in_sync,
+                "checked_at": time.time()
+            }
+            self._recorded.add(repo.full_name)
+
+    def save(self):
+        # Shards running in parallel share the file: each merges its own
+        # entries into what is on disk, under a lock, so none are lost
+        with self._lock:
+            self.path.parent.mkdir(exist_ok=True)
+            with open(self.path.with_suffix(".lock"), "w") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                repos = self._load()
+                repos.update({name: self._repos[name] for name in self._recorded})
+                temporary = self.path.with_suffix(".tmp")
+                with open(temporary, "w") as f:
+                    json.dump(repos, f)
+                temporary.replace(self.path)
+            self._repos = repos
@@ -0,0 +1,353 @@
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from exporter import export_branch_protection, export_branch_protection_bulk
+from comparator import compare_branch_protection
+from state_store import fingerprint
+from metrics import phase
+from applier import (
+    apply_branch_protection, remove_branch_protection, apply_protection_diff, plan_rule_mutations, apply_rule_mutations,
+    prepare_writes, resolve_node_ids
+)
+
+def format_changes(changes):
+    if not changes["has_changes"]:
+        return ["  No changes needed"]
+
+    lines = []
+
+    if changes["additions"]:
+        lines.append(f"  Additions ({len(changes['additions'])} branches):")
+        for item in changes["additions"]:
+            lines.append(f"    + {item['branch']}: Add protection")
+
+    if changes["modifications"]:
+        lines.append(f"  Modifications ({len(changes['modifications'])} branches):")
+        for item in changes["modifications"]:
+            lines.append(f"    ~ {item['branch']}: Update protection")
+
+    if changes["deletions"]:
+        lines.append(f"  Deletions ({len(changes['deletions'])} branches):")
+        for item in changes["deletions"]:
+            lines.append(f"    - {item['branch']}: Remove protection")
+
+    return lines
+
+def count_changes(changes):
+    return len(changes["additions"]) + len(changes["modifications"]) + len(changes["deletions"])
+
+def apply_changes(repo, changes, logger, stop_on_error, stop_event=None, outbox=None):
+    success_count = 0
+    error_count = 0
+
+    operations = [
+        partial(
+            apply_branch_protection, repo, item["branch"], item["protection"], payload=item.get("payload"),
+            outbox=outbox
+        )
+        for item in changes["additions"]
+    ] + [
+        partial(apply_protection_diff, repo, item["branch"], item, outbox=outbox) for item in changes["modifications"]
+    ] + [
+        partial(remove_branch_protection, repo, item["branch"], outbox=outbox, old=item["protection"])
+        for item in changes["deletions"]
+    ]
+
+    for operation in operations:
+        if stop_event is not None and stop_event.is_set():
+            break
+
+        if operation(logger):
+            success_count += 1
+        else:
+            error_count += 1
+            if stop_on_error:
+                if stop_event is not None:
+                    stop_event.set()
+                break
+
+    return success_count, error_count
+
+def apply_batched(client, plans, logger, stop_on_error, stop_event, batch_size=25, outbox=None):
+    # plans holds (repo, changes, target_settings); returns [success, errors]
+    # per plan. Rule mutations from every repo share GraphQL requests of up
+    # to batch_size aliases; the rest go through REST one by one.
+    counts = [[0, 0] for _ in plans]
+    mutations = []
+    fallbacks = []
+    for index, (repo, changes, target_settings) in enumerate(plans):
+        for operation in plan_rule_mutations(repo, changes, target_settings):
+            (fallbacks if operation["kind"] == "rest" else mutations).append((index, operation))
+
+    # Creates need the repository's node id; repos still without one use REST
+    resolve_node_ids(client, {operation["repo"] for _, operation in mutations if operation["kind"] == "create"})
+    planned, mutations = mutations, []
+    for index, operation in planned:
+        if operation["kind"] == "create":
+            if operation["repo"].node_id is None:
+                fallbacks.append((index, operation))
+                continue
+            operation["input"]["repositoryId"] = operation["repo"].node_id
+        mutations.append((index, operation))
+
+    for start in range(0, len(mutations), batch_size):
+        if stop_event.is_set():
+            break
+        chunk = mutations[start:start + batch_size]
+        outcomes = apply_rule_mutations(client, [operation for _, operation in chunk], logger, outbox)
+        for entry, ok in zip(chunk, outcomes):
+            if ok is None:
+                # The request was rejected as a whole; retried one by one below
+                fallbacks.append(entry)
+                continue
+            counts[entry[0]][0 if ok else 1] += 1
+        if stop_on_error and False in outcomes:
+            stop_event.set()
+
+    for index, operation in fallbacks:
+        if stop_event.is_set():
+            break
+        function, args = operation["call"]
+        ok = function(operation["repo"], *args, logger, outbox=outbox)
+        counts[index][0 if ok else 1] += 1
+        if stop_on_error and not ok:
+            stop_event.set()
+
+    return counts
+
+def make_writer(client, backend="rest", batch_size=25, outbox=None):
+    if backend == "graphql":
+        return lambda plans, logger, stop_on_error, stop_event: apply_batched(
+            client, plans, logger, stop_on_error, stop_event, batch_size, outbox
+        )
+    if backend == "rest":
+        return None
+    raise ValueError(f"Unknown writer backend: {backend}")
+
+def make_exporter(client, backend="rest"):
+    if backend == "graphql":
+        return lambda repos: export_branch_protection_bulk(client, repos)
+    if backend == "rest":
+        return lambda repos: [export_branch_protection(repo) for repo in repos]
+    raise ValueError(f"Unknown exporter backend: {backend}")
+
+def state_key(target_settings, branch_names):
+    # Only the master branches and protected branches change the comparison,
+    # so other unprotected branches (feature branches) are left out of the
+    # key. GraphQL rule ids differ per repo but never change it either.
+    return fingerprint(sorted(
+        ({key: value for key, value in branch.items() if key != "rule"} for branch in target_settings or []
+         if branch["name"] in branch_names or "protection" in branch),
+        key=lambda branch: branch["name"]
+    ))
+
+class PlanCache:
+    # Most of a fleet shares a handful of protection states, so the diff, its
+    # report lines and the write payloads are worked out once per state. The
+    # cached changes are shared between repos and must not be modified.
+    def __init__(self, master_settings, ignore_fields=()):
+        self.master_settings = master_settings
+        self.ignore_fields = ignore_fields
+        self.branch_names = {branch["name"] for branch in master_settings}
+        self.hits = 0
+        self._plans = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._plans)
+
+    def plan(self, target_settings):
+        key = state_key(target_settings, self.branch_names)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self.hits += 1
+                return plan
+        with phase("compare"):
+            changes = compare_branch_protection(self.master_settings, target_settings, self.ignore_fields)
+            prepare_writes(changes)
+        plan = (changes, format_changes(changes), count_changes(changes))
+        with self._lock:
+            return self._plans.setdefault(key, plan)
+
+def plan_repo(repo, master_settings, target_settings, ignore_fields=(), planner=None):
+    if planner is None:
+        planner = PlanCache(master_settings, ignore_fields)
+    changes, lines, count = planner.plan(target_settings)
+    result = {
+        "repository": repo.full_name,
+        "lines": [f"Repository: {repo.full_name}"] + lines,
+        "changes": count,
+        "success": 0,
+        "errors": 0,
+        "skipped": 0
+    }
+    return result, changes
+
+def discard_settled(outbox, full_name, changes, target_settings):
+    # A write still queued for a branch this run found in sync is out of date
+    if outbox is None or not len(outbox):
+        return
+    changed = {item["branch"] for key in ("additions", "modifications", "deletions") for item in changes[key]}
+    for branch in target_settings or []:
+        if branch["name"] not in changed:
+            outbox.discard(full_name, branch["name"])
+
+def record_applied(result, success, errors):
+    result["success"] = success
+    result["errors"] = errors
+    result["skipped"] = result["changes"] - success - errors
+    summary = f"  Applied: {success} successful, {errors} errors"
+    if result["skipped"]:
+        summary += f", {result['skipped']} skipped"
+    result["lines"].append(summary)
+
+def sync_repo(repo, master_settings, logger, dry_run, stop_on_error, stop_event=None, target_settings=None,
+              ignore_fields=(), planner=None, outbox=None):
+    if target_settings is None:
+        with phase("export"):
+            target_settings = export_branch_protection(repo)
+    result, changes = plan_repo(repo, master_settings, target_settings, ignore_fields, planner)
+    discard_settled(outbox, repo.full_name, changes, target_settings)
+
+    if changes["has_changes"] and not dry_run:
+        with phase("apply"):
+            success, errors = apply_changes(repo, changes, logger, stop_on_error, stop_event, outbox)
+        record_applied(result, success, errors)
+
+    return result
+
+def unchanged_result(repo):
+    return {
+        "repository": repo.full_name,
+        "lines": [f"Repository: {repo.full_name}", "  No changes needed (unchanged since last sync)"],
+        "changes": 0,
+        "success": 0,
+        "errors": 0,
+        "skipped": 0
+    }
+
+def sync_batch(repos, master_settings, logger, dry_run, stop_on_error, stop_event, export, bind=None, state=None,
+               ignore_fields=(), write=None, planner=None, outbox=None):
+    if planner is None:
+        planner = PlanCache(master_settings, ignore_fields)
+    if bind is not None:
+        repos = [bind(repo) for repo in repos]
+
+    results = []
+    pending = []
+    indicators = {}
+    for repo in repos:
+        if state is not None:
+            with phase("incremental_check"):
+                unchanged, indicators[repo.full_name] = state.check(repo)
+            if unchanged:
+                results.append(unchanged_result(repo))
+                continue
+        pending.append(repo)
+
+    with phase("export"):
+        exported = list(zip(pending, export(pending) if pending else []))
+    if write is not None and not dry_run:
+        # Plan every repo in the batch first so their writes can share requests
+        planned = [
+            (repo, target_settings) + plan_repo(repo, master_settings, target_settings, ignore_fields, planner)
+            for repo, target_settings in exported
+        ]
+        for repo, target_settings, _, changes in planned:
+            discard_settled(outbox, repo.full_name, changes, target_settings)
+        to_apply = [entry for entry in planned if entry[3]["has_changes"]]
+        with phase("apply"):
+            counts = write(
+                [(repo, changes, target) for repo, target, _, changes in to_apply], logger, stop_on_error, stop_event
+            )
+        for (_, _, result, _), (success, errors) in zip(to_apply, counts):
+            record_applied(result, success, errors)
+        for repo, target_settings, result, _ in planned:
+            if state is not None:
+                state.record(repo, target_settings, result, indicators[repo.full_name])
+            results.append(result)
+        return results
+
+    for repo, target_settings in exported:
+        if stop_event.is_set():
+            break
+        result = sync_repo(
+            repo, master_settings, logger, dry_run, stop_on_error, stop_event, target_settings, ignore_fields, planner,
+            outbox
+        )
+        if state is not None:
+            state.record(repo, target_settings, result, indicators[repo.full_name])
+        results.append(result)
+    return results
+
+def owner_batches(repos, batch_size=1):
+    # Batches never mix owners, so a batch is served by a single credential.
+    # Each batch is yielded as soon as it is full, so repos may be a stream.
+    batch_size = max(1, batch_size)
+    by_owner = {}
+    for repo in repos:
+        owner = repo.full_name.split("/", 1)[0].lower()
+        owned = by_owner.setdefault(owner, [])
+        owned.append(repo)
+        if len(owned) == batch_size:
+            yield by_owner.pop(owner)
+    yield from by_owner.values()
+
+def run_sync(repos, master_settings, logger, dry_run, stop_on_error, workers=1, on_result=None,
+             export=None, batch_size=1, bind=None, state=None, ignore_fields=(), write=None, process=None,
+             outbox=None):
+    # repos may be a generator (see discovery.stream_repos): it is read only
+    # while fewer than two batches per worker are waiting, so discovery runs
+    # ahead of the workers by a bounded amount and results arrive from the
+    # first page on. process: replaces sync_batch for other kinds of
+    # settings (see rulesets). outbox: where REST writes that fail
+    # transiently are queued (the graphql writer takes its own)
+    totals = {"repositories": 0, "changes": 0, "success": 0, "errors": 0, "skipped": 0, "stopped": False}
+    stop_event = threading.Event()
+    export = export or make_exporter(None)
+    process = process or sync_batch
+    planner = PlanCache(master_settings, ignore_fields)
+    max_pending = max(1, workers) * 2
+
+    def collect(pending):
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for result in (r for future in done if not future.cancelled() for r in future.result()):
+            totals["repositories"] += 1
+            totals["changes"] += result["changes"]
+            totals["success"] += result["success"]
+            totals["errors"] += result["errors"]
+            totals["skipped"] += result["skipped"]
+            if on_result:
+                on_result(result)
+
+        if stop_event.is_set() and not totals["stopped"]:
+            totals["stopped"] = True
+            for future in pending:
+                future.cancel()
+        return pending
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = set()
+        try:
+            for batch in owner_batches(repos, batch_size):
+                while len(pending) >= max_pending:
+                    pending = collect(pending)
+                if stop_event.is_set():
+                    break
+                pending.add(executor.submit(
+                    process, batch, master_settings, logger, dry_run, stop_on_error, stop_event, export, bind, state,
+                    ignore_fields, write, planner, outbox
+                ))
+            while pending:
+                pending = collect(pending)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    # Distinct target states compared; rulesets plan on their own
+    if len(planner):
+        totals["plans"] = len(planner)
+    return totals
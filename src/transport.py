@@ -0,0 +1,81 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULTS = {
+    "pool_size": None,
+    "keep_alive": True,
+    "gzip": True,
+    "connect_timeout": 10,
+    "read_timeout": 30,
+    "http2": False
+}
+
+class TransportError(Exception):
+    # A request that got no response: a timeout, a refused or dropped
+    # connection, or retries used up. Both HTTP clients raise this, so
+    # callers catch one exception whichever is in use.
+    pass
+
+def transport_options(config, workers=1):
+    options = dict(DEFAULTS, **config.get("transport", {}))
+    if not options["pool_size"]:
+        # Every worker keeps a connection; at least 10 as PyGithub did
+        options["pool_size"] = max(workers, 10)
+    return options
+
+class Transport:
+    # The HTTP layer under every client the tool builds. One pool is shared by
+    # all threads and credentials (auth is a per-request header), and it
+    # blocks when full instead of opening and dropping extra connections, so
+    # TLS handshakes happen once per pooled connection.
+    def __init__(self, options, retry=None):
+        self.timeout = (options["connect_timeout"], options["read_timeout"])
+        self.headers = {"Accept-Encoding": "gzip" if options["gzip"] else "identity"}
+        if not options["keep_alive"]:
+            self.headers["Connection"] = "close"
+        self.http2 = options["http2"]
+        pool_size = options["pool_size"]
+        if self.http2:
+            try:
+                import httpx
+                self._client = httpx.Client(
+                    http2=True,
+                    timeout=httpx.Timeout(options["read_timeout"], connect=options["connect_timeout"]),
+                    limits=httpx.Limits(
+                        max_connections=pool_size,
+                        max_keepalive_connections=pool_size if options["keep_alive"] else 0
+                    ),
+                    transport=httpx.HTTPTransport(http2=True, retries=3)
+                )
+            except ImportError:
+                raise ImportError("HTTP/2 needs httpx with h2: run 'uv sync --extra http2'")
+            self._errors = (httpx.TransportError,)
+            return
+        self._errors = (
+            requests.ConnectionError, requests.Timeout, requests.exceptions.RetryError,
+            requests.exceptions.ChunkedEncodingError
+        )
+        self._session = requests.Session()
+        # PyGithub only mounts its adapter for https://, leaving http:// base
+        # URLs (a local stand-in) on the default pool of 10
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True, max_retries=retry or 0
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def send(self, verb, url, headers, body, verify=True):
+        # Returns a requests or httpx response; both carry status_code,
+        # headers and text, which is all PyGithub's RequestsResponse reads
+        headers = dict(headers, **self.headers)
+        try:
+            if self.http2:
+                return self._client.request(verb, url, headers=headers, content=body, follow_redirects=False)
+            return self._session.request(
+                verb, url, headers=headers, data=body, timeout=self.timeout, verify=verify, allow_redirects=False
+            )
+        except self._errors as e:
+            raise TransportError(f"{verb} {url}: {e}") from e
+
+    def close(self):
+        (self._client if self.http2 else self._session).close()
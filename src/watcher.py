@@ -0,0 +1,237 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def verify_signature(secret, body, signature):
+    # X-Hub-Signature-256: "sha256=" + HMAC-SHA256 of the raw body
+    if not signature or not signature.startswith("sha256="):
+        return False
+    expected = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+class Debouncer:
+    # Coalesces events per repository. A repository is due once no event
+    # arrived for `delay` seconds, or `max_delay` after its first event.
+    def __init__(self, delay=10, max_delay=60):
+        self.delay = delay
+        self.max_delay = max_delay
+        self._pending = {}
+        self._changed = threading.Condition()
+
+    def add(self, full_name, reason):
+        now = time.time()
+        with self._changed:
+            first, _, reasons = self._pending.get(full_name, (now, now, []))
+            self._pending[full_name] = (first, now, reasons + [reason])
+            self._changed.notify()
+
+    def discard(self, full_name):
+        with self._changed:
+            self._pending.pop(full_name, None)
+
+    def pop_due(self, now=None):
+        now = now or time.time()
+        with self._changed:
+            due = {name: entry[2] for name, entry in self._pending.items() if self._due_at(entry) <= now}
+            for name in due:
+                del self._pending[name]
+        return due
+
+    def next_due(self):
+        with self._changed:
+            return min((self._due_at(entry) for entry in self._pending.values()), default=None)
+
+    def wait(self, timeout):
+        with self._changed:
+            self._changed.wait(max(timeout, 0))
+
+    def _due_at(self, entry):
+        first, last, _ = entry
+        return min(last + self.delay, first + self.max_delay)
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            self._reply(200, "ok")
+        else:
+            self._reply(404, "not found")
+
+    def do_POST(self):
+        if self.path.split("?")[0] != self.server.path:
+            return self._reply(404, "not found")
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not verify_signature(self.server.secret, body, self.headers.get("X-Hub-Signature-256")):
+            return self._reply(401, "bad signature")
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self._reply(400, "invalid JSON")
+        self.server.on_event(self.headers.get("X-GitHub-Event", ""), payload)
+        self._reply(202, "accepted")
+
+    def _reply(self, status, text):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class WebhookReceiver(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, secret, path, on_event):
+        super().__init__(address, WebhookHandler)
+        self.secret = secret
+        self.path = path
+        self.on_event = on_event
+
+class Watcher:
+    # Re-syncs repositories as webhooks report changes to them, plus a full
+    # reconcile every reconcile_interval seconds as a safety net. The
+    # reconcile runs on its own thread so events are still handled meanwhile.
+    def __init__(self, topic, branches, discover, get_repo, sync_repos, debouncer, reconcile_interval=86400,
+                 ignore_senders=(), on_message=print, own_write_window=60):
+        self.topic = topic
+        self.branches = set(branches)
+        self.discover = discover
+        self.get_repo = get_repo
+        self.sync_repos = sync_repos
+        self.debouncer = debouncer
+        self.reconcile_interval = reconcile_interval
+        self.ignore_senders = {login.lower() for login in ignore_senders}
+        self.own_write_window = own_write_window
+        self.on_message = on_message
+        self.tracked = {}
+        self._syncing = {}
+        self._lock = threading.Lock()
+
+    def handle_event(self, event, payload):
+        repository = payload.get("repository") or {}
+        full_name = repository.get("full_name")
+        sender = (payload.get("sender") or {}).get("login", "")
+        if not full_name or self._own_write(full_name, sender):
+            return
+
+        action = payload.get("action")
+        topics = repository.get("topics")
+        with self._lock:
+            if event == "repository" and (action in ("deleted", "archived") or
+                                          (topics is not None and self.topic not in topics)):
+                if self.tracked.pop(full_name, None) is not None:
+                    self.debouncer.discard(full_name)
+                    self.on_message(f"- {full_name}: no longer a target ({action})")
+                return
+            added = topics is not None and self.topic in topics and full_name not in self.tracked
+            if not added and full_name not in self.tracked:
+                return
+        if added and not self._track(full_name):
+            return
+
+        if event in ("branch_protection_rule", "repository_ruleset"):
+            reason = f"{event} {action}"
+        elif event == "create" and payload.get("ref_type") == "branch" and payload.get("ref") in self.branches:
+            reason = f"branch {payload['ref']} created"
+        elif event == "repository" and action in ("created", "edited", "renamed", "transferred", "unarchived"):
+            reason = f"repository {action}"
+        else:
+            return
+        self.debouncer.add(full_name, reason)
+
+    def _track(self, full_name):
+        # Like discovery, only repositories we administer are targets
+        try:
+            repo = self.get_repo(full_name)
+        except Exception as e:
+            self.on_message(f"✗ {full_name}: {e}")
+            return False
+        if not repo.admin:
+            self.on_message(f"- {full_name}: skipped (no admin access)")
+            return False
+        with self._lock:
+            self.tracked.setdefault(full_name, repo)
+        return True
+
+    def _own_write(self, full_name, sender):
+        # Our own writes come back as events too. They are only ignored while
+        # the repository is being synced or shortly after, so other changes
+        # made with the same account are still noticed.
+        if sender.lower() not in self.ignore_senders:
+            return False
+        with self._lock:
+            return time.time() < self._syncing.get(full_name, 0)
+
+    def _mark_syncing(self, repos):
+        until = time.time() + self.own_write_window
+        with self._lock:
+            for repo in repos:
+                self._syncing[repo.full_name] = until
+
+    def sync(self, repos, reconcile=False):
+        # A failing repository is logged and does not stop the others
+        self._mark_syncing(repos)
+        try:
+            self.sync_repos(repos, reconcile=reconcile)
+        except Exception as e:
+            if len(repos) == 1:
+                self.on_message(f"✗ {repos[0].full_name}: {e}")
+            else:
+                self.on_message(f"✗ Sync failed ({e}); retrying one repository at a time")
+                for repo in repos:
+                    self.sync([repo], reconcile)
+        finally:
+            self._mark_syncing(repos)
+
+    def reconcile(self):
+        try:
+            repos = self.discover()
+        except Exception as e:
+            self.on_message(f"✗ Discovery failed: {e}")
+            return
+        with self._lock:
+            self.tracked = {repo.full_name: repo for repo in repos}
+        self.on_message(f"Reconciling {len(repos)} repositories")
+        if repos:
+            self.sync(repos, reconcile=True)
+
+    def run(self, stop_event, reconcile_now=True):
+        next_reconcile = time.time() if reconcile_now else time.time() + self.reconcile_interval
+        if not reconcile_now:
+            # As in reconcile(): a failed discovery is logged, and the next
+            # reconcile discovers again
+            try:
+                repos = self.discover()
+            except Exception as e:
+                self.on_message(f"✗ Discovery failed: {e}")
+                repos = []
+            with self._lock:
+                self.tracked = {repo.full_name: repo for repo in repos}
+
+        reconciling = None
+        while not stop_event.is_set():
+            if time.time() >= next_reconcile:
+                if reconciling is not None and reconciling.is_alive():
+                    self.on_message("Previous reconcile still running; skipping this one")
+                else:
+                    reconciling = threading.Thread(target=self.reconcile, name="reconcile", daemon=True)
+                    reconciling.start()
+                next_reconcile = time.time() + self.reconcile_interval
+
+            due = self.debouncer.pop_due()
+            if due:
+                with self._lock:
+                    repos = [self.tracked[name] for name in due if name in self.tracked]
+                for name, reasons in due.items():
+                    self.on_message(f"~ {name}: {', '.join(sorted(set(reasons)))}")
+                if repos:
+                    self.sync(repos)
+
+            wake_at = min(t for t in (next_reconcile, self.debouncer.next_due()) if t is not None)
+            # Bounded so stop_event is noticed promptly
+            self.debouncer.wait(min(wake_at - time.time(), 1.0))
@@ -1,18 +1,27 @@
 #!/usr/bin/env python3
+import os
 import sys
 import json
+import signal
 import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
-from github_client import GitHubClient
-from discovery import find_repos_by_topic
-from exporter import export_branch_protection
-from comparator import compare_branch_protection
-from applier import apply_branch_protection, remove_branch_protection
+# PyGithub and everything built on it (github_client, rulesets, outbox)
+# is imported where it is used, so --help and offline runs start fast
+from discovery import discover_repos, stream_repos, read_repo_list, write_repo_list, iter_repos_from_names
+from state_store import SyncState
+from checkpoint import record_start, record_result, load_checkpoint
+from sharding import parse_shard, shard_of, select_shard, merge_summaries
+from snapshot_store import SnapshotStore, SnapshotRepo
+from metrics import phase, report, profiled
 from logger import ChangeLogger
 from validator import validate_settings_file
-from config import load_config, get_settings_dir, get_logs_dir
+from config import load_config, get_settings_dir, get_logs_dir, get_cache_dir
 
 def load_master_settings():
     settings_file = get_settings_dir() / "branch-protection.json"
@@ -26,61 +35,62 @@ def load_master_settings():
     with open(settings_file) as f:
         return json.load(f)
 
-def print_changes(repo_name, changes):
-    if not changes["has_changes"]:
-        print(f"  No changes needed")
-        return
-    
-    if changes["additions"]:
-        print(f"  Additions ({len(changes['additions'])} branches):")
-        for item in changes["additions"]:
-            print(f"    + {item['branch']}: Add protection")
-    
-    if changes["modifications"]:
-        print(f"  Modifications ({len(changes['modifications'])} branches):")
-        for item in changes["modifications"]:
-            print(f"    ~ {item['branch']}: Update protection")
-    
-    if changes["deletions"]:
-        print(f"  Deletions ({len(changes['deletions'])} branches):")
-        for item in changes["deletions"]:
-            print(f"    - {item['branch']}: Remove protection")
-
-def apply_changes(repo, changes, logger, stop_on_error):
-    success_count = 0
-    error_count = 0
-    
-    for item in changes["additions"]:
-        if apply_branch_protection(repo, item["branch"], item["protection"], logger):
-            success_count += 1
-        else:
-            error_count += 1
-            if stop_on_error:
-                return success_count, error_count
-    
-    for item in changes["modifications"]:
-        if apply_branch_protection(repo, item["branch"], item["new"], logger):
-            success_count += 1
-        else:
-            error_count += 1
-            if stop_on_error:
-                return success_count, error_count
-    
-    for item in changes["deletions"]:
-        if remove_branch_protection(repo, item["branch"], logger):
-            success_count += 1
-        else:
-            error_count += 1
-            if stop_on_error:
-                return success_count, error_count
-    
-    return success_count, error_count
+def create_logger(config, log_file=None):
+    log_options = config.get("log", {})
+    return ChangeLogger(
+        get_logs_dir(),
+        durability=log_options.get("durability", "batch"),
+        flush_interval=log_options.get("flush_interval", 1.0),
+        max_bytes=int(log_options.get("max_mb", 50) * 1024 * 1024),
+        compress=log_options.get("compress", True),
+        log_file=log_file
+    )
 
 def main():
     parser = argparse.ArgumentParser(description="Apply GitHub repository settings")
     parser.add_argument("--dry-run", action="store_true", help="Preview changes without applying")
+    parser.add_argument("--workers", type=int, help="Number of repositories to sync concurrently")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the cached repository list")
+    parser.add_argument("--exporter", choices=["rest", "graphql"], help="How target branch protection is read")
+    parser.add_argument("--writer", choices=["rest", "graphql"], help="How changes are written")
+    parser.add_argument("--rules-backend", choices=["branch_protection", "rulesets"],
+                        help="Sync classic branch protection or repository rulesets")
+    parser.add_argument("--full", action="store_true", help="Check every repository, even if unchanged since the last sync")
+    parser.add_argument("--resume", metavar="LOG", help="Continue the run logged in LOG with only its unfinished repositories")
+    parser.add_argument("--engine", choices=["threads", "async"], help="Run on PyGithub worker threads or asyncio")
+    parser.add_argument("--profile", action="store_true", help="Profile CPU and memory and print the hot spots")
+    parser.add_argument("--shard", metavar="I/N", help="Sync only shard I of N of the target repositories")
+    parser.add_argument("--processes", type=int, help="Split the target repositories over N local sync processes")
+    parser.add_argument("--repos", metavar="FILE", help="Sync the repositories listed in FILE instead of discovering them")
+    parser.add_argument("--summary", metavar="FILE", help="Write the run's totals to FILE as JSON")
+    parser.add_argument("--from-snapshot", nargs="?", const="", metavar="STORE",
+                        help="Dry-run against the snapshot taken by snapshot.py instead of the API")
+    parser.add_argument("--report", choices=["grouped", "repos", "none"],
+                        help="Print one entry per set of identical changes (dry-run default), per repository, "
+                             "or only the totals")
+    parser.add_argument("--results", metavar="FILE",
+                        help="Append each repository's result to FILE as one JSON line as soon as it finishes")
+    parser.add_argument("--drain-outbox", action="store_true",
+                        help="Only replay the writes queued after transient failures in earlier runs")
     args = parser.parse_args()
     
+    if args.from_snapshot is not None and not args.dry_run:
+        parser.error("--from-snapshot only works with --dry-run")
+    if args.processes and (args.shard or args.resume):
+        parser.error("--processes cannot be combined with --shard or --resume")
+    if args.drain_outbox and (args.dry_run or args.processes):
+        parser.error("--drain-outbox cannot be combined with --dry-run or --processes")
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    with profiled(get_logs_dir() / f"profile_sync_{timestamp}.prof", args.profile):
+        if args.drain_outbox:
+            drain_outbox(args)
+        elif args.processes:
+            launch(args)
+        else:
+            run(args)
+
+def run(args):
     mode = "DRY-RUN" if args.dry_run else "APPLY"
     print(f"=== {mode} MODE ===\n")
     
@@ -88,60 +98,456 @@ def main():
         config = load_config()
         topic = config["target_topic"]
         stop_on_error = config.get("stop_on_error", False)
+        workers = args.workers or config.get("workers", 1)
+        exporter = args.exporter or config.get("exporter", "rest")
+        writer = args.writer or config.get("writer", "rest")
+        batch_size = config.get("graphql_batch_size", 10) if "graphql" in (exporter, writer) else 1
+        rules_backend = args.rules_backend or config.get("rules_backend", "branch_protection")
+        ruleset_options = config.get("rulesets", {})
+        outbox_options = config.get("outbox", {})
         
         master_settings = load_master_settings()
         print(f"✓ Loaded master settings ({len(master_settings)} branches)")
         
-        client = GitHubClient()
-        repos = find_repos_by_topic(client, topic)
+        from sync_engine import run_sync, make_exporter, make_writer
         
-        if not repos:
-            print(f"✗ No repositories found with topic '{topic}'")
-            sys.exit(1)
+        if rules_backend == "rulesets":
+            from rulesets import DEFAULT_NAME, build_rulesets, run_rulesets
+            if args.from_snapshot is not None or (args.engine or config.get("engine", "threads")) == "async":
+                raise ValueError("The rulesets backend needs the threads engine and live API access")
+            if args.shard and ruleset_options.get("scope") == "organization":
+                raise ValueError("Organization rulesets cover every target repository; run them unsharded")
+            # Fails early if the master settings cannot be expressed as rulesets
+            rulesets = build_rulesets(
+                master_settings, ruleset_options.get("name", DEFAULT_NAME),
+                ignore_fields=config.get("ignore_fields", [])
+            )
+            print(f"✓ Planned {len(rulesets)} rulesets from the master settings")
         
-        print(f"✓ Found {len(repos)} target repositories\n")
+        if (args.engine or config.get("engine", "threads")) == "async" and args.from_snapshot is None:
+            if config.get("credentials") or config.get("http_cache", {}).get("enabled", False):
+                raise ValueError(
+                    "The async engine authenticates with GITHUB_TOKEN only and has no HTTP cache; "
+                    "remove credentials and http_cache or use the threads engine"
+                )
         
-        logger = None if args.dry_run else ChangeLogger(get_logs_dir())
+        shard = parse_shard(args.shard) if args.shard else None
+        names = read_repo_list(args.repos) if args.repos else None
         
-        total_changes = 0
-        total_success = 0
-        total_errors = 0
+        completed = set()
+        if args.resume:
+            completed = load_checkpoint(args.resume, master_settings)
+            print(f"✓ Resuming {args.resume} ({len(completed)} repositories already done)")
         
-        for repo in repos:
-            print(f"Repository: {repo.full_name}")
-            
-            target_settings = export_branch_protection(repo)
-            changes = compare_branch_protection(master_settings, target_settings)
+        logger = None
+        if not args.dry_run:
+            log_file = args.resume
+            if log_file is None and shard:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                log_file = get_logs_dir() / f"sync_{timestamp}_shard{shard[0]}of{shard[1]}.jsonl"
+            logger = create_logger(config, log_file)
+            record_start(logger, master_settings, args.shard)
+            # SIGTERM skips atexit unless it is turned into a normal exit
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+        
+        outbox = None
+        if not args.dry_run and rules_backend != "rulesets":
+            outbox = open_outbox(config)
+        
+        def print_found(repos):
+            if not repos:
+                print(f"✗ No repositories found with topic '{topic}'")
+                sys.exit(1)
+            message = f"✓ Found {len(repos)} target repositories"
+            if shard:
+                repos = select_shard(repos, *shard)
+                message += f", {len(repos)} in shard {args.shard}"
+            if completed:
+                repos = [r for r in repos if getattr(r, "full_name", r) not in completed]
+                message += f", {len(repos)} left to sync"
+            print(message + "\n")
+            return repos
+        
+        found = [0]
+        
+        def stream_found(repos):
+            # print_found for a stream: repositories are filtered and counted
+            # as discovery yields them, and syncing starts with the first one
+            repos = iter(repos)
+            while True:
+                with phase("discover"):
+                    repo = next(repos, None)
+                if repo is None:
+                    return
+                found[0] += 1
+                if shard and shard_of(repo.full_name, shard[1]) != shard[0]:
+                    continue
+                if repo.full_name not in completed:
+                    yield repo
+        
+        failed = {}
+        report_mode = args.report or ("grouped" if args.dry_run else "repos")
+        grouped = report_mode == "grouped"
+        groups = {}
+        results_file = open(args.results, "a") if args.results else None
+        
+        def print_result(result):
+            if results_file is not None:
+                results_file.write(json.dumps(result) + "\n")
+                results_file.flush()
+            if grouped:
+                groups.setdefault(tuple(result["lines"][1:]), []).append(result["repository"])
+                checked = sum(len(names) for names in groups.values())
+                if checked % 100 == 0:
+                    print(f"  {checked} repositories checked")
+            elif report_mode == "repos":
+                print("\n".join(result["lines"]))
+                print()
+            if result["errors"] or result["skipped"]:
+                failed[result["repository"]] = [result["errors"], result["skipped"]]
+            if logger is not None:
+                record_result(logger, result)
+        
+        client = None
+        if args.from_snapshot is not None:
+            # Offline: repositories and their branches come from the snapshot
+            path = snapshot_path(args)
+            store = SnapshotStore(path)
+            try:
+                info = store.info()
+                if "taken_at" not in info:
+                    raise ValueError(f"{path} holds no completed snapshot")
+                taken_at = datetime.fromtimestamp(info["taken_at"]).strftime("%Y-%m-%d %H:%M:%S")
+                print(f"✓ Using snapshot taken {taken_at}")
+                if info["errors"]:
+                    print(f"✗ {info['errors']} repositories are missing from the snapshot (export failed)")
+                snapshot_names = store.repositories()
+                if names is not None:
+                    listed = set(names)
+                    snapshot_names = [name for name in snapshot_names if name in listed]
+                repos = print_found([SnapshotRepo(name) for name in snapshot_names])
+                totals = run_sync(
+                    repos, master_settings, None, True, stop_on_error, 1, print_result,
+                    export=lambda batch: [store.load(repo.full_name) for repo in batch],
+                    ignore_fields=config.get("ignore_fields", [])
+                )
+            finally:
+                store.close()
+        elif (args.engine or config.get("engine", "threads")) == "async":
+            from async_engine import run_async_sync
+            totals = run_async_sync(
+                config, master_settings, logger, args.dry_run, stop_on_error, print_found, print_result, names, outbox
+            )
+        else:
+            from github_client import GitHubClient
+            client = GitHubClient(workers=workers)
+            if names is not None:
+                repos = iter_repos_from_names(client, names)
+            else:
+                repos = stream_repos(client, config, get_cache_dir() / "discovery.json", args.refresh)
+            print("Syncing target repositories as they are discovered...\n")
+            repos = stream_found(repos)
             
-            print_changes(repo.full_name, changes)
+            state = None
+            if config.get("incremental", False) and rules_backend != "rulesets":
+                state = SyncState(
+                    get_cache_dir() / "sync-state.json", master_settings, config.get("incremental_max_age_hours", 24)
+                )
+                if args.full:
+                    state.max_age = 0
             
-            if changes["has_changes"]:
-                change_count = len(changes["additions"]) + len(changes["modifications"]) + len(changes["deletions"])
-                total_changes += change_count
-                
-                if not args.dry_run:
-                    success, errors = apply_changes(repo, changes, logger, stop_on_error)
-                    total_success += success
-                    total_errors += errors
-                    print(f"  Applied: {success} successful, {errors} errors")
-                    
-                    if errors > 0 and stop_on_error:
-                        print("\n✗ Stopped due to error (stop_on_error=true)")
-                        break
+            try:
+                if rules_backend == "rulesets":
+                    totals = run_rulesets(
+                        client, repos, master_settings, ruleset_options, logger, args.dry_run, stop_on_error, workers,
+                        print_result, config.get("ignore_fields", [])
+                    )
+                else:
+                    totals = run_sync(
+                        repos, master_settings, logger, args.dry_run, stop_on_error, workers, print_result,
+                        export=make_exporter(client, exporter), batch_size=batch_size, bind=client.bind, state=state,
+                        ignore_fields=config.get("ignore_fields", []),
+                        write=make_writer(client, writer, config.get("graphql_write_batch_size", 25), outbox),
+                        outbox=outbox
+                    )
+            finally:
+                if state is not None:
+                    state.save()
             
-            print()
+            if not found[0]:
+                print(f"✗ No repositories found with topic '{topic}'")
+                sys.exit(1)
+            print(f"✓ Found {found[0]} target repositories\n")
+        
+        if results_file is not None:
+            results_file.close()
+        
+        if outbox is not None and outbox.queued and outbox_options.get("drain_at_end", True):
+            from outbox import drain
+            if client is None:
+                from github_client import GitHubClient
+                client = GitHubClient(workers=workers)
+            print(f"Replaying {len(outbox.queued)} writes that failed transiently...\n")
+            with phase("apply"):
+                replayed, dead = drain(client, outbox, logger, workers, outbox_options.get("backoff_base", 2.0),
+                                       outbox.queued)
+            totals["outbox"] = {"replayed": len(replayed), "dead_lettered": len(dead)}
+            # Writes that went through on replay are successes, not errors
+            totals["success"] += len(replayed)
+            totals["errors"] -= len(replayed)
+            for repository, _ in replayed:
+                if repository in failed:
+                    failed[repository][0] -= 1
+                    if failed[repository] == [0, 0]:
+                        del failed[repository]
         
-        print(f"Summary: {total_changes} total changes across {len(repos)} repositories")
+        for lines, names in sorted(groups.items(), key=lambda group: -len(group[1])):
+            print_group(lines, names)
+        
+        if totals["stopped"]:
+            print("✗ Stopped due to error (stop_on_error=true)\n")
+        
+        print(f"Summary: {totals['changes']} total changes across {totals['repositories']} repositories")
+        if "plans" in totals:
+            print(f"✓ Compared {totals['plans']} distinct protection states")
         
         if args.dry_run:
             print("\n✓ Dry-run complete (no changes applied)")
         else:
-            print(f"✓ Applied: {total_success} successful, {total_errors} errors")
+            summary = f"✓ Applied: {totals['success']} successful, {totals['errors']} errors"
+            if totals["skipped"]:
+                summary += f", {totals['skipped']} skipped"
+            print(summary)
+            if outbox is not None:
+                print_outbox(outbox, totals.get("outbox"))
+            logger.close()
             print(f"✓ Log file: {logger.get_log_file()}")
         
+        if args.summary:
+            with open(args.summary, "w") as f:
+                json.dump({
+                    "shard": args.shard,
+                    "totals": totals,
+                    "failed": list(failed),
+                    "log_file": str(logger.get_log_file()) if logger is not None else None
+                }, f, indent=2)
+        
+        for path in report("sync", config, client):
+            print(f"✓ Metrics: {path}")
+        
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        sys.exit(1)
+
+def snapshot_path(args):
+    path = Path(args.from_snapshot) if args.from_snapshot else get_cache_dir() / "snapshot.sqlite"
+    if not path.exists():
+        raise FileNotFoundError(f"Snapshot not found: {path} (run snapshot.py first)")
+    return path
+
+def open_outbox(config):
+    options = config.get("outbox", {})
+    if not options.get("enabled", True):
+        return None
+    from outbox import Outbox
+    return Outbox(get_cache_dir() / "outbox.sqlite", options.get("max_attempts", 5))
+
+def print_outbox(outbox, drained=None):
+    if drained is not None:
+        print(f"✓ Outbox: {drained['replayed']} writes replayed, {drained['dead_lettered']} dead-lettered")
+    if len(outbox):
+        print(f"✗ {len(outbox)} writes still queued: run sync.py --drain-outbox")
+    dead_letters = outbox.dead_letters()
+    if dead_letters:
+        print(f"✗ {len(dead_letters)} dead-lettered writes in {outbox.path}")
+
+def drain_outbox(args):
+    print("=== DRAIN OUTBOX ===\n")
+    
+    try:
+        config = load_config()
+        outbox = open_outbox(config)
+        if outbox is None:
+            raise ValueError("The outbox is disabled (outbox.enabled in config.json)")
+        queued = len(outbox)
+        if not queued:
+            print("✓ No queued writes")
+            print_outbox(outbox)
+            return
+        print(f"✓ {queued} queued writes")
+        
+        from github_client import GitHubClient
+        from outbox import drain
+        workers = args.workers or config.get("workers", 1)
+        client = GitHubClient(workers=workers)
+        logger = create_logger(config)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+        with phase("apply"):
+            replayed, dead = drain(client, outbox, logger, workers, config.get("outbox", {}).get("backoff_base", 2.0))
+        
+        print_outbox(outbox, {"replayed": len(replayed), "dead_lettered": len(dead)})
+        dead_letters = outbox.dead_letters()
+        for entry in dead_letters[-20:]:
+            print(f"  {entry['repository']} {entry['branch']}: {entry['verb']} failed {entry['attempts']} times "
+                  f"({entry['error']})")
+        logger.close()
+        print(f"✓ Log file: {logger.get_log_file()}")
+        
+        for path in report("sync", config, client):
+            print(f"✓ Metrics: {path}")
+        if dead or len(outbox):
+            sys.exit(1)
+        
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        sys.exit(1)
+
+def print_group(lines, names, shown=10):
+    # Repositories that would get the same changes, listed once
+    names = sorted(names)
+    print(f"{len(names)} {'repository' if len(names) == 1 else 'repositories'}:")
+    print("\n".join(lines))
+    listed = ", ".join(names[:shown])
+    if len(names) > shown:
+        listed += f" and {len(names) - shown} more"
+    print(f"  {listed}")
+    print()
+
+def launch(args):
+    # Discovers once, runs one sync.py --shard I/N per process on that list
+    # and merges the totals each shard reports
+    mode = "DRY-RUN" if args.dry_run else "APPLY"
+    count = args.processes
+    print(f"=== {mode} MODE ({count} processes) ===\n")
+    
+    processes = []
+    try:
+        config = load_config()
+        if args.repos:
+            names = read_repo_list(args.repos)
+        elif args.from_snapshot is not None:
+            store = SnapshotStore(snapshot_path(args))
+            try:
+                names = store.repositories()
+            finally:
+                store.close()
+        else:
+            from github_client import GitHubClient
+            client = GitHubClient()
+            with phase("discover"):
+                repos = discover_repos(client, config, get_cache_dir() / "discovery.json", args.refresh)
+            names = [repo.full_name for repo in repos]
+        if not names:
+            print(f"✗ No repositories found with topic '{config['target_topic']}'")
+            sys.exit(1)
+        print(f"✓ Found {len(names)} target repositories\n")
+        
+        # Every per-run flag is passed on. Shards report their results to the
+        # launcher, which prints grouped reports once for the whole fleet
+        grouped = (args.report or ("grouped" if args.dry_run else "repos")) == "grouped"
+        options = ["--report", "none" if grouped else args.report or "repos"]
+        for flag in ("dry_run", "full", "profile"):
+            if getattr(args, flag):
+                options.append(f"--{flag.replace('_', '-')}")
+        for flag in ("workers", "exporter", "writer", "engine", "rules_backend"):
+            if getattr(args, flag):
+                options += [f"--{flag.replace('_', '-')}", str(getattr(args, flag))]
+        if args.from_snapshot is not None:
+            options.append(f"--from-snapshot={args.from_snapshot}")
+        
+        with tempfile.TemporaryDirectory(prefix="github-sync-shards-") as scratch:
+            scratch = Path(scratch)
+            write_repo_list(scratch / "repos.txt", names)
+            print_lock = threading.Lock()
+            
+            def relay(index, stream):
+                # Whole lines only, so shards do not interleave mid-line
+                for line in stream:
+                    with print_lock:
+                        print(f"[{index}/{count}] {line}", end="")
+            
+            # SIGTERM reaches the launcher only; pass it on through the finally below
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+            relays = []
+            for index in range(1, count + 1):
+                command = [
+                    sys.executable, str(Path(__file__).resolve()), "--shard", f"{index}/{count}",
+                    "--repos", str(scratch / "repos.txt"), "--summary", str(scratch / f"shard{index}.json"),
+                    "--results", str(scratch / f"shard{index}.jsonl")
+                ] + options
+                process = subprocess.Popen(
+                    command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1,
+                    env=dict(os.environ, PYTHONUNBUFFERED="1")
+                )
+                processes.append(process)
+                relay_thread = threading.Thread(target=relay, args=(index, process.stdout), daemon=True)
+                relay_thread.start()
+                relays.append(relay_thread)
+            
+            shards = []
+            for index, (process, relay_thread) in enumerate(zip(processes, relays), 1):
+                exit_code = process.wait()
+                relay_thread.join()
+                summary_file = scratch / f"shard{index}.json"
+                summary = json.loads(summary_file.read_text()) if summary_file.exists() else None
+                shards.append({"shard": f"{index}/{count}", "exit_code": exit_code, "summary": summary})
+            
+            groups = {}
+            results_file = open(args.results, "a") if args.results else None
+            try:
+                for index in range(1, count + 1):
+                    results_path = scratch / f"shard{index}.jsonl"
+                    if not results_path.exists():
+                        continue
+                    with open(results_path) as f:
+                        for line in f:
+                            if results_file is not None:
+                                results_file.write(line)
+                            result = json.loads(line)
+                            groups.setdefault(tuple(result["lines"][1:]), []).append(result["repository"])
+            finally:
+                if results_file is not None:
+                    results_file.close()
+        
+        if grouped:
+            print()
+            for lines, group_names in sorted(groups.items(), key=lambda group: -len(group[1])):
+                print_group(lines, group_names)
+        
+        merged = merge_summaries(shards)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        summary_path = get_logs_dir() / f"sync_summary_{timestamp}.json"
+        summary_path.parent.mkdir(parents=True, exist_ok=True)
+        for path in [summary_path] + ([Path(args.summary)] if args.summary else []):
+            with open(path, "w") as f:
+                json.dump(dict(merged, dry_run=args.dry_run, processes=count), f, indent=2)
+        
+        print(f"\nSummary: {merged['changes']} total changes across {merged['repositories']} repositories "
+              f"in {count} shards")
+        if not args.dry_run:
+            summary = f"✓ Applied: {merged['success']} successful, {merged['errors']} errors"
+            if merged["skipped"]:
+                summary += f", {merged['skipped']} skipped"
+            print(summary)
+            for log_file in merged["log_files"]:
+                print(f"✓ Log file: {log_file}")
+        for name in merged["failed_repositories"]:
+            print(f"✗ {name} did not finish cleanly")
+        for shard in merged["failed_shards"]:
+            print(f"✗ Shard {shard['shard']} exited with code {shard['exit_code']}")
+        print(f"✓ Merged summary: {summary_path}")
+        
+        if merged["failed_shards"]:
+            sys.exit(1)
+        
     except Exception as e:
         print(f"✗ Error: {e}")
         sys.exit(1)
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+                process.wait()
 
 if __name__ == "__main__":
     main()
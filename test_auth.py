@@ -10,7 +10,7 @@ if __name__ == "__main__":
     
     try:
         client = GitHubClient()
-        username = client.get_authenticated_user()
+        username = client.get_authenticated_user(refresh=True)
         print(f"✓ Connected to GitHub as: {username}")
         print("\n✓ Authentication successful!")
     except ValueError as e:
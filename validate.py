@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import sys
+import json
+import argparse
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from validator import validate_settings_file
+from config import load_config, get_settings_dir
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the master settings offline, without a token or API calls")
+    parser.add_argument("--settings", metavar="FILE",
+                        help="Settings file to check (default: settings/branch-protection.json)")
+    args = parser.parse_args()
+
+    path = Path(args.settings) if args.settings else get_settings_dir() / "branch-protection.json"
+    if not path.exists():
+        print(f"✗ Settings file not found: {path}")
+        sys.exit(1)
+
+    valid, error = validate_settings_file(path)
+    if not valid:
+        print(f"✗ {path}: {error}")
+        sys.exit(1)
+    with open(path) as f:
+        master_settings = json.load(f)
+    protected = sum(1 for branch in master_settings if branch.get("protection"))
+    print(f"✓ {path}: {len(master_settings)} branches ({protected} protected)")
+
+    try:
+        config = load_config()
+    except (OSError, ValueError) as e:
+        print(f"✗ config.json: {e}")
+        sys.exit(1)
+
+    if config.get("rules_backend", "branch_protection") == "rulesets":
+        # Imported only here: the rulesets module pulls in PyGithub
+        from rulesets import DEFAULT_NAME, build_rulesets
+        options = config.get("rulesets", {})
+        try:
+            rulesets = build_rulesets(
+                master_settings, options.get("name", DEFAULT_NAME), ignore_fields=config.get("ignore_fields", [])
+            )
+        except ValueError as e:
+            print(f"✗ Cannot be expressed as rulesets: {e}")
+            sys.exit(1)
+        print(f"✓ Maps to {len(rulesets)} rulesets")
+
+if __name__ == "__main__":
+    main()
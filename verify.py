@@ -52,6 +52,21 @@ def main():
     all_ok &= check_file(root / "src/applier.py", "Applier module")
     all_ok &= check_file(root / "src/logger.py", "Logger module")
     all_ok &= check_file(root / "src/validator.py", "Validator module")
+    all_ok &= check_file(root / "src/sync_engine.py", "Sync engine module")
+    all_ok &= check_file(root / "src/http_cache.py", "HTTP cache module")
+    all_ok &= check_file(root / "src/rate_limit.py", "Rate limit module")
+    all_ok &= check_file(root / "src/transport.py", "Transport module")
+    all_ok &= check_file(root / "src/outbox.py", "Outbox module")
+    all_ok &= check_file(root / "src/rollback_engine.py", "Rollback module")
+    all_ok &= check_file(root / "src/credentials.py", "Credentials module")
+    all_ok &= check_file(root / "src/async_engine.py", "Async engine module")
+    all_ok &= check_file(root / "src/state_store.py", "Sync state module")
+    all_ok &= check_file(root / "src/checkpoint.py", "Checkpoint module")
+    all_ok &= check_file(root / "src/metrics.py", "Metrics module")
+    all_ok &= check_file(root / "src/watcher.py", "Webhook watcher module")
+    all_ok &= check_file(root / "src/sharding.py", "Sharding module")
+    all_ok &= check_file(root / "src/snapshot_store.py", "Snapshot store module")
+    all_ok &= check_file(root / "src/rulesets.py", "Rulesets module")
     print()
     
     # Check CLI scripts
@@ -59,6 +74,11 @@ def main():
     all_ok &= check_file(root / "export.py", "Export command")
     all_ok &= check_file(root / "discover.py", "Discover command")
     all_ok &= check_file(root / "sync.py", "Sync command")
+    all_ok &= check_file(root / "watch.py", "Watch command")
+    all_ok &= check_file(root / "snapshot.py", "Snapshot command")
+    all_ok &= check_file(root / "query.py", "Snapshot query command")
+    all_ok &= check_file(root / "rollback.py", "Rollback command")
+    all_ok &= check_file(root / "validate.py", "Settings validation command")
     print()
     
     # Check documentation
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+import os
+import sys
+import signal
+import argparse
+import threading
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from dotenv import load_dotenv
+from github_client import GitHubClient
+from discovery import discover_repos
+from sync_engine import run_sync, make_exporter, make_writer
+from state_store import SyncState
+from watcher import Watcher, Debouncer, WebhookReceiver
+from rulesets import run_rulesets
+from config import load_config, get_cache_dir
+from sync import load_master_settings, create_logger, open_outbox, print_outbox
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-sync target repositories as webhooks report changes")
+    parser.add_argument("--dry-run", action="store_true", help="Report drift without fixing it")
+    parser.add_argument("--host", help="Address to listen on")
+    parser.add_argument("--port", type=int, help="Port to listen on")
+    parser.add_argument("--workers", type=int, help="Number of repositories to sync concurrently")
+    parser.add_argument("--no-initial-sync", action="store_true", help="Wait for the first interval before reconciling")
+    args = parser.parse_args()
+    
+    mode = "DRY-RUN" if args.dry_run else "APPLY"
+    print(f"=== WATCH ({mode}) ===\n")
+    
+    logger = None
+    server = None
+    try:
+        config = load_config()
+        options = config.get("watch", {})
+        load_dotenv()
+        secret_env = options.get("secret_env", "GITHUB_WEBHOOK_SECRET")
+        secret = os.getenv(secret_env)
+        if not secret:
+            raise ValueError(f"{secret_env} not found in environment variables; it must match the webhook secret")
+        
+        stop_on_error = config.get("stop_on_error", False)
+        workers = args.workers or config.get("workers", 1)
+        exporter = config.get("exporter", "rest")
+        writer = config.get("writer", "rest")
+        batch_size = config.get("graphql_batch_size", 10) if "graphql" in (exporter, writer) else 1
+        rules_backend = config.get("rules_backend", "branch_protection")
+        ruleset_options = config.get("rulesets", {})
+        if rules_backend == "rulesets" and ruleset_options.get("scope") == "organization":
+            # An event names one repository, but an organization ruleset lists them all
+            raise ValueError("Watch mode supports repository rulesets only")
+        
+        master_settings = load_master_settings()
+        print(f"✓ Loaded master settings ({len(master_settings)} branches)")
+        
+        client = GitHubClient(workers=workers)
+        logger = None if args.dry_run else create_logger(config)
+        # Writes that fail transiently are queued, as in sync.py
+        outbox = None
+        if not args.dry_run and rules_backend != "rulesets":
+            outbox = open_outbox(config)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+        
+        state = None
+        if config.get("incremental", False):
+            state = SyncState(
+                get_cache_dir() / "sync-state.json", master_settings, config.get("incremental_max_age_hours", 24)
+            )
+        
+        def discover():
+            return discover_repos(client, config, get_cache_dir() / "discovery.json", refresh=True)
+        
+        def print_result(result):
+            if result["changes"] or result["errors"]:
+                print("\n".join(result["lines"]))
+        
+        def sync_repos(repos, reconcile):
+            # An event means the repository changed, so the incremental
+            # state is only used by the full reconcile
+            if rules_backend == "rulesets":
+                totals = run_rulesets(
+                    client, repos, master_settings, ruleset_options, logger, args.dry_run, stop_on_error, workers,
+                    print_result, config.get("ignore_fields", [])
+                )
+            else:
+                totals = run_sync(
+                    repos, master_settings, logger, args.dry_run, stop_on_error, workers, print_result,
+                    export=make_exporter(client, exporter), batch_size=batch_size, bind=client.bind,
+                    state=state if reconcile else None, ignore_fields=config.get("ignore_fields", []),
+                    write=make_writer(client, writer, config.get("graphql_write_batch_size", 25), outbox),
+                    outbox=outbox
+                )
+            if reconcile and state is not None:
+                state.save()
+            verb = "found" if args.dry_run else "applied"
+            print(f"  {totals['changes']} changes {verb} across {totals['repositories']} repositories"
+                  + (f", {totals['errors']} errors" if totals["errors"] else ""))
+            if outbox is not None:
+                print_outbox(outbox)
+
+        watcher = Watcher(
+            config["target_topic"],
+            [branch["name"] for branch in master_settings],
+            discover,
+            client.get_repo,
+            sync_repos,
+            Debouncer(options.get("debounce_seconds", 10), options.get("max_delay_seconds", 60)),
+            options.get("reconcile_interval_hours", 24) * 3600,
+            # Events caused by our own writes are not drift
+            ignore_senders=[client.get_authenticated_user()],
+            own_write_window=options.get("own_write_window_seconds", 60)
+        )
+        
+        host = args.host or options.get("host", "127.0.0.1")
+        port = args.port or options.get("port", 8080)
+        server = WebhookReceiver((host, port), secret, options.get("path", "/webhook"), watcher.handle_event)
+        threading.Thread(target=server.serve_forever, name="webhook-receiver", daemon=True).start()
+        print(f"✓ Listening for webhooks on http://{host}:{port}{server.path}\n")
+        
+        watcher.run(threading.Event(), reconcile_now=not args.no_initial_sync)
+        
+    except KeyboardInterrupt:
+        print("\n✓ Stopped")
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        sys.exit(1)
+    finally:
+        if server is not None:
+            server.shutdown()
+        if logger is not None:
+            logger.close()
+
+if __name__ == "__main__":
+    main()